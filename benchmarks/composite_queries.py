@@ -0,0 +1,55 @@
+"""Database statements and time to fetch the listings of many composite queries,
+with and without the listing cache. Turning rows into documents is left out.
+
+    python benchmarks/composite_queries.py [queries]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic_db import make_db  # noqa: E402
+
+DAY = date(2024, 1, 15)
+CATEGORIES = ["cs.AI", "cs.LG", "cs.CV", "cs.CL", "math.NT", "math.AP", "math.PR", "astro-ph.GA",
+              "cond-mat.str-el", "physics.optics", "q-bio.NC", "stat.ML"]
+PARTS = CATEGORIES + ["cs", "math", "physics", "astro-ph"]
+
+
+def main(count: int) -> None:
+    rng = random.Random(1)
+    queries = ["+".join(rng.sample(PARTS, rng.randint(2, 4))) for _ in range(count)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "feed.db")
+        make_db(path, CATEGORIES, 200, DAY)
+        os.environ["CLASSIC_DB_URI"] = f"sqlite:///{path}"
+
+        from sqlalchemy import event
+        from arxiv.db import Session
+        from feed.factory import create_web_app
+        from feed.fetch_data import get_records_from_db, validate_request
+
+        for size in (0, 2048):
+            app = create_web_app()
+            statements = []
+            with app.app_context():
+                if size == 0:
+                    app.extensions.pop("feed_listing_cache", None)
+                engine = Session.get_bind()
+                listener = lambda *args: statements.append(args[2])  # noqa: E731
+                event.listen(engine, "before_cursor_execute", listener)
+                start = time.perf_counter()
+                for query in queries:
+                    get_records_from_db(*validate_request(query), 1, dates=(DAY, DAY))
+                elapsed = time.perf_counter() - start
+                event.remove(engine, "before_cursor_execute", listener)
+            label = "listing cache" if size else "query per feed"
+            print(f"{label}: {len(queries)} queries, {len(statements)} statements, {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,29 @@
+"""Compare rendering error feeds with FeedGenerator and with the error templates.
+
+    python benchmarks/error_feeds.py [iterations]
+"""
+import sys
+import timeit
+
+from feed.consts import FeedVersion
+from feed.errors import FeedIndexerError
+from feed.factory import create_web_app
+from feed.serializers.error_templates import render_error
+from feed.serializers.serializer import Serializer
+
+
+def main(iterations: int) -> None:
+    app = create_web_app()
+    error = FeedIndexerError("Bad archive 'wp-admin'.")
+    with app.test_request_context("/rss/wp-admin"):
+        for version in (FeedVersion.RSS_2_0, FeedVersion.ATOM_1_0):
+            generator = timeit.timeit(lambda: Serializer(version).serialize_error(error, "wp-admin"), number=iterations)
+            template = timeit.timeit(lambda: render_error(error, "wp-admin", version), number=iterations)
+            print(
+                f"{version.short_name}: feedgen {generator / iterations * 1e6:.0f}us, "
+                f"template {template / iterations * 1e6:.0f}us, {generator / template:.1f}x faster"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
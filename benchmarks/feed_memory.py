@@ -0,0 +1,58 @@
+"""Peak memory of building a large multi-archive feed, with and without streaming.
+
+Creates a synthetic database in a temporary directory and measures the
+Python allocations of fetching and serializing one page with tracemalloc.
+
+    python benchmarks/feed_memory.py [papers per category]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic_db import make_db  # noqa: E402
+
+DAY = date(2024, 1, 15)
+QUERIES = ["cs.AI", "cs+math", "physics+math+cs+astro-ph+cond-mat"]
+CATEGORIES = ["cs.AI", "cs.LG", "cs.CV", "math.NT", "math.AP", "astro-ph.GA", "cond-mat.str-el", "physics.optics"]
+
+
+def measure(run: Callable[[], bytes]) -> str:
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = len(run())
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return f"{size / 2**20:5.1f}MiB feed, peak {peak / 2**20:6.1f}MiB, {elapsed:.2f}s"
+
+
+def main(papers: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "feed.db")
+        make_db(path, CATEGORIES, papers, DAY)
+        os.environ["CLASSIC_DB_URI"] = f"sqlite:///{path}"
+
+        from feed.consts import FeedVersion
+        from feed.factory import create_web_app
+        from feed.fetch_data import search, search_stream
+        from feed.serializers.serializer import Serializer
+
+        app = create_web_app()
+        with app.test_request_context("/rss/cs"):
+            serializer = Serializer(FeedVersion.RSS_2_0)
+            for query in QUERIES:
+                listed = measure(lambda: serializer.serialize_documents(
+                    search(query, 1, dates=(DAY, DAY), page_size=2000)).content)
+                streamed = measure(lambda: serializer.serialize_stream(
+                    search_stream(query, 1, dates=(DAY, DAY), page_size=2000, batch_size=100)).content)
+                print(f"{query}\n  list:   {listed}\n  stream: {streamed}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,32 @@
+"""Time the per request setup of a feed: serializer, links and channel header.
+
+Serializes a feed without entries, so only the setup and the channel are timed.
+
+    python benchmarks/feed_setup.py [iterations]
+"""
+import sys
+import timeit
+
+from feed.consts import FeedVersion
+from feed.domain import DocumentSet
+from feed.factory import create_web_app
+from feed.serializers.serializer import Serializer
+
+
+def main(iterations: int) -> None:
+    app = create_web_app()
+    documents = DocumentSet(categories=["cs.AI", "math.NT"], documents=[])
+    with app.test_request_context("/rss/cs.AI+math.NT"):
+        for version in (FeedVersion.RSS_2_0, FeedVersion.ATOM_1_0):
+            setup = min(timeit.repeat(lambda: Serializer(version), number=iterations, repeat=7))
+            feed = min(timeit.repeat(
+                lambda: Serializer(version).serialize_documents(documents), number=iterations, repeat=7
+            ))
+            print(
+                f"{version.short_name}: serializer {setup / iterations * 1e6:.0f}us, "
+                f"empty feed {feed / iterations * 1e6:.0f}us"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,54 @@
+"""Time to fetch the listings of a broad multi-archive query with one query, and
+with each archive loaded at the same time on FEED_ARCHIVE_WORKERS threads.
+
+    python benchmarks/parallel_archives.py [papers per category] [workers]
+
+SQLite serializes reads of one file much more than a database server does, so
+the split is measured here for correctness and overhead rather than speedup.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic_db import make_db  # noqa: E402
+
+DAY = date(2024, 1, 15)
+CATEGORIES = ["cs.AI", "cs.LG", "cs.CV", "math.NT", "math.AP", "math.PR", "astro-ph.GA", "astro-ph.CO",
+              "cond-mat.str-el", "physics.optics", "q-bio.NC", "stat.ML", "econ.EM", "eess.SP"]
+QUERY = "cs+math+astro-ph+cond-mat+physics+q-bio+stat+econ+eess"
+REPEAT = 5
+
+
+def main(papers: int, workers: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "feed.db")
+        make_db(path, CATEGORIES, papers, DAY)
+        os.environ["CLASSIC_DB_URI"] = f"sqlite:///{path}"
+
+        from feed.factory import create_web_app
+        from feed.fetch_data import get_records_from_db, validate_request
+
+        app = create_web_app()
+        app.extensions.pop("feed_listing_cache", None)
+        archives, categories = validate_request(QUERY)
+        results = {}
+        for count in (0, workers):
+            app.config["FEED_ARCHIVE_WORKERS"] = count
+            with app.app_context():
+                rows = get_records_from_db(archives, categories, 1, dates=(DAY, DAY))
+                start = time.perf_counter()
+                for _ in range(REPEAT):
+                    get_records_from_db(archives, categories, 1, dates=(DAY, DAY))
+                elapsed = (time.perf_counter() - start) / REPEAT
+            results[count] = [(action, meta.paper_id) for action, meta in rows]
+            label = f"{count} archive workers" if count else "single query"
+            print(f"{label}: {len(rows)} rows, {elapsed * 1000:.1f}ms")
+        assert results[0] == results[workers], "parallel listings differ from the single query"
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300, int(sys.argv[2]) if len(sys.argv) > 2 else 4)
@@ -0,0 +1,53 @@
+"""Build a SQLite database with many announcements, with the schema of the test database."""
+import random
+import sqlite3
+from datetime import date
+from typing import Sequence
+
+SCHEMA_DB = "feed/tests/data/test_data.db"
+TABLES = ("arXiv_updates", "arXiv_metadata", "arXiv_document_category")
+ACTIONS = ("new", "new", "cross", "replace")
+
+
+def make_db(path: str, categories: Sequence[str], papers_per_category: int, day: date,
+            abstract_words: int = 150, seed: int = 0) -> None:
+    """Announce papers_per_category papers in each category on day.
+
+    Every paper is also in one other random category, as primary or cross list.
+    """
+    rng = random.Random(seed)
+    schema = sqlite3.connect(SCHEMA_DB)
+    db = sqlite3.connect(path)
+    for (sql,) in schema.execute(
+        f"select sql from sqlite_master where type='table' and name in {TABLES}"
+    ):
+        db.execute(sql)
+    schema.close()
+
+    document_id = 0
+    for category in categories:
+        for _ in range(papers_per_category):
+            document_id += 1
+            paper_id = f"{day:%y%m}.{document_id:05d}"
+            other = rng.choice(categories)
+            action = rng.choice(ACTIONS)
+            version = 1 if action != "replace" else rng.randint(2, 4)
+            authors = ", ".join(f"Author {rng.randint(1, 10**6)}" for _ in range(rng.randint(1, 8)))
+            abstract = " ".join(f"word{rng.randint(1, 5000)}" for _ in range(abstract_words))
+            db.execute(
+                "insert into arXiv_metadata (metadata_id, document_id, paper_id, submitter_name, submitter_email,"
+                " title, authors, abs_categories, abstract, license, version, is_current, is_withdrawn)"
+                " values (?, ?, ?, 'Submitter', 'submitter@example.org', ?, ?, ?, ?, ?, ?, 1, 0)",
+                (document_id, document_id, paper_id, f"Paper {document_id}", authors,
+                 " ".join(dict.fromkeys([category, other])), abstract,
+                 "http://creativecommons.org/licenses/by/4.0/", version),
+            )
+            db.execute(
+                "insert into arXiv_updates values (?, ?, ?, ?, ?, ?)",
+                (document_id, version, day.isoformat(), action, category.split(".")[0], category),
+            )
+            db.execute("insert into arXiv_document_category values (?, ?, 1)", (document_id, category))
+            if other != category:
+                db.execute("insert into arXiv_document_category values (?, ?, 0)", (document_id, other))
+    db.commit()
+    db.close()
@@ -0,0 +1,178 @@
+"""ASGI application serving the feeds with an async database engine.
+
+The feed routes (``/rss/<query>``, ``/atom/<query>`` and ``/json/<query>``) for
+the current window are answered here: the database queries run on an async
+session and the CPU bound work of building and serializing the feed runs on
+a thread pool, so slow clients and requests waiting on the database do not
+hold a worker thread each. Everything else, including feeds for past days,
+is passed on to the regular Flask app.
+
+Run with an ASGI server, for example::
+
+    uvicorn --factory feed.asgi:create_asgi_app
+
+This needs ``asgiref`` and an async database driver (``aiomysql`` for MySQL,
+``aiosqlite`` for SQLite) installed.
+"""
+import re
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, MutableMapping, Optional, Union
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+from werkzeug import Response
+from werkzeug.datastructures import MultiDict
+
+from arxiv.integration.fastly.headers import add_surrogate_key
+
+from feed import async_database, controller
+from feed.consts import FeedFields, FeedVersion
+from feed.domain import DocumentSet
+from feed.errors import FeedError, FeedVersionError
+from feed.factory import create_web_app
+from feed.routes import feed_response
+from feed.serializers.serializer import serialize
+from feed.utils import parse_limit, parse_all_authors
+
+logger = logging.getLogger(__name__)
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+FEED_PATH = re.compile(r"^/(rss|atom|json)/([^/]+)/?$")
+
+#version used by each feed route, rss takes it from the version argument
+ROUTE_VERSIONS = {"atom": FeedVersion.ATOM_1_0, "json": FeedVersion.JSON_1_1}
+
+
+class FeedASGI:
+    """ASGI app answering feed requests asynchronously and the rest with the Flask app.
+
+    Parameters
+    ----------
+    flask_app : Flask
+        The configured feed app, used for its config, url building and every
+        request that is not a feed for the current window.
+    """
+
+    def __init__(self, flask_app: Flask):
+        self.flask_app = flask_app
+        self.engine = async_database.create_engine(flask_app.config)
+        self.sessions = async_database.create_sessionmaker(self.engine)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, int(flask_app.config["FEED_ASYNC_WORKERS"])),
+            thread_name_prefix="feed-serialize",
+        )
+        self._wsgi: Optional[Callable[[Scope, Receive, Send], Awaitable[None]]] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] == "http" and scope["method"] == "GET":
+            match = FEED_PATH.match(self._app_path(scope))
+            args: MultiDict = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin-1"),
+                                                  keep_blank_values=True))
+            #past days go through the on-disk history store of the Flask app, filters through its keyword index
+            if match and not args.get("date") and not args.get("q") and not args.get("author"):
+                await self._feed(scope, send, match.group(1), match.group(2), args)
+                return
+        await self.wsgi(scope, receive, send)
+
+    @property
+    def wsgi(self) -> Callable[[Scope, Receive, Send], Awaitable[None]]:
+        if self._wsgi is None:
+            from asgiref.wsgi import WsgiToAsgi
+            self._wsgi = WsgiToAsgi(self.flask_app) # type: ignore[no-untyped-call]
+        return self._wsgi
+
+    async def close(self) -> None:
+        """Release the database connections and the serialization threads."""
+        await self.engine.dispose()
+        self.executor.shutdown(wait=False)
+
+    async def _feed(self, scope: Scope, send: Send, route: str, query: str, args: MultiDict) -> None:
+        documents_or_error: Union[DocumentSet, FeedError]
+        version: Optional[FeedVersion] = None
+        with self.flask_app.app_context():
+            try:
+                version = FeedVersion.get(ROUTE_VERSIONS.get(route, args.get("version", "2.0")))
+                limit_arg = args.get("limit")
+                limit = parse_limit(limit_arg, self.flask_app.config["FEED_PAGE_SIZE"]) if limit_arg else None
+                fields = FeedFields.get(args.get("fields", "full"))
+                all_authors = parse_all_authors(args["authors"]) if args.get("authors") else False
+                async with self.sessions() as session:
+                    documents_or_error = await controller.get_documents_async(
+                        session, query, page=args.get("page"), since=args.get("since"), executor=self.executor,
+                        limit=limit, fields=fields, all_authors=all_authors
+                    )
+            except FeedError as ex:
+                documents_or_error = ex
+
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.executor, self._render, scope, route, query, documents_or_error, version
+        )
+        await self._send_response(response, send)
+
+    def _render(self, scope: Scope, route: str, query: str,
+                documents_or_error: Union[DocumentSet, FeedError], version: Optional[FeedVersion]) -> Response:
+        """Serialize the feed and build its response, the same as the Flask routes."""
+        headers = [(key.decode("latin-1"), value.decode("latin-1")) for key, value in scope.get("headers", [])]
+        host = dict((key.lower(), value) for key, value in headers).get("host")
+        if host is None and scope.get("server"):
+            host = "%s:%s" % tuple(scope["server"])
+        with self.flask_app.test_request_context(
+            self._app_path(scope),
+            base_url=f"{scope.get('scheme', 'http')}://{host or 'localhost'}{scope.get('root_path', '')}",
+            query_string=scope.get("query_string", b"").decode("latin-1"),
+            headers=headers,
+        ):
+            if isinstance(documents_or_error, FeedVersionError) or version is None:
+                feed = serialize(documents_or_error, query=query)
+            else:
+                feed = serialize(documents_or_error, query=query, version=version)
+            response = feed_response(feed, query)
+            response.headers=add_surrogate_key(response.headers,[f"feed-{route}"]) # type: ignore[arg-type]
+            return response
+
+    @staticmethod
+    def _app_path(scope: Scope) -> str:
+        path: str = scope["path"]
+        root_path: str = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            return path[len(root_path):] or "/"
+        return path
+
+    @staticmethod
+    async def _send_response(response: Response, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [(key.lower().encode("latin-1"), value.encode("latin-1"))
+                        for key, value in response.headers.to_wsgi_list()],
+        })
+        await send({"type": "http.response.body", "body": response.get_data()})
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                #feed requests here skip Flask's before_request, start the watcher directly
+                watcher = self.flask_app.extensions.get("feed_freshness")
+                if watcher is not None:
+                    watcher.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app() -> FeedASGI:
+    """Initialize the feed app for an ASGI server."""
+    return FeedASGI(create_web_app())
@@ -0,0 +1,79 @@
+"""Async versions of the feed database queries, used by the ASGI serving mode.
+
+The statements are the same ones built in :mod:`feed.database`, they are only
+executed on an async session so that a request waiting on the database does
+not hold a thread.
+"""
+from typing import Any, List, Mapping, Optional, Tuple
+from datetime import date
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from arxiv.taxonomy.category import Archive, Category
+from arxiv.db.models import Metadata
+
+from feed.consts import UpdateActions, FEED_PAGE_SIZE
+from feed.domain import PageCursor
+from feed.database import (announce_papers_statement, in_feed_order, update_watermark_statement,
+    count_updates_statement)
+
+#async driver to use for each database backend of the classic db uri
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_db_uri(uri: str) -> str:
+    """The uri with its driver replaced by the async driver for the same database.
+
+    Raises
+    ------
+    ValueError
+        If there is no known async driver for the database.
+    """
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for database '{backend}'")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def create_engine(config: Mapping[str, Any]) -> AsyncEngine:
+    """Create the async engine from the app config.
+
+    FEED_ASYNC_DB_URI is used if set, otherwise the read replica or CLASSIC_DB_URI
+    with an async driver.
+    """
+    uri = config.get("FEED_ASYNC_DB_URI") or async_db_uri(config.get("FEED_DB_REPLICA_URI") or config["CLASSIC_DB_URI"])
+    options: dict = {"pool_pre_ping": True, "pool_recycle": int(config["FEED_ASYNC_DB_POOL_RECYCLE"])}
+    if make_url(uri).get_backend_name() != "sqlite":
+        options["pool_size"] = int(config["FEED_ASYNC_DB_POOL_SIZE"])
+        options["max_overflow"] = int(config["FEED_ASYNC_DB_MAX_OVERFLOW"])
+    return create_async_engine(uri, **options)
+
+
+def create_sessionmaker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    #results are only read, they stay usable after the session closes
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def get_announce_papers(session: AsyncSession, first_day: date, last_day: date,
+                              archives: List[Archive], categories: List[Category],
+                              cursor: Optional[PageCursor] = None, limit: int = FEED_PAGE_SIZE
+                              ) -> List[Tuple[UpdateActions, Metadata]]:
+    """same as feed.database.get_announce_papers"""
+    statement = announce_papers_statement(first_day, last_day, archives, categories, cursor, limit)
+    result = await session.execute(statement)
+    return in_feed_order(result.all(), cursor)
+
+
+async def get_update_watermark(session: AsyncSession, last_day: date) -> Optional[Tuple[date, int]]:
+    """same as feed.database.get_update_watermark"""
+    row = (await session.execute(update_watermark_statement(last_day))).first()
+    if row is None:
+        return None
+    return row[0], row[1]
+
+
+async def count_updates_on(session: AsyncSession, day: date) -> int:
+    """same as feed.database.count_updates_on"""
+    return (await session.execute(count_updates_statement(day))).scalar() or 0
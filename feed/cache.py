@@ -0,0 +1,74 @@
+"""In-process caches of rendered feeds and query results."""
+from typing import Any, Hashable, Optional
+
+from flask import Flask, current_app
+
+from feed.domain import DocumentSet, ListingCounts
+from feed.freshness import NewAnnouncements, new_announcements
+from feed.keyword_index import KeywordIndex
+from feed.listings import ListingCache
+from feed.lru import LRUCache
+from feed.serializers.feed import Feed
+
+#announcement windows whose keyword index is kept, see feed.keyword_index
+KEYWORD_INDEX_WINDOWS = 2
+
+
+class NegativeFeedCache:
+    """Rendered feeds that are cheap to serve again: errors for invalid requests
+    and empty feeds for valid queries.
+
+    Empty feeds are dropped as soon as new announcements are noticed.
+    """
+
+    def __init__(self, maxsize: int):
+        self.errors: LRUCache[Feed] = LRUCache(maxsize)
+        self.empty: LRUCache[Feed] = LRUCache(maxsize)
+
+    def get(self, key: Hashable) -> Optional[Feed]:
+        return self.errors.get(key) or self.empty.get(key)
+
+
+def negative_feeds() -> NegativeFeedCache:
+    """The negative feed cache of the current app."""
+    cache: NegativeFeedCache = current_app.extensions["feed_negative_cache"]
+    return cache
+
+
+def document_sets() -> LRUCache[DocumentSet]:
+    """Query results of the current app, shared by all feed formats.
+
+    Keyed by the canonical query and the days searched, the DocumentSets are
+    frozen and shared between threads, so they must not be changed.
+    """
+    cache: LRUCache[DocumentSet] = current_app.extensions["feed_document_cache"]
+    return cache
+
+
+def listing_counts() -> LRUCache[ListingCounts]:
+    """Listing counts of the current app, keyed by canonical query and days counted."""
+    cache: LRUCache[ListingCounts] = current_app.extensions["feed_count_cache"]
+    return cache
+
+
+def init_app(app: Flask) -> None:
+    cache = NegativeFeedCache(int(app.config["FEED_NEGATIVE_CACHE_SIZE"]))
+    app.extensions["feed_negative_cache"] = cache
+    documents: LRUCache[DocumentSet] = LRUCache(int(app.config["FEED_DOCUMENT_CACHE_SIZE"]))
+    app.extensions["feed_document_cache"] = documents
+    listings = ListingCache(int(app.config["FEED_LISTING_CACHE_SIZE"]))
+    if listings.listings.maxsize > 0:
+        app.extensions["feed_listing_cache"] = listings
+    counts: LRUCache[ListingCounts] = LRUCache(int(app.config["FEED_COUNT_CACHE_SIZE"]))
+    app.extensions["feed_count_cache"] = counts
+    indexes: LRUCache[KeywordIndex] = LRUCache(KEYWORD_INDEX_WINDOWS)
+    app.extensions["feed_keyword_index"] = indexes
+
+    def clear_new_data(sender: Any, event: NewAnnouncements) -> None:
+        cache.empty.clear()
+        documents.clear()
+        listings.clear()
+        counts.clear()
+        indexes.clear()
+
+    new_announcements.connect(clear_new_data, sender=app, weak=False)
@@ -18,6 +18,91 @@ class Settings(arxiv_base.Settings):
     STATIC_SERVER:str = os.environ.get("STATIC_SERVER", "static.arxiv.org")
 
     FEED_NUM_DAYS:int = int(os.environ.get("FEED_NUM_DAYS", consts.FEED_NUM_DAYS))
+    FEED_PAGE_SIZE:int = int(os.environ.get("FEED_PAGE_SIZE", consts.FEED_PAGE_SIZE))
+    ###entries list their first FEED_MAX_AUTHORS authors followed by "et al." unless all authors are requested, 0 to always list all
+    FEED_MAX_AUTHORS:int = int(os.environ.get("FEED_MAX_AUTHORS", consts.FEED_MAX_AUTHORS))
+
+    ###days with new listings, comma separated weekday names and ISO dates of holidays without any, see feed.schedule
+    FEED_ANNOUNCE_WEEKDAYS:str = os.environ.get("FEED_ANNOUNCE_WEEKDAYS", consts.FEED_ANNOUNCE_WEEKDAYS)
+    FEED_ANNOUNCE_HOLIDAYS:str = os.environ.get("FEED_ANNOUNCE_HOLIDAYS", "")
+
+    ###feeds for past days, rendered feeds are kept in FEED_HISTORY_DIR if it is set
+    FEED_HISTORY_DIR:str = os.environ.get("FEED_HISTORY_DIR", "")
+    FEED_MAX_HISTORY_DAYS:int = int(os.environ.get("FEED_MAX_HISTORY_DAYS", consts.FEED_MAX_HISTORY_DAYS))
+
+    ###many feeds in one response from /feed/bundle
+    FEED_BUNDLE_MAX_QUERIES:int = int(os.environ.get("FEED_BUNDLE_MAX_QUERIES", consts.FEED_BUNDLE_MAX_QUERIES))
+    FEED_BUNDLE_WORKERS:int = int(os.environ.get("FEED_BUNDLE_WORKERS", consts.FEED_BUNDLE_WORKERS))
+
+    ###read only feed queries go to this replica when set, or the primary if it fails
+    FEED_DB_REPLICA_URI:str = os.environ.get("FEED_DB_REPLICA_URI", "")
+    FEED_DB_POOL_SIZE:int = int(os.environ.get("FEED_DB_POOL_SIZE", consts.FEED_DB_POOL_SIZE))
+    FEED_DB_MAX_OVERFLOW:int = int(os.environ.get("FEED_DB_MAX_OVERFLOW", consts.FEED_DB_MAX_OVERFLOW))
+    FEED_DB_POOL_RECYCLE:int = int(os.environ.get("FEED_DB_POOL_RECYCLE", consts.FEED_DB_POOL_RECYCLE))
+    FEED_DB_POOL_PRE_PING:bool = os.environ.get("FEED_DB_POOL_PRE_PING", "True")=="True"
+    FEED_DB_STATEMENT_TIMEOUT:int = int(os.environ.get("FEED_DB_STATEMENT_TIMEOUT", consts.FEED_DB_STATEMENT_TIMEOUT)) #ms, mysql only
+
+    ###seconds between checks for new announcement data, see feed.freshness. 0 turns it off
+    FEED_FRESHNESS_INTERVAL:int = int(os.environ.get("FEED_FRESHNESS_INTERVAL", consts.FEED_FRESHNESS_INTERVAL))
+
+    ###most error and empty feeds kept in memory, 0 turns the cache off
+    FEED_NEGATIVE_CACHE_SIZE:int = int(os.environ.get("FEED_NEGATIVE_CACHE_SIZE", consts.FEED_NEGATIVE_CACHE_SIZE))
+
+    ###most query results kept in memory for all feed formats until the next announcement day, 0 turns the cache off
+    FEED_DOCUMENT_CACHE_SIZE:int = int(os.environ.get("FEED_DOCUMENT_CACHE_SIZE", consts.FEED_DOCUMENT_CACHE_SIZE))
+
+    ###most single category listings kept to merge composite queries from, 0 queries the database for every feed
+    FEED_LISTING_CACHE_SIZE:int = int(os.environ.get("FEED_LISTING_CACHE_SIZE", consts.FEED_LISTING_CACHE_SIZE))
+
+    ###most listing counts from /feed/counts kept until the next announcement day
+    FEED_COUNT_CACHE_SIZE:int = int(os.environ.get("FEED_COUNT_CACHE_SIZE", consts.FEED_COUNT_CACHE_SIZE))
+
+    ###threads loading the listings of each archive of a multi-archive query at the same time, each with its
+    ###own database connection. 0 loads them all with one query
+    FEED_ARCHIVE_WORKERS:int = int(os.environ.get("FEED_ARCHIVE_WORKERS", consts.FEED_ARCHIVE_WORKERS))
+
+    ###categories with new announcements are purged from this Fastly service when both are set
+    FEED_FASTLY_SERVICE_ID:str = os.environ.get("FEED_FASTLY_SERVICE_ID", "")
+    FEED_FASTLY_API_TOKEN:str = os.environ.get("FEED_FASTLY_API_TOKEN", "")
+    ###one process per host purges, the one holding the lock on FEED_FASTLY_PURGE_LOCK (a file in the temp
+    ###directory if empty). Turn FEED_FASTLY_PURGE off on every host but one
+    FEED_FASTLY_PURGE:bool = os.environ.get("FEED_FASTLY_PURGE", "True")=="True"
+    FEED_FASTLY_PURGE_LOCK:str = os.environ.get("FEED_FASTLY_PURGE_LOCK", "")
+
+    ###public url root of the feeds, the urls listed in /feed/manifest are those of this root.
+    ###WebSub topics must be feeds of this root or of the host the subscription was posted to
+    FEED_MANIFEST_ROOT:str = os.environ.get("FEED_MANIFEST_ROOT", consts.FEED_MANIFEST_ROOT)
+
+    ###WebSub hub at /feed/websub pushing feeds to subscribers on new announcements, see feed.websub
+    FEED_WEBSUB:bool = os.environ.get("FEED_WEBSUB", "False")=="True"
+    FEED_WEBSUB_WORKERS:int = int(os.environ.get("FEED_WEBSUB_WORKERS", consts.FEED_WEBSUB_WORKERS))
+    FEED_WEBSUB_LEASE_SECONDS:int = int(os.environ.get("FEED_WEBSUB_LEASE_SECONDS", consts.FEED_WEBSUB_LEASE_SECONDS))
+    ###most subscribers of one topic and subscriptions in all, more are refused with 429. Callbacks on
+    ###private, loopback or link-local addresses are refused unless FEED_WEBSUB_PRIVATE_CALLBACKS is on
+    FEED_WEBSUB_MAX_TOPIC_SUBSCRIBERS:int = int(os.environ.get("FEED_WEBSUB_MAX_TOPIC_SUBSCRIBERS", consts.FEED_WEBSUB_MAX_TOPIC_SUBSCRIBERS))
+    FEED_WEBSUB_MAX_SUBSCRIPTIONS:int = int(os.environ.get("FEED_WEBSUB_MAX_SUBSCRIPTIONS", consts.FEED_WEBSUB_MAX_SUBSCRIPTIONS))
+    FEED_WEBSUB_PRIVATE_CALLBACKS:bool = os.environ.get("FEED_WEBSUB_PRIVATE_CALLBACKS", "False")=="True"
+
+    ###health checks, seconds between readiness probes and announcement days of lag before data counts as stale
+    FEED_HEALTH_INTERVAL:int = int(os.environ.get("FEED_HEALTH_INTERVAL", consts.FEED_HEALTH_INTERVAL))
+    FEED_HEALTH_MAX_LAG_DAYS:int = int(os.environ.get("FEED_HEALTH_MAX_LAG_DAYS", consts.FEED_HEALTH_MAX_LAG_DAYS))
+
+    ###feeds with at least FEED_SERIALIZE_INLINE_BELOW entries are serialized in a pool of
+    ###FEED_SERIALIZE_PROCESSES worker processes, 0 serializes every feed in the request thread
+    FEED_SERIALIZE_PROCESSES:int = int(os.environ.get("FEED_SERIALIZE_PROCESSES", consts.FEED_SERIALIZE_PROCESSES))
+    FEED_SERIALIZE_INLINE_BELOW:int = int(os.environ.get("FEED_SERIALIZE_INLINE_BELOW", consts.FEED_SERIALIZE_INLINE_BELOW))
+
+    ###bounded memory mode: rows are streamed FEED_STREAM_BATCH_SIZE at a time and serialized as they arrive,
+    ###pages end early once their entries reach FEED_STREAM_MAX_BYTES. 0 batch size turns it off
+    FEED_STREAM_BATCH_SIZE:int = int(os.environ.get("FEED_STREAM_BATCH_SIZE", consts.FEED_STREAM_BATCH_SIZE))
+    FEED_STREAM_MAX_BYTES:int = int(os.environ.get("FEED_STREAM_MAX_BYTES", consts.FEED_STREAM_MAX_BYTES))
+
+    ###ASGI serving mode, see feed.asgi. Uses CLASSIC_DB_URI with an async driver unless FEED_ASYNC_DB_URI is set
+    FEED_ASYNC_DB_URI:str = os.environ.get("FEED_ASYNC_DB_URI", "")
+    FEED_ASYNC_DB_POOL_SIZE:int = int(os.environ.get("FEED_ASYNC_DB_POOL_SIZE", consts.FEED_ASYNC_DB_POOL_SIZE))
+    FEED_ASYNC_DB_MAX_OVERFLOW:int = int(os.environ.get("FEED_ASYNC_DB_MAX_OVERFLOW", consts.FEED_ASYNC_DB_MAX_OVERFLOW))
+    FEED_ASYNC_DB_POOL_RECYCLE:int = int(os.environ.get("FEED_ASYNC_DB_POOL_RECYCLE", consts.FEED_ASYNC_DB_POOL_RECYCLE))
+    FEED_ASYNC_WORKERS:int = int(os.environ.get("FEED_ASYNC_WORKERS", consts.FEED_ASYNC_WORKERS))
 
     ###add to the default URLS
     URLS: List[Tuple[str, str, str]] = [
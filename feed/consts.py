@@ -1,10 +1,41 @@
 from enum import Enum
 from typing import List, Set, Literal
 
-from feed.errors import FeedVersionError
+from feed.errors import FeedIndexerError, FeedVersionError
 
 
 FEED_NUM_DAYS = 1
+FEED_PAGE_SIZE = 2000
+FEED_MAX_AUTHORS = 25
+FEED_MAX_HISTORY_DAYS = 7
+FEED_BUNDLE_MAX_QUERIES = 200
+FEED_BUNDLE_WORKERS = 4
+FEED_ASYNC_DB_POOL_SIZE = 10
+FEED_ASYNC_DB_MAX_OVERFLOW = 20
+FEED_ASYNC_DB_POOL_RECYCLE = 3600
+FEED_ASYNC_WORKERS = 4
+FEED_DB_POOL_SIZE = 10
+FEED_DB_MAX_OVERFLOW = 10
+FEED_DB_POOL_RECYCLE = 3600
+FEED_DB_STATEMENT_TIMEOUT = 30000
+FEED_FRESHNESS_INTERVAL = 30
+FEED_NEGATIVE_CACHE_SIZE = 10000
+FEED_DOCUMENT_CACHE_SIZE = 128
+FEED_LISTING_CACHE_SIZE = 2048
+FEED_COUNT_CACHE_SIZE = 4096
+FEED_ARCHIVE_WORKERS = 0
+FEED_ANNOUNCE_WEEKDAYS = "Mon,Tue,Wed,Thu,Fri"
+FEED_MANIFEST_ROOT = "https://rss.arxiv.org/"
+FEED_WEBSUB_WORKERS = 8
+FEED_WEBSUB_LEASE_SECONDS = 10 * 24 * 3600
+FEED_WEBSUB_MAX_TOPIC_SUBSCRIBERS = 1000
+FEED_WEBSUB_MAX_SUBSCRIPTIONS = 100000
+FEED_HEALTH_INTERVAL = 15
+FEED_HEALTH_MAX_LAG_DAYS = 4
+FEED_SERIALIZE_PROCESSES = 0
+FEED_SERIALIZE_INLINE_BELOW = 500
+FEED_STREAM_BATCH_SIZE = 0
+FEED_STREAM_MAX_BYTES = 16 * 1024 * 1024
 UpdateActions = Literal['new', 'replace', 'absonly', 'cross', 'replace-cross']
 DELIMITER = "+"
 
@@ -26,6 +57,7 @@ class FeedVersion(str, Enum):
     RSS_1_0 = "RSS 1.0"
     RSS_2_0 = "RSS 2.0"
     ATOM_1_0 = "Atom 1.0"
+    JSON_1_1 = "JSON 1.1"
 
     @property
     def is_rss(self) -> bool:
@@ -40,10 +72,24 @@ class FeedVersion(str, Enum):
         """Return True if this is an Atom specification."""
         return self in (self.ATOM_1_0,)
 
+    @property
+    def is_json(self) -> bool:
+        """Return True if this is a JSON Feed specification."""
+        return self in (self.JSON_1_1,)
+
+    @property
+    def short_name(self) -> str:
+        """Return the name of the format family, as used in routes."""
+        if self.is_rss:
+            return "rss"
+        if self.is_atom:
+            return "atom"
+        return "json"
+
     @classmethod
     def supported(cls) -> Set["FeedVersion"]:
         """Return a set of supported feed versions."""
-        return {cls.RSS_2_0, cls.ATOM_1_0}
+        return {cls.RSS_2_0, cls.ATOM_1_0, cls.JSON_1_1}
 
     @classmethod
     def get(cls, version: str, atom: bool = False) -> "FeedVersion":
@@ -84,3 +130,49 @@ class FeedVersion(str, Enum):
                 return fv
         else:
             raise FeedVersionError(version=version, supported=cls.supported())
+
+
+class FeedFields(str, Enum):
+    """Profile of the entry fields in a feed, from the ``fields`` argument.
+
+    Lighter profiles leave out the abstract, the authors, or everything but
+    the ids, titles and announce types, and skip the work of producing them.
+    """
+    FULL = "full"
+    NO_ABSTRACT = "no-abstract"
+    NO_AUTHORS = "no-authors"
+    MINIMAL = "minimal"
+
+    @property
+    def abstract(self) -> bool:
+        """Return True if entries have the abstract."""
+        return self in (self.FULL, self.NO_AUTHORS)
+
+    @property
+    def authors(self) -> bool:
+        """Return True if entries have the authors."""
+        return self in (self.FULL, self.NO_ABSTRACT)
+
+    @property
+    def details(self) -> bool:
+        """Return True if entries have the categories, license, DOI and journal reference."""
+        return self != self.MINIMAL
+
+    def __str__(self) -> str:
+        return f"{self.value}"
+
+    @classmethod
+    def get(cls, value: str) -> "FeedFields":
+        """Get the profile from its name.
+
+        Raises
+        ------
+        FeedIndexerError
+            If there is no such profile.
+        """
+        try:
+            return cls(value.strip().lower())
+        except ValueError:
+            raise FeedIndexerError(
+                f"Invalid fields '{value}'. Valid options are: {', '.join(fields.value for fields in cls)}."
+            )
@@ -1,16 +1,30 @@
 """Controller for RSS Feeds."""
 
 import logging
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+from datetime import date
+from dataclasses import replace
+from concurrent.futures import Executor
 from flask import current_app
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from feed import fetch_data
-from feed.domain import DocumentSet
+from feed.cache import document_sets, listing_counts
+from feed.consts import DELIMITER, FeedFields
+from feed.domain import DocumentSet, ListingCounts
+from feed.fetch_data import DocumentStream
+from feed.keyword_index import KeywordFilter
+from feed.errors import FeedIndexerError
+from feed.schedule import get_next_announcement
 
 
 logger = logging.getLogger(__name__)
 
 
-def get_documents(query: str) -> DocumentSet:
+def get_documents(query: str, page: Optional[str] = None,
+                  dates: Optional[Tuple[date, date]] = None,
+                  since: Optional[str] = None, limit: Optional[int] = None,
+                  fields: FeedFields = FeedFields.FULL, all_authors: bool = False) -> DocumentSet:
     """
     Return the past day's RSS content from the specified XML serializer.
 
@@ -19,6 +33,19 @@ def get_documents(query: str) -> DocumentSet:
     query : str
         A concatenation of archive/category specifiers separated by delimiter
         characters.
+    page : Optional[str]
+        Cursor token for the requested page, None for the first page.
+    dates : Optional[Tuple[date, date]]
+        First and last past announcement day to return instead of the
+        current window.
+    since : Optional[str]
+        Watermark from an earlier response, only newer entries are returned.
+    limit : Optional[int]
+        Entries per page if fewer than FEED_PAGE_SIZE.
+    fields : FeedFields
+        Fields of the entries.
+    all_authors : bool
+        List every author rather than the first FEED_MAX_AUTHORS.
 
     Returns
     -------
@@ -30,17 +57,208 @@ def get_documents(query: str) -> DocumentSet:
     FeedError
         Either FeedVersionError if the feed version is incorrect or
         FeedIndexError if it fails to fetch the feed.
+
+    Notes
+    -----
+    Results are shared by every feed format through :func:`feed.cache.document_sets`,
+    keyed by the canonical query, the days searched, the page size, the
+    fields and the authors listed, until the next arXiv
+    day. Results for the current window are only kept when the freshness
+    watcher runs, it drops them as soon as new announcements arrive.
+    """
+    days = _get_feed_num_days()
+    page_size = _get_page_size(limit)
+    max_authors = _get_max_authors(all_authors)
+
+    key, topics = _documents_key(query, days, page, page_size, dates, since, fields, max_authors)
+    documents = _cached_documents(key, topics)
+    if documents is None:
+        # Get the search results, pass them to the serializer, return the results
+        generation = document_sets().generation
+        documents = fetch_data.search(query, days, page=page, page_size=page_size, dates=dates, since=since,
+                                      fields=fields, max_authors=max_authors)
+        _cache_documents(key, documents, dates, generation)
+    return documents
+
+
+def stream_documents(query: str, page: Optional[str] = None,
+                     dates: Optional[Tuple[date, date]] = None,
+                     since: Optional[str] = None, limit: Optional[int] = None,
+                     fields: FeedFields = FeedFields.FULL, all_authors: bool = False) -> DocumentStream:
+    """
+    Same as :func:`get_documents`, but the documents are made one at a time
+    as FEED_STREAM_BATCH_SIZE rows at a time are read from the database.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the query, page or since token is invalid.
+    """
+    days = _get_feed_num_days()
+    page_size = _get_page_size(limit)
+    batch_size = int(current_app.config["FEED_STREAM_BATCH_SIZE"])
+    return fetch_data.search_stream(query, days, page=page, page_size=page_size, dates=dates, since=since,
+                                    batch_size=batch_size, fields=fields, max_authors=_get_max_authors(all_authors))
+
+
+async def get_documents_async(session: AsyncSession, query: str, page: Optional[str] = None,
+                              since: Optional[str] = None, executor: Optional[Executor] = None,
+                              limit: Optional[int] = None, fields: FeedFields = FeedFields.FULL,
+                              all_authors: bool = False) -> DocumentSet:
+    """
+    Async version of :func:`get_documents` for the current window, used by the ASGI app.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        Session to run the queries on.
+    executor : Optional[Executor]
+        Pool for the CPU bound work, the loop's default executor if None.
+
+    Other parameters and errors are the same as :func:`get_documents`.
+    """
+    days = _get_feed_num_days()
+    page_size = _get_page_size(limit)
+    max_authors = _get_max_authors(all_authors)
+    key, topics = _documents_key(query, days, page, page_size, None, since, fields, max_authors)
+    documents = _cached_documents(key, topics)
+    if documents is None:
+        generation = document_sets().generation
+        documents = await fetch_data.search_async(session, query, days, page=page, page_size=page_size,
+                                                  since=since, executor=executor, fields=fields,
+                                                  max_authors=max_authors)
+        _cache_documents(key, documents, None, generation)
+    return documents
+
+
+def get_filtered_documents(query: str, keywords: KeywordFilter, page: Optional[str] = None,
+                           limit: Optional[int] = None, fields: FeedFields = FeedFields.FULL,
+                           all_authors: bool = False) -> DocumentSet:
+    """
+    Return the current content of the query that matches the keywords, see :mod:`feed.keyword_index`.
+
+    Parameters
+    ----------
+    keywords : KeywordFilter
+        Words and author the papers must have.
+
+    Other parameters and errors are the same as :func:`get_documents`.
+
+    Notes
+    -----
+    Results are kept per query and filter like those of :func:`get_documents`.
+    """
+    days = _get_feed_num_days()
+    page_size = _get_page_size(limit)
+    max_authors = _get_max_authors(all_authors)
+    key, topics = _documents_key(query, days, page, page_size, None, None, fields, max_authors)
+    key = (key, keywords)
+    documents = _cached_documents(key, topics)
+    if documents is None:
+        generation = document_sets().generation
+        documents = fetch_data.search_filtered(query, days, keywords, page=page, page_size=page_size,
+                                               fields=fields, max_authors=max_authors)
+        _cache_documents(key, documents, None, generation)
+    return documents
+
+
+def get_bundle(queries: List[str]) -> Dict[str, Union[DocumentSet, FeedIndexerError]]:
+    """
+    Return the past day's content for many queries from one load of the listings.
+
+    Parameters
+    ----------
+    queries : List[str]
+        Queries of the same form accepted by :func:`get_documents`.
+
+    Returns
+    -------
+    Dict[str, Union[DocumentSet, FeedIndexerError]]
+        Results for each query, in request order, errors for invalid queries.
+    """
+    days = _get_feed_num_days()
+    limit = int(current_app.config["FEED_PAGE_SIZE"])
+    return fetch_data.search_bundle(queries, days, limit=limit, max_authors=_get_max_authors(False))
+
+
+def get_counts(query: str) -> ListingCounts:
     """
+    Return the number of listings of each type in the query's current feed.
+
+    Parameters
+    ----------
+    query : str
+        Query of the same form accepted by :func:`get_documents`.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the query is invalid.
+
+    Notes
+    -----
+    Counts are kept per canonical query and arXiv day until the next
+    announcement, like the results of :func:`get_documents`.
+    """
+    days = _get_feed_num_days()
+    first_day, last_day = fetch_data.get_date_window(days)
+    key = (fetch_data.canonical_query(query), first_day, last_day)
+    counts = listing_counts().get(key)
+    if counts is None:
+        generation = listing_counts().generation
+        counts = fetch_data.count_listings(query, days)
+        if "feed_freshness" in current_app.extensions:
+            listing_counts().set(key, counts, get_next_announcement().timestamp(), generation)
+    return counts
+
+
+def _documents_key(query: str, days: int, page: Optional[str], page_size: int,
+                   dates: Optional[Tuple[date, date]], since: Optional[str],
+                   fields: FeedFields = FeedFields.FULL, max_authors: int = 0) -> Tuple[Hashable, List[str]]:
+    """Cache key of the search, the same for every format and order of the
+    categories, and the query's topics in its own order.
+    """
+    archives, categories = fetch_data.validate_request(query)
+    topics = [archive.id for archive in archives] + [cat.id for cat in categories]
+    first_day, last_day = dates if dates else fetch_data.get_date_window(days)
+    key = (DELIMITER.join(sorted(set(topics))), first_day, last_day, dates is None, page, since, page_size, fields,
+           max_authors)
+    return key, topics
+
+
+def _cached_documents(key: Hashable, topics: List[str]) -> Optional[DocumentSet]:
+    documents = document_sets().get(key)
+    if documents is not None and documents.categories != topics:
+        #same categories asked for in another order, which is kept in the titles
+        documents = replace(documents, categories=topics)
+    return documents
+
+
+def _cache_documents(key: Hashable, documents: DocumentSet, dates: Optional[Tuple[date, date]],
+                     generation: int) -> None:
+    #the current window only changes with new announcements, which the freshness watcher notices.
+    #documents read before it cleared the cache for new announcements are not kept
+    if dates or "feed_freshness" in current_app.extensions:
+        document_sets().set(key, documents, get_next_announcement().timestamp(), generation)
+
+
+def _get_page_size(limit: Optional[int]) -> int:
+    page_size = int(current_app.config["FEED_PAGE_SIZE"])
+    return min(limit, page_size) if limit else page_size
+
+
+def _get_max_authors(all_authors: bool) -> int:
+    return 0 if all_authors else int(current_app.config["FEED_MAX_AUTHORS"])
+
+
+def _get_feed_num_days() -> int:
     # Get the number of days for which results are to be returned
     feed_num_days: str = current_app.config["FEED_NUM_DAYS"]
     try:
-        days = int(feed_num_days)
+        return int(feed_num_days)
     except ValueError:
         logger.error(
             "Invalid configuration - FEED_NUM_DAYS: '%s'. Setting to 1.",
             feed_num_days,
         )
-        days = 1
-
-    # Get the search results, pass them to the serializer, return the results
-    return fetch_data.search(query, days)
+        return 1
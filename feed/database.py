@@ -1,10 +1,20 @@
-from typing import List, Tuple
+from typing import AbstractSet, Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 from datetime import date
+from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+import heapq
 import logging 
+import threading
+import time
 
-from sqlalchemy.orm import aliased
-from sqlalchemy.orm.query import Query
-from sqlalchemy import and_, or_, case, desc
+from flask import current_app, has_app_context
+from sqlalchemy.orm import aliased, scoped_session, sessionmaker
+from sqlalchemy import Engine, Label, Row, Select, Subquery, and_, or_, case, desc, select, create_engine, event, literal
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.sql import func
 
 from arxiv.taxonomy.definitions import ARCHIVES_SUBSUMED
@@ -12,16 +22,122 @@ from arxiv.taxonomy.category import Archive, Category
 from arxiv.db import Session
 from arxiv.db.models import Metadata, Updates, DocumentCategory
 
-from feed.consts import UpdateActions
+from feed.consts import UpdateActions, FEED_PAGE_SIZE
+from feed.domain import PageCursor
 
 logger = logging.getLogger(__name__)
 
-def get_announce_papers(first_day: date, last_day: date, archives: List[Archive], categories: List[Category])->List[Tuple[UpdateActions, Metadata]]:
-    result_limit = 2000
-    version_threshold = 6
+#replacements at or above this version are not listed
+VERSION_THRESHOLD = 6
 
-    category_list=_all_possible_categories(archives, categories)
+#position of each listing type in the feed, rows are sorted by this then by descending paper_id
+LISTING_ORDER = {'new': 4, 'cross': 3, 'replace': 2, 'replace-cross': 1}
 
+#action kept for a paper with several updates in the window, lowest first
+ACTION_PRIORITY = {'new': 0, 'cross': 1, 'replace': 2}
+
+def listing_order_of(listing_type: str) -> int:
+    return LISTING_ORDER.get(listing_type, 0)
+
+def get_announce_papers(first_day: date, last_day: date, archives: List[Archive], categories: List[Category],
+                        cursor: Optional[PageCursor] = None, limit: int = FEED_PAGE_SIZE
+                        )->List[Tuple[UpdateActions, Metadata]]:
+    """returns listings for the categories and dates in feed order, at most limit rows.
+    If a cursor is given only rows after it (or before it for backward cursors) are returned,
+    using a keyset comparison on (listing order, paper_id) rather than an offset.
+    """
+    result_query = announce_papers_statement(first_day, last_day, archives, categories, cursor, limit)
+    results = in_feed_order(read_rows(result_query), cursor)
+
+    if len(results) <1 and cursor is None:
+        archive_ids = ', '.join(archive.id for archive in archives)
+        category_ids = ', '.join(category.id for category in categories)
+        str=f"No results for db query. first day: {first_day}, last day: {last_day}, archives: [{archive_ids}], categories: [{category_ids}]\n"
+        _debug_no_response(str)
+       
+
+    return results
+
+def stream_announce_papers(first_day: date, last_day: date, archives: List[Archive], categories: List[Category],
+                           cursor: Optional[PageCursor] = None, limit: int = FEED_PAGE_SIZE, batch_size: int = 100
+                           ) -> Iterator[Tuple[UpdateActions, Metadata]]:
+    """same rows as get_announce_papers, fetched batch_size rows at a time so only one batch is in memory.
+    rows for a backward cursor have to be reversed, so those pages are still read at once
+    """
+    result_query = announce_papers_statement(first_day, last_day, archives, categories, cursor, limit)
+    if cursor is not None and not cursor.forward:
+        return iter(in_feed_order(read_rows(result_query), cursor))
+    return stream_rows(result_query, batch_size)
+
+def announce_papers_statement(first_day: date, last_day: date, archives: List[Archive], categories: List[Category],
+                              cursor: Optional[PageCursor] = None, limit: int = FEED_PAGE_SIZE) -> Select:
+    """builds the query for get_announce_papers, rows for a backward cursor come out in reverse
+    feed order and need to be passed through in_feed_order
+    """
+    all, listing_type = _listings_subquery(first_day, last_day, _all_possible_categories(archives, categories))
+
+    listing_order = case(
+            (listing_type == 'new', 4),
+            (listing_type == 'cross', 3),
+            (listing_type == 'replace', 2),
+            (listing_type == 'replace-cross', 1),
+        else_=0 
+    ).label('case_order')
+
+    #data for listings to be displayed
+    meta = aliased(Metadata)
+    result_query = (
+        select(
+            listing_type,
+            meta
+        )
+        .select_from(all)
+        .join(meta, meta.document_id == all.c.document_id)
+        .where(meta.is_current ==1)
+    )
+
+    if cursor is None or cursor.forward:
+        if cursor is not None:
+            result_query = result_query.where(or_(
+                listing_order > cursor.listing_order,
+                and_(listing_order == cursor.listing_order, meta.paper_id < cursor.paper_id)
+            ))
+        return result_query.order_by(listing_order, meta.paper_id.desc()).limit(limit)
+
+    #walk backwards from the cursor, in_feed_order flips the rows back
+    return (
+        result_query.where(or_(
+            listing_order < cursor.listing_order,
+            and_(listing_order == cursor.listing_order, meta.paper_id > cursor.paper_id)
+        ))
+        .order_by(listing_order.desc(), meta.paper_id.asc())
+        .limit(limit)
+    )
+
+def count_announce_papers(first_day: date, last_day: date, archives: List[Archive], categories: List[Category]
+                          ) -> Dict[str, int]:
+    """number of listings of each listing type that get_announce_papers would return for the categories
+    and dates, counted in the database without loading any metadata
+    """
+    counts = {listing_type: 0 for listing_type in LISTING_ORDER}
+    for listing_type, count in read_rows(count_announce_papers_statement(first_day, last_day, archives, categories)):
+        if listing_type in counts:
+            counts[listing_type] = count
+    return counts
+
+def count_announce_papers_statement(first_day: date, last_day: date, archives: List[Archive],
+                                    categories: List[Category]) -> Select:
+    all, listing_type = _listings_subquery(first_day, last_day, _all_possible_categories(archives, categories))
+    return (
+        select(listing_type, func.count())
+        .select_from(all)
+        .join(Metadata, Metadata.document_id == all.c.document_id)
+        .where(Metadata.is_current == 1) #only papers get_announce_papers lists
+        .group_by(listing_type)
+    )
+
+def _listings_subquery(first_day: date, last_day: date, category_list: List[str]) -> Tuple[Subquery, Label[str]]:
+    """one row per listed paper with its document_id, action and is_primary, and the listing_type expression"""
     up=aliased(Updates)
     case_order = case(
             (up.action == 'new', 0),
@@ -31,14 +147,14 @@ def get_announce_papers(first_day: date, last_day: date, archives: List[Archive]
     ).label('case_order')
  
     doc_ids=(
-        Session.query(
+        select(
             up.document_id,
             up.action
         )
-        .filter(up.date.between(first_day, last_day))
-        .filter(up.action!="absonly")
-        .filter(or_(up.action != 'replace', up.version < version_threshold)) #replacements below a certain version
-        .filter(up.category.in_(category_list))
+        .where(up.date.between(first_day, last_day))
+        .where(up.action!="absonly")
+        .where(or_(up.action != 'replace', up.version < VERSION_THRESHOLD)) #replacements below a certain version
+        .where(up.category.in_(category_list))
         .group_by(up.document_id) #one listings per paper
         .order_by(case_order) #action kept chosen by priority if multiple
         .subquery() 
@@ -47,7 +163,7 @@ def get_announce_papers(first_day: date, last_day: date, archives: List[Archive]
     dc = aliased(DocumentCategory)
     #all listings for the specific category set
     all = (
-        Session.query(
+        select(
             doc_ids.c.document_id, 
             doc_ids.c.action,  
             func.max(dc.is_primary).label('is_primary')
@@ -66,38 +182,223 @@ def get_announce_papers(first_day: date, last_day: date, archives: List[Archive]
             (all.c.action == 'replace', 'replace-cross'),
         else_="no_match"
     ).label('listing_type')
+    return all, listing_type
 
-    listing_order = case(
-            (listing_type == 'new', 4),
-            (listing_type == 'cross', 3),
-            (listing_type == 'replace', 2),
-            (listing_type == 'replace-cross', 1),
-        else_=0 
-    ).label('case_order')
+def in_feed_order(rows: Sequence[Any], cursor: Optional[PageCursor]) -> List[Any]:
+    """rows from announce_papers_statement in feed order"""
+    if cursor is not None and not cursor.forward:
+        return list(rows)[::-1]
+    return list(rows)
 
-    #data for listings to be displayed
-    meta = aliased(Metadata)
-    result_query = (
-        Session.query(
-            listing_type,
-            meta
+def listing_type_of(action: str, is_primary: int) -> str:
+    """python equivalent of the listing_type expression in get_announce_papers"""
+    if action == 'new' and is_primary == 1:
+        return 'new'
+    if action in ('new', 'cross'):
+        return 'cross'
+    if action == 'replace' and is_primary == 1:
+        return 'replace'
+    if action == 'replace':
+        return 'replace-cross'
+    return 'no_match'
+
+
+@dataclass(frozen=True)
+class CategoryListing:
+    """one category's part of the listings of every query that includes it, over a date range.
+
+    entries are (paper_id, document_id, action, is_primary) sorted by descending paper_id, for each
+    paper updated in the range that has an update or a document category in this category.
+    action is the paper's highest priority update in the category, None if it has none here,
+    is_primary is for this category being one of its document categories, None if it isn't.
+    the listing type of a paper depends on all the categories of a query, so listings of a query
+    are derived from these by merge_category_listings rather than kept per category
+    """
+    entries: Tuple[Tuple[str, int, Optional[str], Optional[int]], ...]
+    metadata: Dict[int, Metadata]
+
+def load_category_listings(first_day: date, last_day: date, category_list: Iterable[str]
+                           ) -> Dict[str, CategoryListing]:
+    """listings of each category over the days, with three queries however many categories there are"""
+    category_list = list(category_list)
+    if not category_list:
+        return {}
+    updated = (
+        select(Updates.document_id)
+        .where(Updates.date.between(first_day, last_day))
+        .where(Updates.action != "absonly")
+        .where(or_(Updates.action != 'replace', Updates.version < VERSION_THRESHOLD))
+    )
+    in_categories = updated.where(Updates.category.in_(category_list))
+    actions: Dict[str, Dict[int, str]] = {category: {} for category in category_list}
+    for document_id, action, category in read_rows(in_categories.add_columns(Updates.action, Updates.category)):
+        category_actions = actions.setdefault(category, {})
+        current = category_actions.get(document_id)
+        if current is None or ACTION_PRIORITY.get(action, 3) < ACTION_PRIORITY.get(current, 3):
+            category_actions[document_id] = action
+
+    #memberships of every paper updated in the range, a paper can be listed for
+    #an update in one category of a query and a document category in another
+    dc_rows = (
+        select(DocumentCategory.document_id, DocumentCategory.category, DocumentCategory.is_primary)
+        .where(DocumentCategory.document_id.in_(updated))
+        .where(DocumentCategory.category.in_(category_list))
+    )
+    primaries: Dict[str, Dict[int, int]] = {category: {} for category in category_list}
+    for document_id, category, is_primary in read_rows(dc_rows):
+        primaries.setdefault(category, {})[document_id] = int(is_primary)
+
+    meta_rows = (
+        select(Metadata)
+        .where(or_(
+            Metadata.document_id.in_(in_categories),
+            Metadata.document_id.in_(select(dc_rows.subquery().c.document_id)),
+        ))
+        .where(Metadata.is_current == 1)
+    )
+    metadata: Dict[int, Metadata] = {meta.document_id: meta for meta, in read_rows(meta_rows)}
+
+    listings = {}
+    for category in set(actions) | set(primaries):
+        category_actions = actions.get(category, {})
+        category_primaries = primaries.get(category, {})
+        entries = []
+        for document_id in set(category_actions) | set(category_primaries):
+            meta = metadata.get(document_id)
+            if meta is not None:
+                entries.append((meta.paper_id, document_id, category_actions.get(document_id),
+                                category_primaries.get(document_id)))
+        entries.sort(reverse=True)
+        listings[category] = CategoryListing(
+            tuple(entries), {entry[1]: metadata[entry[1]] for entry in entries}
         )
-        .join(meta, meta.document_id == all.c.document_id)
-        .filter(meta.is_current ==1)
-        .order_by(listing_order, meta.paper_id.desc())
-        .limit(result_limit) 
+    return listings
+
+def load_category_listings_parallel(first_day: date, last_day: date, category_list: Iterable[str],
+                                    workers: int) -> Dict[str, CategoryListing]:
+    """load_category_listings run for each archive's categories at the same time, on a pool of workers
+    threads with a session of their own. needs an app context
+    """
+    groups: Dict[str, List[str]] = {}
+    for category in category_list:
+        groups.setdefault(category.split(".")[0], []).append(category)
+    if len(groups) < 2 or workers < 1:
+        return load_category_listings(first_day, last_day, [c for group in groups.values() for c in group])
+
+    app = current_app._get_current_object() # type: ignore[attr-defined]
+    def load(categories: List[str]) -> Dict[str, CategoryListing]:
+        with app.app_context():
+            try:
+                return load_category_listings(first_day, last_day, categories)
+            finally:
+                Session.remove()
+                remove_replica_session()
+
+    listings: Dict[str, CategoryListing] = {}
+    for loaded in _archive_pool(workers).map(load, groups.values()):
+        listings.update(loaded)
+    return listings
+
+def get_announce_papers_parallel(first_day: date, last_day: date, archives: List[Archive], categories: List[Category],
+                                 cursor: Optional[PageCursor] = None, limit: int = FEED_PAGE_SIZE, workers: int = 4
+                                 ) -> List[Tuple[UpdateActions, Metadata]]:
+    """same rows as get_announce_papers, with each archive's part loaded by its own queries at the same
+    time. papers listed in several archives are merged into one row with the listing type of the whole query
+    """
+    listings = load_category_listings_parallel(
+        first_day, last_day, _all_possible_categories(archives, categories), workers
     )
+    return merge_category_listings(listings.values(), cursor, limit)
 
-    results=result_query.all()
-    
-    if len(results) <1:
-        archive_ids = ', '.join(archive.id for archive in archives)
-        category_ids = ', '.join(category.id for category in categories)
-        str=f"No results for db query. first day: {first_day}, last day: {last_day}, archives: [{archive_ids}], categories: [{category_ids}]\n"
-        _debug_no_response(str,result_query)
-       
+_archive_pools: Dict[int, ThreadPoolExecutor] = {}
+_archive_pool_lock = threading.Lock()
+
+def _archive_pool(workers: int) -> ThreadPoolExecutor:
+    with _archive_pool_lock:
+        if workers not in _archive_pools:
+            _archive_pools[workers] = ThreadPoolExecutor(workers, thread_name_prefix="feed-archive")
+        return _archive_pools[workers]
+
+def merge_category_listings(listings: Iterable[CategoryListing], cursor: Optional[PageCursor] = None,
+                            limit: int = FEED_PAGE_SIZE, document_ids: Optional[AbstractSet[int]] = None
+                            ) -> List[Tuple[UpdateActions, Metadata]]:
+    """same rows as get_announce_papers for the union of the listings' categories,
+    only of the papers in document_ids if it is given.
+
+    the listings are already sorted by paper_id, so they are merged in one pass into
+    a bucket per listing type, which together are in feed order. a row is only kept if it
+    can be among the limit rows returned, and the merge stops once none can be
+    """
+    listings = list(listings)
+    forward = cursor is None or cursor.forward
+    first_order = cursor.listing_order if cursor is not None and cursor.forward else 0
+    buckets: Dict[int, Deque[Tuple[UpdateActions, Metadata]]] = {}
+    merged = heapq.merge(*(listing.entries for listing in listings), key=itemgetter(0), reverse=True)
+    for paper_id, group in groupby(merged, key=itemgetter(0)):
+        action: Optional[str] = None
+        is_primary: Optional[int] = None
+        document_id = 0
+        for _, document_id, entry_action, entry_primary in group:
+            if document_ids is not None and document_id not in document_ids:
+                break
+            if entry_action is not None and (
+                action is None or ACTION_PRIORITY.get(entry_action, 3) < ACTION_PRIORITY.get(action, 3)
+            ):
+                action = entry_action
+            if entry_primary is not None and (is_primary is None or entry_primary > is_primary):
+                is_primary = entry_primary
+        if action is None or is_primary is None:
+            continue
+        listing_type = listing_type_of(action, is_primary)
+        order = listing_order_of(listing_type)
+        if cursor is not None:
+            after = _after_cursor(order, paper_id, cursor)
+            if after != cursor.forward or paper_id == cursor.paper_id:
+                continue
+        if forward:
+            #later rows go to the end of their bucket, after every row of the buckets before it
+            if sum(len(rows) for bucket, rows in buckets.items() if bucket <= order) >= limit:
+                if sum(len(rows) for bucket, rows in buckets.items() if bucket <= first_order) >= limit:
+                    break
+                continue
+        meta = next(listing.metadata[document_id] for listing in listings if document_id in listing.metadata)
+        #going backwards only the last limit rows of each bucket can be returned
+        bucket = buckets.setdefault(order, deque() if forward else deque(maxlen=limit))
+        bucket.append((listing_type, meta)) # type: ignore
+
+    rows = [row for order in sorted(buckets) for row in buckets[order]]
+    if forward:
+        return rows[:limit]
+    return rows[max(0, len(rows) - limit):]
+
+def _after_cursor(order: int, paper_id: str, cursor: PageCursor) -> bool:
+    return order > cursor.listing_order or (order == cursor.listing_order and paper_id < cursor.paper_id)
+
+class AnnounceListings:
+    """The listings of each of a set of categories over a date range, see CategoryListing.
+
+    Loaded with three queries, after which the listings for any combination of those categories
+    are merged in memory by merge_category_listings. Used to answer many feed queries for the
+    same days without querying the database for each one.
+    """
+
+    def __init__(self, first_day: date, last_day: date, category_list: Iterable[str]):
+        self.listings = load_category_listings(first_day, last_day, category_list)
+        self.metadata: Dict[int, Metadata] = {}
+        for listing in self.listings.values():
+            self.metadata.update(listing.metadata)
 
-    return results # type: ignore
+    def get_papers(self, archives: List[Archive], categories: List[Category], limit: int = FEED_PAGE_SIZE
+                   ) -> List[Tuple[UpdateActions, Metadata]]:
+        """same results as get_announce_papers for the first page, the categories must be among those loaded"""
+        return self.get_category_papers(set(_all_possible_categories(archives, categories)), limit)
+
+    def get_category_papers(self, category_set: Set[str], limit: int = FEED_PAGE_SIZE,
+                            document_ids: Optional[AbstractSet[int]] = None, cursor: Optional[PageCursor] = None
+                            ) -> List[Tuple[UpdateActions, Metadata]]:
+        """listings of the categories, only of the papers in document_ids if it is given"""
+        listings = [self.listings[category] for category in category_set if category in self.listings]
+        return merge_category_listings(listings, cursor, limit, document_ids)
 
 def _all_possible_categories(archives:List[Archive], categories:List[Category]) -> List[str]:
     """returns a list of all category ids that may be relevant for list of archives and categories, 
@@ -117,21 +418,171 @@ def _all_possible_categories(archives:List[Archive], categories:List[Category])
     return list(all)
 
 
-def _debug_no_response(msg:str, query: Query)->None:
-    
-    actual_query=str(query.statement.compile(compile_kwargs={"literal_binds": True}))
-    
-    recent_entry = (
-        Session.query(Updates)
-        .order_by(desc(Updates.date))
-        .first()
-    )
-    log=msg+f"most recent entry: {recent_entry}"
+#at most one no results warning per interval, the most recent entry only changes daily so it is looked up less often
+DEBUG_NO_RESPONSE_INTERVAL = 60
+DEBUG_RECENT_ENTRY_TTL = 600
+_debug_lock = threading.Lock()
+_debug_last_logged = float("-inf")
+_recent_entry: Tuple[float, Optional[str]] = (0.0, None)
+
+def _debug_no_response(msg:str)->None:
+    global _debug_last_logged
+    now = time.monotonic()
+    with _debug_lock:
+        if now - _debug_last_logged < DEBUG_NO_RESPONSE_INTERVAL:
+            return
+        _debug_last_logged = now
+
+    log=msg+f"most recent entry: {_most_recent_entry(now)}"
     logger.warning(log)
     return
 
+def _most_recent_entry(now: float) -> Optional[str]:
+    global _recent_entry
+    checked_at, entry = _recent_entry
+    if checked_at and now - checked_at < DEBUG_RECENT_ENTRY_TTL:
+        return entry
+    rows = read_rows(select(Updates).order_by(desc(Updates.date)).limit(1))
+    entry = str(rows[0][0]) if rows else None
+    _recent_entry = (now, entry)
+    return entry
+
+def get_update_watermark(last_day: date) -> Optional[Tuple[date, int]]:
+    """returns the latest day with updates on or before last_day and its number of update rows,
+    None if there are no updates at all
+    """
+    rows = read_rows(update_watermark_statement(last_day))
+    if not rows:
+        return None
+    row = rows[0]
+    return row[0], row[1]
+
+def update_watermark_statement(last_day: date) -> Select:
+    latest = (
+        select(func.max(Updates.date))
+        .where(Updates.date <= last_day)
+        .scalar_subquery()
+    )
+    return (
+        select(Updates.date, func.count())
+        .where(Updates.date == latest)
+        .group_by(Updates.date)
+    )
+
+def count_updates_on(day: date) -> int:
+    """returns the number of update rows for a single day"""
+    return read_rows(count_updates_statement(day))[0][0] or 0
+
+def count_updates_statement(day: date) -> Select:
+    return select(func.count()).select_from(Updates).where(Updates.date == day)
+
+def last_listing_days(first_day: date, last_day: date) -> Dict[str, date]:
+    """latest day of the range with listings in each category that has any"""
+    query = (
+        select(Updates.category, func.max(Updates.date))
+        .where(Updates.date.between(first_day, last_day))
+        .where(Updates.action != "absonly")
+        .where(or_(Updates.action != 'replace', Updates.version < VERSION_THRESHOLD))
+        .group_by(Updates.category)
+    )
+    return {category: day for category, day in read_rows(query)}
+
 def check_service() -> str:
-    query=Session.query(Updates).limit(1).all()
+    """cheap connectivity check, see feed.health for the checks used by probes"""
+    query=read_rows(select(literal(1)))
     if len(query)==1:
         return "GOOD"
-    return "BAD"
\ No newline at end of file
+    return "BAD"
+
+def updated_categories(first_day: date) -> Set[str]:
+    """categories with updates on or after first_day"""
+    return {row[0] for row in read_rows(select(Updates.category).where(Updates.date >= first_day).distinct())}
+
+def latest_update_date() -> Optional[date]:
+    """the most recent announcement day in the database"""
+    latest: Optional[date] = read_rows(select(func.max(Updates.date)))[0][0]
+    return latest
+
+
+#feed queries are read only, they go to FEED_DB_REPLICA_URI when it is set
+_replica_sessions: Dict[str, scoped_session] = {}
+_replica_lock = threading.Lock()
+
+def read_rows(statement: Select) -> Sequence[Row]:
+    """runs a read only statement on the replica if one is configured, falling back
+    to the primary database (arxiv.db.Session) if there is none or it fails
+    """
+    replica = _replica_session()
+    if replica is not None:
+        try:
+            rows: Sequence[Row] = replica.execute(statement).all()
+            return rows
+        except DBAPIError as ex:
+            replica.rollback()
+            logger.warning(f"Read replica query failed, using primary database: {ex}")
+    rows = Session.execute(statement).all()
+    return rows
+
+def stream_rows(statement: Select, batch_size: int) -> Iterator[Row]:
+    """like read_rows, but the rows are fetched batch_size at a time from a server side cursor.
+    the fallback to the primary database only covers errors before the first row
+    """
+    statement = statement.execution_options(yield_per=batch_size)
+    result = None
+    replica = _replica_session()
+    if replica is not None:
+        try:
+            result = replica.execute(statement)
+        except DBAPIError as ex:
+            replica.rollback()
+            logger.warning(f"Read replica query failed, using primary database: {ex}")
+    if result is None:
+        result = Session.execute(statement)
+    try:
+        yield from result
+    finally:
+        result.close()
+
+def create_feed_engine(uri: str, config: Any) -> Engine:
+    """engine with the feed's pool settings, pre-ping and statement timeout"""
+    engine = create_engine(
+        uri,
+        pool_size=int(config["FEED_DB_POOL_SIZE"]),
+        max_overflow=int(config["FEED_DB_MAX_OVERFLOW"]),
+        pool_recycle=int(config["FEED_DB_POOL_RECYCLE"]),
+        pool_pre_ping=bool(config["FEED_DB_POOL_PRE_PING"]),
+    )
+    timeout = int(config["FEED_DB_STATEMENT_TIMEOUT"])
+    if timeout > 0 and make_url(uri).get_backend_name() == "mysql":
+        @event.listens_for(engine, "connect")
+        def set_timeout(dbapi_connection: Any, connection_record: Any) -> None:
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET SESSION MAX_EXECUTION_TIME={timeout}")
+            cursor.close()
+    return engine
+
+def _replica_session() -> Optional[scoped_session]:
+    if not has_app_context():
+        return None
+    uri: str = current_app.config.get("FEED_DB_REPLICA_URI", "")
+    if not uri:
+        return None
+    with _replica_lock:
+        if uri not in _replica_sessions:
+            engine = create_feed_engine(uri, current_app.config)
+            _replica_sessions[uri] = scoped_session(sessionmaker(bind=engine))
+        return _replica_sessions[uri]
+
+def remove_replica_session(exception: Optional[BaseException] = None) -> None:
+    """returns the thread's replica connection to the pool, called at the end of each request"""
+    for session in list(_replica_sessions.values()):
+        session.remove()
+
+def dispose_replica_engines() -> None:
+    """closes all replica connections, new ones are made on the next query"""
+    with _replica_lock:
+        for session in _replica_sessions.values():
+            session.remove()
+            bind = session.get_bind()
+            bind.dispose() # type: ignore[union-attr]
+        _replica_sessions.clear()
\ No newline at end of file
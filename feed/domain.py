@@ -1,9 +1,10 @@
 """Domain classes for the RSS feed."""
 
-from typing import List, Optional
+from typing import Dict, List, Optional
+from datetime import date
 from dataclasses import dataclass
 
-from feed.consts import UpdateActions
+from feed.consts import FeedFields, UpdateActions
 
 
 @dataclass
@@ -30,8 +31,26 @@ class Document:
     license: str
     journal_ref: Optional[str]
     update_type: UpdateActions
+    author_count: Optional[int] = None
+    """Number of authors of the paper when authors only has the first of them."""
 
-@dataclass
+@dataclass(frozen=True)
+class PageCursor:
+    """Keyset position of a listing row, used to page through large feeds."""
+
+    listing_order: int
+    paper_id: str
+    forward: bool = True
+    """True for rows after this position, False for rows before it."""
+
+@dataclass(frozen=True)
+class Watermark:
+    """Latest announcement day seen by a client and its number of update rows."""
+
+    day: date
+    updates: int
+
+@dataclass(frozen=True)
 class DocumentSet:
     """A set of :class:`.Document`s for responding to a specific RSS feed."""
 
@@ -40,3 +59,35 @@ class DocumentSet:
 
     documents: List[Document]
     """Data for all the documents that were found by the search."""
+
+    next_page: Optional[str] = None
+    """Opaque cursor for the following page of results, if there is one."""
+
+    prev_page: Optional[str] = None
+    """Opaque cursor for the preceding page of results, if there is one."""
+
+    first_day: Optional[date] = None
+    """First announcement day of a historical feed, None for the current feed."""
+
+    last_day: Optional[date] = None
+    """Last announcement day of a historical feed, None for the current feed."""
+
+    watermark: Optional[str] = None
+    """Opaque token to request only entries announced after these results."""
+
+    fields: FeedFields = FeedFields.FULL
+    """Fields the documents were made with, the others are empty and left out of the feed."""
+
+
+@dataclass(frozen=True)
+class ListingCounts:
+    """Number of listings of each type in the current feed of a query."""
+
+    query: str
+    """The canonical query."""
+
+    first_day: date
+    last_day: date
+
+    counts: Dict[str, int]
+    """Listings by listing type, 'new', 'cross', 'replace' and 'replace-cross'."""
@@ -35,3 +35,9 @@ class FeedIndexerError(FeedError):
     """An exception for returning errors from the RSS feed's indexer."""
 
     pass
+
+
+class FeedSubscriptionLimitError(FeedError):
+    """The WebSub hub has as many subscriptions as it keeps."""
+
+    pass
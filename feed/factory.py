@@ -5,7 +5,8 @@ from flask import Flask
 from arxiv.base import Base
 
 from feed.config import Settings
-from feed import routes
+from feed import routes, freshness, purge, cache, manifest, websub
+from feed.database import remove_replica_session
 
 def create_web_app() -> Flask:
     """Initialize and configure the rss application."""
@@ -15,4 +16,10 @@ def create_web_app() -> Flask:
     Base(app)
     app.url_map.strict_slashes = False
     app.register_blueprint(routes.blueprint)
+    app.teardown_appcontext(remove_replica_session)
+    freshness.init_app(app)
+    purge.init_app(app)
+    cache.init_app(app)
+    manifest.init_app(app)
+    websub.init_app(app)
     return app
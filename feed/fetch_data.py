@@ -1,22 +1,36 @@
 """Interface to Index Service for RSS feeds."""
+import asyncio
 import logging
-from typing import List, Tuple
-from datetime import timedelta
+import re
+from concurrent.futures import Executor
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+from datetime import date, timedelta
+from dataclasses import replace
 
+from flask import current_app, has_app_context
 from arxiv.taxonomy.category import Category, Archive
 from arxiv.taxonomy.definitions import ARCHIVES, CATEGORIES, ARCHIVES_ACTIVE
 from arxiv.authors import parse_author_affil
 from arxiv.db.models import Metadata
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from feed.utils import get_arxiv_midnight
+from feed.utils import (get_arxiv_midnight, encode_page_cursor, decode_page_cursor,
+    encode_watermark, decode_watermark)
+from feed.schedule import announcement_schedule
 from feed.errors import FeedIndexerError
-from feed.consts import DELIMITER, UpdateActions
-from feed.domain import Author, Document, DocumentSet
-from feed.database import get_announce_papers
+from feed.consts import DELIMITER, UpdateActions, FEED_PAGE_SIZE, FeedFields
+from feed.domain import Author, Document, DocumentSet, ListingCounts, PageCursor, Watermark
+from feed.database import (get_announce_papers, get_announce_papers_parallel, count_announce_papers, stream_announce_papers, listing_order_of, get_update_watermark,
+    count_updates_on, AnnounceListings, _all_possible_categories)
+from feed import async_database
+from feed.listings import listing_cache
+from feed.keyword_index import KeywordFilter, get_keyword_index
 
 logger = logging.getLogger(__name__)
 
-def search(query: str, days: int) -> DocumentSet:
+def search(query: str, days: int, page: Optional[str] = None, page_size: int = FEED_PAGE_SIZE,
+           dates: Optional[Tuple[date, date]] = None, since: Optional[str] = None,
+           fields: FeedFields = FeedFields.FULL, max_authors: int = 0) -> DocumentSet:
     """Search the index for records with the archive ID and dated within 24h.
 
     Parameters
@@ -27,6 +41,19 @@ def search(query: str, days: int) -> DocumentSet:
     days : int
         The number of days before the specified time for which to return
         records.
+    page : Optional[str]
+        Cursor token of the page to return, the first page if None.
+    page_size : int
+        Maximum number of documents in a page.
+    dates : Optional[Tuple[date, date]]
+        Explicit first and last announcement days, overrides days.
+    since : Optional[str]
+        Watermark token from an earlier response, only entries announced
+        after it are returned.
+    fields : FeedFields
+        Fields of the documents, the others are left empty.
+    max_authors : int
+        Most authors kept for each document, 0 to keep all of them.
 
     Returns
     -------
@@ -34,12 +61,133 @@ def search(query: str, days: int) -> DocumentSet:
         The results as a collection of Documents.
 
     """
-    documents: List[Document] = []
     archives,categories = validate_request(query)
-    records=get_records_from_db(archives,categories, days)
+    cursor = decode_page_cursor(page) if page else None
+    window, watermark = _search_window(days, dates, since)
+
+    records: List[Tuple[UpdateActions, Metadata]] = []
+    if window is not None:
+        #one extra row tells us whether there is another page past this one
+        records=get_records_from_db(archives,categories, days, cursor=cursor, limit=page_size+1, dates=window)
+
+    return build_document_set(archives, categories, records, cursor, page_size, dates, watermark, fields,
+                              max_authors)
+
+def search_stream(query: str, days: int, page: Optional[str] = None, page_size: int = FEED_PAGE_SIZE,
+                  dates: Optional[Tuple[date, date]] = None, since: Optional[str] = None,
+                  batch_size: int = 100, fields: FeedFields = FeedFields.FULL, max_authors: int = 0
+                  ) -> "DocumentStream":
+    """Same as :func:`search`, but the rows are streamed from the database
+    batch_size at a time and turned into documents as they are read.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the query, page or since token is invalid.
+    """
+    archives,categories = validate_request(query)
+    cursor = decode_page_cursor(page) if page else None
+    window, watermark = _search_window(days, dates, since)
+
+    records: Iterator[Tuple[UpdateActions, Metadata]] = iter(())
+    if window is not None:
+        records = stream_announce_papers(window[0], window[1], archives, categories, cursor=cursor,
+                                         limit=page_size+1, batch_size=batch_size)
+    return DocumentStream(archives, categories, records, cursor, page_size, dates, watermark, fields, max_authors)
+
+def search_filtered(query: str, days: int, keywords: KeywordFilter, page: Optional[str] = None,
+                    page_size: int = FEED_PAGE_SIZE, fields: FeedFields = FeedFields.FULL,
+                    max_authors: int = 0) -> DocumentSet:
+    """Same as :func:`search` for the current window, only with the papers that match the keywords.
+
+    Papers are looked up in the window's :class:`feed.keyword_index.KeywordIndex`
+    rather than the database, and paged the same way.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the query or page is invalid.
+    """
+    archives,categories = validate_request(query)
+    cursor = decode_page_cursor(page) if page else None
+    first_day, last_day = get_date_window(days)
+    #one extra row tells us whether there is another page past this one
+    records = get_keyword_index(first_day, last_day).get_papers(archives, categories, keywords, cursor,
+                                                                page_size+1)
+    return build_document_set(archives, categories, records, cursor, page_size, None, None, fields, max_authors)
+
+def _search_window(days: int, dates: Optional[Tuple[date, date]], since: Optional[str]
+                   ) -> Tuple[Optional[Tuple[date, date]], Optional[Watermark]]:
+    """days to search and the current watermark, None for days if nothing is new since the client's watermark"""
+    full_window = dates if dates else get_date_window(days)
+    window: Optional[Tuple[date, date]] = full_window
+    watermark: Optional[Watermark] = None
+    if not dates:
+        latest = get_update_watermark(full_window[1])
+        watermark = Watermark(*latest) if latest else None
+        if since is not None:
+            since_mark = decode_watermark(since)
+            since_day_updates = count_updates_on(since_mark.day) if _needs_recount(since_mark, watermark) else None
+            window = delta_window(full_window, since_mark, watermark, since_day_updates)
+    return window, watermark
+
+async def search_async(session: AsyncSession, query: str, days: int, page: Optional[str] = None,
+                       page_size: int = FEED_PAGE_SIZE, since: Optional[str] = None,
+                       executor: Optional[Executor] = None, fields: FeedFields = FeedFields.FULL,
+                       max_authors: int = 0) -> DocumentSet:
+    """Same as :func:`search` for the current window, with the queries run on an async session.
+
+    Turning the rows into documents is CPU bound, it runs on executor so the
+    event loop is free to serve other requests in the meantime.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the query, page or since token is invalid.
+    """
+    archives,categories = validate_request(query)
+    cursor = decode_page_cursor(page) if page else None
+
+    full_window = get_date_window(days)
+    window: Optional[Tuple[date, date]] = full_window
+    latest = await async_database.get_update_watermark(session, full_window[1])
+    watermark = Watermark(*latest) if latest else None
+    if since is not None:
+        since_mark = decode_watermark(since)
+        since_day_updates = None
+        if _needs_recount(since_mark, watermark):
+            since_day_updates = await async_database.count_updates_on(session, since_mark.day)
+        window = delta_window(full_window, since_mark, watermark, since_day_updates)
+
+    records: List[Tuple[UpdateActions, Metadata]] = []
+    if window is not None:
+        records = await async_database.get_announce_papers(
+            session, window[0], window[1], archives, categories, cursor=cursor, limit=page_size+1
+        )
 
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, build_document_set, archives, categories, records, cursor, page_size, None, watermark, fields,
+        max_authors
+    )
+
+def build_document_set(archives: List[Archive], categories: List[Category],
+                       records: List[Tuple[UpdateActions, Metadata]], cursor: Optional[PageCursor],
+                       page_size: int, dates: Optional[Tuple[date, date]], watermark: Optional[Watermark],
+                       fields: FeedFields = FeedFields.FULL, max_authors: int = 0) -> DocumentSet:
+    """Turn the rows fetched for a page into a DocumentSet with its paging links.
+
+    records holds up to page_size+1 rows in feed order, the extra row only
+    tells whether there is another page past this one.
+    """
+    forward = cursor is None or cursor.forward
+    has_more = len(records) > page_size
+    if has_more:
+        records = records[:page_size] if forward else records[1:]
+
+    documents: List[Document] = []
     for record in records:
-        document = create_document(record)
+        document = create_document(record, fields, max_authors)
         documents.append(document)
     
     topics=[]
@@ -47,7 +195,212 @@ def search(query: str, days: int) -> DocumentSet:
         topics.append(archive.id)
     for cat in categories:
         topics.append(cat.id)
-    return DocumentSet(topics, documents) 
+
+    next_page: Optional[str] = None
+    prev_page: Optional[str] = None
+    if records:
+        first_type, first_meta = records[0]
+        last_type, last_meta = records[-1]
+        if has_more or not forward:
+            next_page = encode_page_cursor(PageCursor(listing_order_of(last_type), last_meta.paper_id, True))
+        if cursor is not None and (has_more or forward):
+            prev_page = encode_page_cursor(PageCursor(listing_order_of(first_type), first_meta.paper_id, False))
+    first_day, last_day = dates if dates else (None, None)
+    return DocumentSet(topics, documents, next_page=next_page, prev_page=prev_page,
+                       first_day=first_day, last_day=last_day,
+                       watermark=encode_watermark(watermark) if watermark else None, fields=fields)
+
+class DocumentStream:
+    """The documents of a feed page, each made from its row as it is read from the database.
+
+    Iterate it once for the documents, keeping only the current one in
+    memory. Afterwards :meth:`document_set` gives the page without its
+    documents, for the paging links and watermark. :meth:`truncate` ends the
+    page early, its next page link then continues after the last document.
+    """
+
+    def __init__(self, archives: List[Archive], categories: List[Category],
+                 records: Iterator[Tuple[UpdateActions, Metadata]], cursor: Optional[PageCursor],
+                 page_size: int, dates: Optional[Tuple[date, date]], watermark: Optional[Watermark],
+                 fields: FeedFields = FeedFields.FULL, max_authors: int = 0):
+        self.categories = [archive.id for archive in archives] + [cat.id for cat in categories]
+        self.count = 0
+        self._records = records
+        self._cursor = cursor
+        self._page_size = page_size
+        self._dates = dates
+        self._watermark = watermark
+        self._fields = fields
+        self._max_authors = max_authors
+        self._first: Optional[Tuple[UpdateActions, str]] = None
+        self._last: Optional[Tuple[UpdateActions, str]] = None
+        self._has_more = False
+        self._truncated = False
+
+    def __iter__(self) -> Iterator[Document]:
+        records = self._records
+        if self._cursor is not None and not self._cursor.forward:
+            #backward pages arrive whole, the extra row is the first one
+            rows = list(records)
+            self._has_more = len(rows) > self._page_size
+            records = iter(rows[1:] if self._has_more else rows)
+        for record in records:
+            if self.count == self._page_size:
+                self._has_more = True
+                break
+            action, metadata = record
+            if self._first is None:
+                self._first = (action, metadata.paper_id)
+            self._last = (action, metadata.paper_id)
+            self.count += 1
+            yield create_document(record, self._fields, self._max_authors)
+        self.close()
+
+    def truncate(self) -> None:
+        """End the page at the last document produced."""
+        self._truncated = True
+        self.close()
+
+    def close(self) -> None:
+        """Release the database cursor."""
+        close = getattr(self._records, "close", None)
+        if close is not None:
+            close()
+
+    def document_set(self) -> DocumentSet:
+        """The page without documents, with the paging links of the documents produced."""
+        forward = self._cursor is None or self._cursor.forward
+        has_more = self._has_more or self._truncated
+        next_page: Optional[str] = None
+        prev_page: Optional[str] = None
+        if self._first is not None and self._last is not None:
+            first_type, first_id = self._first
+            last_type, last_id = self._last
+            if has_more or not forward:
+                next_page = encode_page_cursor(PageCursor(listing_order_of(last_type), last_id, True))
+            if self._cursor is not None and (self._has_more or forward):
+                prev_page = encode_page_cursor(PageCursor(listing_order_of(first_type), first_id, False))
+        first_day, last_day = self._dates if self._dates else (None, None)
+        return DocumentSet(self.categories, [], next_page=next_page, prev_page=prev_page,
+                           first_day=first_day, last_day=last_day,
+                           watermark=encode_watermark(self._watermark) if self._watermark else None,
+                           fields=self._fields)
+
+def search_bundle(queries: List[str], days: int, limit: int = FEED_PAGE_SIZE, max_authors: int = 0
+) -> Dict[str, Union[DocumentSet, FeedIndexerError]]:
+    """Search for many queries at once against a single load of the day's listings.
+
+    Parameters
+    ----------
+    queries : List[str]
+        Queries of the same form accepted by :func:`search`.
+    days : int
+        The number of days before the specified time for which to return
+        records.
+    limit : int
+        Maximum number of documents for each query.
+    max_authors : int
+        Most authors kept for each document, 0 to keep all of them.
+
+    Returns
+    -------
+    Dict[str, Union[DocumentSet, FeedIndexerError]]
+        The documents for each query, or the error for invalid queries.
+    """
+    results: Dict[str, Union[DocumentSet, FeedIndexerError]] = {}
+    requested: Dict[str, Tuple[List[Archive], List[Category]]] = {}
+    all_categories: Set[str] = set()
+    for query in queries:
+        try:
+            archives, categories = validate_request(query)
+        except FeedIndexerError as ex:
+            results[query] = ex
+            continue
+        requested[query] = (archives, categories)
+        all_categories.update(_all_possible_categories(archives, categories))
+
+    first_day, last_day = get_date_window(days)
+    listings = AnnounceListings(first_day, last_day, all_categories)
+
+    #papers appear in many feeds, only parse their authors once
+    converted: Dict[int, Document] = {}
+    for query, (archives, categories) in requested.items():
+        documents: List[Document] = []
+        for action, metadata in listings.get_papers(archives, categories, limit):
+            document = converted.get(metadata.document_id)
+            if document is None:
+                document = converted[metadata.document_id] = create_document((action, metadata), max_authors=max_authors)
+            elif document.update_type != action:
+                document = replace(document, update_type=action)
+            documents.append(document)
+        topics = [archive.id for archive in archives] + [cat.id for cat in categories]
+        results[query] = DocumentSet(topics, documents)
+    return {query: results[query] for query in queries}
+
+def delta_window(window: Tuple[date, date], since: Watermark, current: Optional[Watermark],
+                 since_day_updates: Optional[int] = None) -> Optional[Tuple[date, date]]:
+    """Narrow a date window to the days announced after a client's watermark.
+
+    Parameters
+    ----------
+    window : Tuple[date, date]
+        The full window the feed would normally cover.
+    since : Watermark
+        Watermark the client received with its previous response.
+    current : Optional[Watermark]
+        Watermark of the latest updates now in the database.
+    since_day_updates : Optional[int]
+        Number of update rows now on the watermark's day, needed when that
+        day is before the current one.
+
+    Returns
+    -------
+    Optional[Tuple[date, date]]
+        The narrowed window, or None if nothing was announced since.
+    """
+    if current is None or current == since:
+        return None
+    if since.day == current.day or since_day_updates != since.updates:
+        #more rows landed on the client's latest day, send that day again
+        start = since.day
+    else:
+        start = since.day + timedelta(days=1)
+    start = max(window[0], start)
+    if start > window[1]:
+        return None
+    return start, window[1]
+
+def _needs_recount(since: Watermark, current: Optional[Watermark]) -> bool:
+    """whether delta_window needs the current row count of the watermark's day"""
+    return current is not None and since.day != current.day
+
+def count_listings(query: str, days: int) -> ListingCounts:
+    """Count the listings of each type in the query's feed for the latest days announcement days.
+
+    The listings are only counted in the database, no papers are loaded.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the query is invalid, see :func:`validate_request`.
+    """
+    archives, categories = validate_request(query)
+    first_day, last_day = get_date_window(days)
+    counts = count_announce_papers(first_day, last_day, archives, categories)
+    return ListingCounts(canonical_query(query), first_day, last_day, counts)
+
+def canonical_query(query: str) -> str:
+    """Return the validated query in a normal form, with ids sorted so that
+    equivalent queries in any order or case produce the same string.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the query is invalid, see :func:`validate_request`.
+    """
+    archives, categories = validate_request(query)
+    ids = {archive.id for archive in archives} | {category.id for category in categories}
+    return DELIMITER.join(sorted(ids))
 
 def validate_request(query: str) -> Tuple[List[Archive],List[Category]]:
     """Validate the provided archive/category specification.
@@ -128,7 +481,9 @@ def validate_request(query: str) -> Tuple[List[Archive],List[Category]]:
 
     return archives,categories
 
-def get_records_from_db(archives: List[Archive], categories: List[Category], days: int
+def get_records_from_db(archives: List[Archive], categories: List[Category], days: int,
+    cursor: Optional[PageCursor] = None, limit: int = FEED_PAGE_SIZE,
+    dates: Optional[Tuple[date, date]] = None
 ) -> List[Tuple[UpdateActions, Metadata]]:
     """Retrieve all records that match the list of categories and date range.
 
@@ -143,24 +498,117 @@ def get_records_from_db(archives: List[Archive], categories: List[Category], day
     days : int
         The number of days before the end date that identifies the
         beginning of the filter window.
+    cursor : Optional[PageCursor]
+        Position to continue the listing from.
+    limit : int
+        Maximum number of rows to return.
+    dates : Optional[Tuple[date, date]]
+        Explicit inclusive date bounds to use instead of the days before today.
 
     Returns
     -------
     each row is a tuple of the AnnounceType literal and the metadata entry
 
     """
-    #start at the start of today
-    last_date=get_arxiv_midnight()
-    first_date=last_date - timedelta(days=days-1) #-1 for inclusive date bounds
-    return get_announce_papers(first_date.date(),last_date.date(), archives, categories)
+    first_date, last_date = dates if dates else get_date_window(days)
+    listings = listing_cache()
+    if listings is not None:
+        return listings.get_announce_papers(first_date, last_date, archives, categories, cursor=cursor, limit=limit)
+    workers = int(current_app.config.get("FEED_ARCHIVE_WORKERS", 0)) if has_app_context() else 0
+    if workers > 0 and len({category.split(".")[0] for category in _all_possible_categories(archives, categories)}) > 1:
+        return get_announce_papers_parallel(first_date, last_date, archives, categories, cursor=cursor, limit=limit,
+                                            workers=workers)
+    return get_announce_papers(first_date, last_date, archives, categories, cursor=cursor, limit=limit)
+
+def get_date_window(days: int) -> Tuple[date, date]:
+    """Return the inclusive first and last day of a feed covering the latest days announcement days up to today."""
+    return announcement_schedule().window(days, get_arxiv_midnight().date())
+
+#separators of the authors of a line, and the parentheses around their affiliations
+_AUTHOR_TOKENS = re.compile(r"[(),:&]|\band\b")
+_AUTHOR_SKIPPED = re.compile(r"^(et\.?\s+al\.?|Jr\.?|Sr\.?|I{2,3}|IV)?$", flags=re.IGNORECASE)
+_ENUMERATED_AFFILIATIONS = re.compile(r"^\(\s*\(")
+
+def _truncate_authors(line: str, max_authors: int) -> Tuple[str, Optional[int]]:
+    """Cut an author line after its first authors without parsing it.
+
+    Affiliations may be given after the authors they belong to, so the line
+    keeps the affiliation following the last author kept when that author has
+    none of their own, and a block of numbered affiliations at its end.
+
+    Parameters
+    ----------
+    line : str
+        authors line of the metadata
+    max_authors : int
+        most authors to keep
+
+    Returns
+    -------
+    line : str
+        the line with only the first max_authors authors
+    author_count : Optional[int]
+        number of authors of the whole line, None if it wasn't cut
+    """
+    names = 0
+    depth = 0
+    segment_start = 0
+    separator_start = 0
+    name_end: Optional[int] = None
+    kept_start = 0
+    cut: Optional[int] = None
+    #top level parentheses, as (start, end)
+    groups: List[Tuple[int, int]] = []
+    group_start = 0
+    #a separator after the end closes the last author
+    for match in _AUTHOR_TOKENS.finditer(line + ","):
+        token = match.group()
+        if token == "(":
+            if depth == 0:
+                group_start = match.start()
+                if name_end is None:
+                    name_end = match.start()
+            depth += 1
+        elif token == ")":
+            if depth > 0:
+                depth -= 1
+                if depth == 0:
+                    groups.append((group_start, match.end()))
+        elif depth == 0:
+            name = line[segment_start:match.start() if name_end is None else name_end].strip()
+            if not _AUTHOR_SKIPPED.match(name):
+                names += 1
+                if names == max_authors:
+                    kept_start = segment_start
+                elif names == max_authors + 1:
+                    cut = separator_start
+            separator_start, segment_start, name_end = match.start(), match.end(), None
+    if cut is None:
+        return line, None
+
+    enumerated = groups[-1] if groups and _ENUMERATED_AFFILIATIONS.match(line[groups[-1][0]:]) \
+        and not line[groups[-1][1]:].strip() else None
+    kept = [line[:cut].rstrip()]
+    if not any(kept_start <= start < cut for start, _ in groups):
+        following = [group for group in groups if group[0] >= cut and group != enumerated]
+        if following:
+            kept.append(line[following[0][0]:following[0][1]])
+    if enumerated is not None and enumerated[0] >= cut:
+        kept.append(line[enumerated[0]:enumerated[1]])
+    return " ".join(kept), names
 
-def create_document(record:Tuple[UpdateActions, Metadata])->Document:
+def create_document(record:Tuple[UpdateActions, Metadata], fields: FeedFields = FeedFields.FULL,
+                    max_authors: int = 0)->Document:
     """Copy data from the provided database entires into a new Document and return it.
 
     Parameters
     ----------
     record : Tuple[AnnounceTypes, ArXivMetadata]
         type of announcement listing and metadata for article
+    fields : FeedFields
+        fields to copy, the others are left empty and authors aren't parsed
+    max_authors : int
+        most authors to keep, the others are only counted. 0 keeps all of them
 
     Returns
     -------
@@ -171,21 +619,26 @@ def create_document(record:Tuple[UpdateActions, Metadata])->Document:
     action, metadata=record
   
     authors=[]
-    if metadata.authors:
-        for author in parse_author_affil(metadata.authors):
+    author_count=None
+    if metadata.authors and fields.authors:
+        line=metadata.authors
+        if max_authors:
+            line, author_count=_truncate_authors(line, max_authors)
+        for author in parse_author_affil(line)[:max_authors or None]:
             authors.append(Author(author[0],author[1],author[2],author[3:]))
 
-    categories = metadata.abs_categories.split(" ") if metadata.abs_categories else []
+    categories = metadata.abs_categories.split(" ") if metadata.abs_categories and fields.details else []
 
     return Document(    
         arxiv_id=metadata.paper_id,
         version=metadata.version,
         title=metadata.title if metadata.title else "",
-        abstract=metadata.abstract if metadata.abstract else "",
+        abstract=metadata.abstract if metadata.abstract and fields.abstract else "",
         authors=authors,
         categories=categories,
-        license=metadata.license if metadata.license else "",
-        doi=metadata.doi,
-        journal_ref=metadata.journal_ref,
-        update_type=action
+        license=metadata.license if metadata.license and fields.details else "",
+        doi=metadata.doi if fields.details else None,
+        journal_ref=metadata.journal_ref if fields.details else None,
+        update_type=action,
+        author_count=author_count
         )
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""Background watcher that notices when new announcement data lands in the database.
+
+Every FEED_FRESHNESS_INTERVAL seconds the watcher reads the latest update day
+and its row count. When they change it sends the :data:`new_announcements`
+signal with the categories that have new updates. Local caches connect to the
+signal to drop their entries, so they can keep long lifetimes and still
+refresh within seconds of an announcement::
+
+    from feed.freshness import new_announcements
+
+    @new_announcements.connect
+    def clear_my_cache(app, event):
+        ...
+"""
+import logging
+import threading
+from typing import FrozenSet, Optional
+from datetime import date
+from dataclasses import dataclass
+
+from blinker import Namespace
+from flask import Flask
+
+from feed.database import get_update_watermark, count_updates_on, updated_categories
+from feed.domain import Watermark
+from feed.fetch_data import delta_window
+from feed.utils import get_arxiv_midnight
+
+logger = logging.getLogger(__name__)
+
+_signals = Namespace()
+
+new_announcements = _signals.signal("new-announcements")
+"""Sent with the app as sender and a :class:`NewAnnouncements` as ``event``."""
+
+
+@dataclass(frozen=True)
+class NewAnnouncements:
+    """New data found in the database."""
+
+    watermark: Watermark
+    """Latest update day and row count now in the database."""
+
+    previous: Watermark
+    """What the watcher saw before."""
+
+    categories: FrozenSet[str]
+    """Categories with updates since the previous watermark."""
+
+
+class FreshnessWatcher:
+    """Polls the database for new updates in a background thread.
+
+    Parameters
+    ----------
+    app : Flask
+        App whose database is watched, sent as the sender of the signal.
+    interval : float
+        Seconds between polls.
+    """
+
+    def __init__(self, app: Flask, interval: float):
+        self.app = app
+        self.interval = interval
+        self.watermark: Optional[Watermark] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def poll(self) -> Optional[NewAnnouncements]:
+        """Check for new data now, sending the signal if there is any.
+
+        The first poll only records the current state.
+        """
+        with self.app.app_context():
+            latest = get_update_watermark(get_arxiv_midnight().date())
+            if latest is None:
+                return None
+            current = Watermark(*latest)
+            previous = self.watermark
+            self.watermark = current
+            if previous is None or previous == current:
+                return None
+
+            since_day_updates = count_updates_on(previous.day) if previous.day != current.day else None
+            window = delta_window((date.min, current.day), previous, current, since_day_updates)
+            categories = frozenset(updated_categories(window[0])) if window else frozenset()
+            event = NewAnnouncements(current, previous, categories)
+            logger.info("New announcement data up to %s in %d categories", current.day, len(categories))
+            new_announcements.send(self.app, event=event)
+            return event
+
+    def start(self) -> None:
+        """Start polling in the background if it isn't already."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="feed-freshness", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.poll()
+            except Exception as ex:
+                logger.warning("Freshness poll failed: %s", ex)
+            if self._stop.wait(self.interval):
+                return
+
+
+def init_app(app: Flask) -> None:
+    """Attach a watcher to the app, started by its first request.
+
+    FEED_FRESHNESS_INTERVAL of 0 turns the watcher off.
+    """
+    interval = float(app.config["FEED_FRESHNESS_INTERVAL"])
+    if interval <= 0:
+        return
+    watcher = FreshnessWatcher(app, interval)
+    app.extensions["feed_freshness"] = watcher
+    app.before_request(watcher.start)
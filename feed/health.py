@@ -0,0 +1,150 @@
+"""Health checks for load balancers and monitoring.
+
+There are three levels:
+
+- liveness only says the process is serving requests, it never touches the
+  database.
+- readiness reports a ``SELECT 1`` probe that is refreshed in a background
+  thread every FEED_HEALTH_INTERVAL seconds, so any number of probes cost a
+  single query per interval.
+- the deep check also reports the latest announcement day in the database,
+  looked up by the same probe, and how many announcement days it lags behind
+  today, to catch data that stopped updating. Weekends and holidays don't
+  count towards the lag.
+"""
+import logging
+import threading
+from typing import Any, Dict, Optional
+from datetime import date, datetime, timedelta
+from dataclasses import dataclass
+
+from flask import Flask, current_app
+
+from feed.database import check_service, latest_update_date
+from feed.schedule import announcement_schedule
+from feed.utils import get_arxiv_midnight, utc_now
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    """Outcome of a readiness probe."""
+
+    ok: bool
+    checked_at: datetime
+    error: Optional[str] = None
+    latest_update: Optional[date] = None
+    """Latest announcement day in the database, None if there are no updates or the probe failed."""
+
+
+class ReadinessProbe:
+    """Database probe refreshed in the background, shared by all requests of an app.
+
+    Parameters
+    ----------
+    app : Flask
+        App whose database is probed.
+    interval : float
+        Seconds between probes.
+    """
+
+    def __init__(self, app: Flask, interval: float):
+        self.app = app
+        self.interval = interval
+        self._result: Optional[ProbeResult] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def refresh(self) -> ProbeResult:
+        """Probe the database now."""
+        with self.app.app_context():
+            try:
+                ok = check_service() == "GOOD"
+                result = ProbeResult(ok, utc_now(), latest_update=latest_update_date() if ok else None)
+            except Exception as ex:
+                logger.warning("Readiness probe failed: %s", ex)
+                result = ProbeResult(False, utc_now(), str(ex))
+        self._result = result
+        return result
+
+    def result(self) -> ProbeResult:
+        """Latest probe result, not ok if the background probe has stopped refreshing it."""
+        self._start()
+        result = self._result
+        if result is None:
+            return self.refresh()
+        if utc_now() - result.checked_at > timedelta(seconds=3 * self.interval):
+            return ProbeResult(False, result.checked_at, "Readiness probe is not being refreshed.")
+        return result
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="feed-readiness", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+
+def get_probe() -> ReadinessProbe:
+    """The readiness probe of the current app, created on first use."""
+    app: Flask = current_app._get_current_object() # type: ignore[attr-defined]
+    probe: Optional[ReadinessProbe] = app.extensions.get("feed_readiness")
+    if probe is None:
+        probe = app.extensions.setdefault(
+            "feed_readiness", ReadinessProbe(app, float(app.config["FEED_HEALTH_INTERVAL"]))
+        )
+    return probe
+
+
+def liveness() -> Dict[str, Any]:
+    return {"status": "ok"}
+
+
+def readiness() -> Dict[str, Any]:
+    """Cached database status, never queries the database in the calling request
+    except for the very first probe.
+    """
+    return _report(get_probe().result())
+
+
+def _report(result: ProbeResult) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "status": "ok" if result.ok else "unavailable",
+        "checked_at": result.checked_at.isoformat(),
+    }
+    if result.error:
+        report["error"] = result.error
+    return report
+
+
+def deep_check() -> Dict[str, Any]:
+    """Readiness plus the latest announcement day in the database and its lag in announcement days.
+
+    The status is "stale" if the lag is over FEED_HEALTH_MAX_LAG_DAYS. The
+    latest day is the one of the readiness probe, so it doesn't query the
+    database either.
+    """
+    result = get_probe().result()
+    report = _report(result)
+    if not result.ok:
+        return report
+    latest = result.latest_update
+    if latest is None:
+        return {**report, "status": "stale", "latest_update": None, "lag_days": None}
+    lag = announcement_schedule().count_days(latest, get_arxiv_midnight().date())
+    stale = lag > int(current_app.config["FEED_HEALTH_MAX_LAG_DAYS"])
+    return {
+        **report,
+        "status": "stale" if stale else "ok",
+        "latest_update": latest.isoformat(),
+        "lag_days": lag,
+    }
@@ -0,0 +1,89 @@
+"""On-disk store of rendered feeds for past announcement days.
+
+Listings for a day never change once it has passed, so a feed rendered for a
+past day can be kept forever. Feeds are stored lazily the first time they are
+requested, keyed by the day range, the canonical query, the format, the page
+and the :class:`FeedVariant`.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+from typing import Optional
+from datetime import date
+from dataclasses import dataclass
+
+from flask import current_app
+
+from feed.consts import FeedFields, FeedVersion
+from feed.fetch_data import canonical_query
+from feed.serializers.feed import Feed
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FeedVariant:
+    """Request arguments that change the entries of a feed, the defaults are the usual feed."""
+
+    limit: Optional[int] = None
+    fields: FeedFields = FeedFields.FULL
+    all_authors: bool = False
+
+
+def _feed_path(query: str, first_day: date, last_day: date, version: FeedVersion, page: Optional[str],
+               variant: FeedVariant) -> Optional[str]:
+    """Location of the stored feed, None if the store is not configured."""
+    directory: str = current_app.config["FEED_HISTORY_DIR"]
+    if not directory:
+        return None
+    #the author limit is part of the key so feeds are rendered again when it is changed
+    max_authors = 0 if variant.all_authors else int(current_app.config["FEED_MAX_AUTHORS"])
+    key = (f"{canonical_query(query)}|{version.value}|{page or ''}"
+           f"|{variant.limit or ''}|{variant.fields.value}|{max_authors}")
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    extension = "json" if version.is_json else "xml"
+    return os.path.join(
+        directory, first_day.isoformat(), last_day.isoformat(), f"{name}.{version.short_name}.{extension}"
+    )
+
+
+def load_feed(query: str, first_day: date, last_day: date, version: FeedVersion, page: Optional[str] = None,
+              variant: FeedVariant = FeedVariant()) -> Optional[Feed]:
+    """Return the stored feed for the query and days, or None if there isn't one.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the query is invalid.
+    """
+    path = _feed_path(query, first_day, last_day, version, page, variant)
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return Feed(content=f.read(), version=version)
+    except FileNotFoundError:
+        return None
+
+
+def store_feed(query: str, first_day: date, last_day: date, feed: Feed, page: Optional[str] = None,
+               variant: FeedVariant = FeedVariant()) -> None:
+    """Save a successfully rendered feed for later requests.
+
+    Failing to write is logged and otherwise ignored, the feed is still served.
+    """
+    if feed.status_code != 200:
+        return
+    path = _feed_path(query, first_day, last_day, feed.version, page, variant)
+    if path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first so readers never see a partial feed
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(feed.content)
+        os.replace(tmp_path, path)
+    except OSError as ex:
+        logger.warning("Could not store historical feed at %s: %s", path, ex)
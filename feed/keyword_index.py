@@ -0,0 +1,135 @@
+"""Inverted index of the current announcements, for keyword and author filtered feeds.
+
+Feeds like ``/rss/cs.LG?q=diffusion`` or ``/rss/hep-th?author=Smith`` list the
+papers of the query's current feed whose title or abstract has every word of
+``q`` and that have an author with the last name ``author``. Rather than
+scanning Metadata with LIKE for each filter, the listings of every category
+are loaded once per announcement window with
+:class:`feed.database.AnnounceListings` and indexed by word and by author
+last name. A filter is then the intersection of the posting lists of its
+words and name, restricted to the query's categories.
+
+Words and names are compared without case or accents, and only as whole
+words. Filtered feeds are paged like the others. The index is kept until the
+next announcement day, or until new announcements are noticed when the
+freshness watcher runs.
+"""
+import re
+import unicodedata
+from typing import AbstractSet, Dict, List, Optional, Set, Tuple
+from datetime import date
+from dataclasses import dataclass
+
+from flask import current_app
+from arxiv.authors import parse_author_affil
+from arxiv.db.models import Metadata
+from arxiv.taxonomy.category import Archive, Category
+from arxiv.taxonomy.definitions import CATEGORIES
+
+from feed.consts import UpdateActions, FEED_PAGE_SIZE
+from feed.database import AnnounceListings, _all_possible_categories
+from feed.domain import PageCursor
+from feed.errors import FeedIndexerError
+from feed.lru import LRUCache
+from feed.schedule import get_current_expiry
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize(text: str) -> str:
+    """The text without accents, case folded."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized words of the text."""
+    return _WORD.findall(normalize(text))
+
+
+def normalize_name(name: str) -> str:
+    """Last name as it is indexed, its words run together so 'van der Berg' is 'vanderberg'."""
+    return "".join(tokenize(name))
+
+
+@dataclass(frozen=True)
+class KeywordFilter:
+    """Words that must all be in the title or abstract, and an author last name."""
+
+    words: Tuple[str, ...] = ()
+    author: str = ""
+
+
+def parse_filter(q: Optional[str], author: Optional[str]) -> KeywordFilter:
+    """Filter from the ``q`` and ``author`` arguments, the same for any order or case of the words.
+
+    Raises
+    ------
+    FeedIndexerError
+        If an argument is given without any words in it.
+    """
+    words = tuple(sorted(set(tokenize(q)))) if q else ()
+    name = normalize_name(author) if author else ""
+    if q and not words:
+        raise FeedIndexerError(f"Invalid q '{q}', it has no words to search for.")
+    if author and not name:
+        raise FeedIndexerError(f"Invalid author '{author}', it has no name to search for.")
+    return KeywordFilter(words, name)
+
+
+class KeywordIndex:
+    """Papers announced in a window by the words of their title and abstract and their authors' last names.
+
+    Parameters
+    ----------
+    listings : AnnounceListings
+        Listings of every category over the window.
+    """
+
+    def __init__(self, listings: AnnounceListings):
+        self.listings = listings
+        self.words: Dict[str, Set[int]] = {}
+        self.authors: Dict[str, Set[int]] = {}
+        for document_id, meta in listings.metadata.items():
+            for word in set(tokenize(f"{meta.title or ''} {meta.abstract or ''}")):
+                self.words.setdefault(word, set()).add(document_id)
+            if meta.authors:
+                for author in parse_author_affil(meta.authors):
+                    name = normalize_name(author[0])
+                    if name:
+                        self.authors.setdefault(name, set()).add(document_id)
+
+    def matches(self, keywords: KeywordFilter) -> AbstractSet[int]:
+        """Papers with all the words and the author, intersected from the shortest posting list up."""
+        postings = [self.words.get(word, set()) for word in keywords.words]
+        if keywords.author:
+            postings.append(self.authors.get(keywords.author, set()))
+        if not postings:
+            return self.listings.metadata.keys()
+        postings.sort(key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            if not found:
+                break
+            found &= posting
+        return found
+
+    def get_papers(self, archives: List[Archive], categories: List[Category], keywords: KeywordFilter,
+                   cursor: Optional[PageCursor] = None, limit: int = FEED_PAGE_SIZE
+                   ) -> List[Tuple[UpdateActions, Metadata]]:
+        """Rows of the query's feed that match the filter, in feed order, at most limit after the cursor."""
+        document_ids = self.matches(keywords)
+        if not document_ids:
+            return []
+        category_set = set(_all_possible_categories(archives, categories))
+        return self.listings.get_category_papers(category_set, limit, document_ids, cursor)
+
+
+def get_keyword_index(first_day: date, last_day: date) -> KeywordIndex:
+    """The index of the window for the current app, built if there is none."""
+    indexes: LRUCache[KeywordIndex] = current_app.extensions["feed_keyword_index"]
+    return indexes.get_or_build(
+        (first_day, last_day),
+        lambda: KeywordIndex(AnnounceListings(first_day, last_day, CATEGORIES.keys())),
+        get_current_expiry,
+    )
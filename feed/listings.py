@@ -0,0 +1,76 @@
+"""Per category listings shared by every feed query that includes the category.
+
+Composite queries like ``math+cs.AI+physics.optics`` have their categories in
+common with thousands of other queries. Instead of a query per feed, the
+listing of each category is loaded once per day range and kept, and a feed's
+listings are merged from those of its categories with
+:func:`feed.database.merge_category_listings`. The database is then queried
+once per category rather than once per distinct query.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import date
+
+from flask import current_app, has_app_context
+from arxiv.db.models import Metadata
+from arxiv.taxonomy.category import Archive, Category
+
+from feed.consts import UpdateActions, FEED_PAGE_SIZE
+from feed.database import (CategoryListing, load_category_listings, load_category_listings_parallel,
+    merge_category_listings, _all_possible_categories)
+from feed.domain import PageCursor
+from feed.lru import LRUCache
+from feed.schedule import get_next_announcement
+
+
+class ListingCache:
+    """Listings of single categories, keyed by (category, first_day, last_day)."""
+
+    def __init__(self, maxsize: int):
+        self.listings: LRUCache[CategoryListing] = LRUCache(maxsize)
+
+    def get_announce_papers(self, first_day: date, last_day: date, archives: List[Archive],
+                            categories: List[Category], cursor: Optional[PageCursor] = None,
+                            limit: int = FEED_PAGE_SIZE) -> List[Tuple[UpdateActions, Metadata]]:
+        """Same rows as :func:`feed.database.get_announce_papers`, missing categories are loaded together."""
+        listings = self.get_listings(first_day, last_day, _all_possible_categories(archives, categories))
+        return merge_category_listings(listings.values(), cursor, limit)
+
+    def get_listings(self, first_day: date, last_day: date, categories: Iterable[str]) -> Dict[str, CategoryListing]:
+        """Listings of the categories over the days, missing ones are loaded together."""
+        found: Dict[str, CategoryListing] = {}
+        missing: List[str] = []
+        for category in categories:
+            listing = self.listings.get((category, first_day, last_day))
+            if listing is None:
+                missing.append(category)
+            else:
+                found[category] = listing
+        if missing:
+            #listings loaded before the cache is cleared for new announcements are not kept
+            generation = self.listings.generation
+            expires_at = get_next_announcement().timestamp()
+            workers = int(current_app.config.get("FEED_ARCHIVE_WORKERS", 0))
+            if workers > 0:
+                loaded = load_category_listings_parallel(first_day, last_day, missing, workers)
+            else:
+                loaded = load_category_listings(first_day, last_day, missing)
+            for category in missing:
+                listing = loaded.get(category, CategoryListing((), {}))
+                self.listings.set((category, first_day, last_day), listing, expires_at, generation)
+                found[category] = listing
+        return found
+
+    def clear(self) -> None:
+        self.listings.clear()
+
+
+def listing_cache() -> Optional[ListingCache]:
+    """The listing cache of the current app.
+
+    None outside of an app, if it is turned off, or if the freshness watcher
+    isn't running to drop the listings when new announcements arrive.
+    """
+    if not has_app_context() or "feed_freshness" not in current_app.extensions:
+        return None
+    cache: Optional[ListingCache] = current_app.extensions.get("feed_listing_cache")
+    return cache
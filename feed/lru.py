@@ -0,0 +1,77 @@
+"""Least recently used cache with expiry, without dependencies on the rest of the app."""
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Thread safe cache holding at most maxsize entries, dropping the least recently used.
+
+    Entries may also have an expiry time, after which they are not returned.
+    Values read from data that the cache was cleared for in the meantime can
+    be kept out by passing the generation from before the read to set.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        #number of times the cache was cleared
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, Tuple[V, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: V, expires_at: Optional[float] = None,
+            generation: Optional[int] = None) -> None:
+        """Store value under key until the expires_at unix time, or until evicted if None.
+
+        Nothing is stored if the cache was cleared since generation.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, key: Hashable, build: Callable[[], V],
+                     expires_at: Callable[[], Optional[float]] = lambda: None) -> V:
+        """The value of key, built and stored until expires_at() if there is none.
+
+        For values that are expensive to build: one thread builds at a time
+        while the others wait for it, rather than all building the same value.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._build_lock:
+            value = self.get(key)
+            if value is None:
+                value = build()
+                self.set(key, value, expires_at())
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
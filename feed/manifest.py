@@ -0,0 +1,189 @@
+"""Manifest of every archive and category feed, so mirrors only fetch the feeds that changed.
+
+For each active archive and category the manifest has the entry count, last
+announcement day and a tag of its current feed, and the urls of its RSS and
+Atom versions served from FEED_MANIFEST_ROOT. The tag changes whenever the
+entries of the feed do, so mirrors compare it with the one of the manifest
+they fetched before. The manifest also has the watermark of the data, which
+the feeds take as their ``since`` argument.
+
+The feeds are merged from the listings of their categories, the same ones the
+routes use with the listing cache, rather than searched and serialized, so
+all of them take one load of the listings. A :class:`ManifestBuilder` builds
+it on a background thread when it is first asked for, when it expires on the
+next announcement day and when new announcements are noticed after that, and
+requests get the last one built.
+"""
+import hashlib
+import logging
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from flask import Flask, current_app
+
+from arxiv.db import Session
+from arxiv.taxonomy.definitions import ARCHIVES_ACTIVE, CATEGORIES_ACTIVE
+
+from feed import fetch_data
+from feed.consts import FeedVersion
+from feed.controller import _get_feed_num_days
+from feed.database import (CategoryListing, _all_possible_categories, get_update_watermark, last_listing_days,
+    load_category_listings, load_category_listings_parallel, merge_category_listings, remove_replica_session)
+from feed.domain import Watermark
+from feed.freshness import NewAnnouncements, new_announcements
+from feed.listings import listing_cache
+from feed.schedule import get_current_expiry
+from feed.utils import encode_watermark, utc_now
+
+logger = logging.getLogger(__name__)
+
+VERSIONS = (FeedVersion.RSS_2_0, FeedVersion.ATOM_1_0)
+#seconds before a failed build is tried again
+RETRY_SECONDS = 60
+
+
+def feed_queries() -> List[str]:
+    """Active archives and categories, outside of the test archive."""
+    archives = [archive for archive in ARCHIVES_ACTIVE if archive != "test"]
+    categories = [category.id for category in CATEGORIES_ACTIVE.values() if category.in_archive != "test"]
+    return sorted(set(archives) | set(categories))
+
+
+def build_manifest(root: str) -> Dict[str, Any]:
+    """Manifest of the feeds as served from root, the url root of the app."""
+    first_day, last_day = fetch_data.get_date_window(_get_feed_num_days())
+    page_size = int(current_app.config["FEED_PAGE_SIZE"])
+    queries = {query: _all_possible_categories(*fetch_data.validate_request(query)) for query in feed_queries()}
+    needed = sorted({category for categories in queries.values() for category in categories})
+    listings = _load_listings(first_day, last_day, needed)
+    last_days = last_listing_days(first_day, last_day)
+    latest = get_update_watermark(last_day)
+
+    feeds: Dict[str, Any] = {}
+    for query, categories in queries.items():
+        rows = merge_category_listings([listings[category] for category in categories if category in listings],
+                                       limit=page_size)
+        tag = hashlib.sha256("\n".join(f"{action} {meta.paper_id}v{meta.version}" for action, meta in rows)
+                             .encode("utf-8")).hexdigest()[:16]
+        listed = [last_days[category] for category in categories if category in last_days]
+        item: Dict[str, Any] = {
+            "entries": len(rows),
+            "last_announcement_day": max(listed).isoformat() if listed else None,
+            "tag": tag,
+        }
+        for version in VERSIONS:
+            item[version.short_name] = {"url": f"{root}{version.short_name}/{query}"}
+        feeds[query] = item
+    return {
+        "generated": utc_now().isoformat(),
+        "watermark": encode_watermark(Watermark(*latest)) if latest else None,
+        "feeds": feeds,
+    }
+
+
+def _load_listings(first_day: date, last_day: date, categories: List[str]) -> Dict[str, CategoryListing]:
+    """Listings of the categories, from the listing cache of the routes if there is one."""
+    cache = listing_cache()
+    if cache is not None:
+        return cache.get_listings(first_day, last_day, categories)
+    workers = int(current_app.config.get("FEED_ARCHIVE_WORKERS", 0))
+    if workers > 0:
+        return load_category_listings_parallel(first_day, last_day, categories, workers)
+    return load_category_listings(first_day, last_day, categories)
+
+
+class ManifestBuilder:
+    """The manifest of an app, built on a background thread.
+
+    Parameters
+    ----------
+    app : Flask
+        App whose feeds are listed, with the url root FEED_MANIFEST_ROOT.
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.manifest: Optional[Dict[str, Any]] = None
+        self.expires_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._again = False
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """The latest manifest, None until the first one is built.
+
+        An expired manifest is still returned while the next one is built.
+        """
+        if time.time() >= self.expires_at:
+            self.start(again=False)
+        return self.manifest
+
+    def start(self, again: bool = True) -> None:
+        """Build the manifest in the background.
+
+        If a build is running it is built once more afterwards when again is
+        True, as the running build may have read the data from before.
+        """
+        with self._lock:
+            if self._thread is not None:
+                self._again = self._again or again
+                return
+            self._again = False
+            self._thread = threading.Thread(target=self._run, name="feed-manifest", daemon=True)
+            self._thread.start()
+
+    def refresh(self) -> None:
+        """Build the manifest again for new announcements, if it has been asked for."""
+        if self.manifest is not None or self._thread is not None:
+            self.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the running build, True if there is none left."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            try:
+                with self.app.app_context():
+                    try:
+                        root = str(self.app.config["FEED_MANIFEST_ROOT"]).rstrip("/") + "/"
+                        manifest = build_manifest(root)
+                        expires_at = get_current_expiry()
+                    finally:
+                        Session.remove()
+                        remove_replica_session()
+                self.manifest, self.expires_at = manifest, expires_at
+            except Exception as ex:
+                logger.error("Building the feed manifest failed: %s", ex)
+                self.expires_at = time.time() + RETRY_SECONDS
+            with self._lock:
+                if not self._again:
+                    self._thread = None
+                    return
+                self._again = False
+
+
+def get_builder() -> ManifestBuilder:
+    """The manifest builder of the current app."""
+    builder: ManifestBuilder = current_app.extensions["feed_manifest"]
+    return builder
+
+
+def init_app(app: Flask) -> None:
+    """Keep a manifest for the app, built again when new announcements are noticed.
+
+    Connect it after the local caches so they are cleared before it is built.
+    """
+    builder = ManifestBuilder(app)
+    app.extensions["feed_manifest"] = builder
+
+    def rebuild_manifest(sender: Any, event: NewAnnouncements) -> None:
+        builder.refresh()
+
+    new_announcements.connect(rebuild_manifest, sender=app, weak=False)
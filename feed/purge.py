@@ -0,0 +1,168 @@
+"""Per category surrogate keys and targeted CDN purges.
+
+Every feed response is tagged with a ``feed-cat-<category>`` surrogate key for
+each category it may list, including aliases and subsumed archives, so a
+purge of a category's key evicts exactly the feeds that could show its papers.
+When FEED_FASTLY_SERVICE_ID and FEED_FASTLY_API_TOKEN are set the keys of
+categories with new announcements are purged as soon as
+:mod:`feed.freshness` notices them.
+
+Every process of the app runs its own watcher, so every process notices the
+same announcements. Only one of them purges: on each host the processes take
+turns holding an exclusive lock on FEED_FASTLY_PURGE_LOCK, and the holder
+purges for all of them. With several hosts, turn FEED_FASTLY_PURGE off on all
+but one of them.
+"""
+import os
+import json
+import fcntl
+import logging
+import tempfile
+import urllib.request
+from typing import IO
+from typing import Any, Iterable, List, Optional, Protocol, Tuple
+from functools import lru_cache
+
+from flask import Flask
+
+from feed.database import _all_possible_categories
+from feed.errors import FeedIndexerError
+from feed.fetch_data import validate_request
+from feed.freshness import NewAnnouncements, new_announcements
+
+logger = logging.getLogger(__name__)
+
+FASTLY_API = "https://api.fastly.com"
+#most keys Fastly accepts in one purge request
+FASTLY_MAX_KEYS = 256
+
+
+def category_key(category: str) -> str:
+    return f"feed-cat-{category}"
+
+
+@lru_cache(maxsize=1024)
+def category_keys(query: str) -> Tuple[str, ...]:
+    """Surrogate keys of every category a query may list, none for invalid queries."""
+    try:
+        archives, categories = validate_request(query)
+    except FeedIndexerError:
+        return ()
+    return tuple(sorted(category_key(category) for category in _all_possible_categories(archives, categories)))
+
+
+class FastlyClient(Protocol):
+    def purge_keys(self, keys: List[str]) -> None:
+        ...
+
+
+class FastlyAPIClient:
+    """Purges keys of a Fastly service through its API.
+
+    Parameters
+    ----------
+    service_id : str
+        Fastly service of the feeds.
+    token : str
+        API token with purge permission.
+    soft : bool
+        Mark content stale instead of removing it, so the edge can still
+        serve it while the origin is busy.
+    """
+
+    def __init__(self, service_id: str, token: str, soft: bool = True, timeout: float = 10):
+        self.service_id = service_id
+        self.token = token
+        self.soft = soft
+        self.timeout = timeout
+
+    def purge_keys(self, keys: List[str]) -> None:
+        for start in range(0, len(keys), FASTLY_MAX_KEYS):
+            batch = keys[start:start + FASTLY_MAX_KEYS]
+            headers = {"Fastly-Key": self.token, "Content-Type": "application/json", "Accept": "application/json"}
+            if self.soft:
+                headers["Fastly-Soft-Purge"] = "1"
+            request = urllib.request.Request(
+                f"{FASTLY_API}/service/{self.service_id}/purge",
+                data=json.dumps({"surrogate_keys": batch}).encode("utf-8"),
+                headers=headers,
+                method="POST",
+            )
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+
+
+class RecordingFastlyClient:
+    """Stand in for FastlyAPIClient that only records the purged keys."""
+
+    def __init__(self) -> None:
+        self.purged: List[List[str]] = []
+
+    def purge_keys(self, keys: List[str]) -> None:
+        self.purged.append(list(keys))
+
+
+class PurgerLock:
+    """Exclusive lock on a file, held by the one process of a host that purges.
+
+    The lock is taken the first time it is free and kept until the process
+    exits, then the next process to try takes over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Optional[IO[str]] = None
+
+    def acquire(self) -> bool:
+        """True if this process holds the lock, trying to take it if it doesn't."""
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+
+def purge_categories(categories: Iterable[str], client: FastlyClient) -> List[str]:
+    """Purge the feeds of the categories, returns the purged keys."""
+    keys = sorted({category_key(category) for category in categories})
+    if keys:
+        client.purge_keys(keys)
+    return keys
+
+
+def init_app(app: Flask, client: Optional[FastlyClient] = None) -> None:
+    """Purge the feeds of categories with new announcements.
+
+    Uses client, or the Fastly API if it is configured, otherwise does nothing.
+    Nothing is purged with FEED_FASTLY_PURGE off or while another process
+    holds the purger lock.
+    """
+    if not app.config.get("FEED_FASTLY_PURGE", True):
+        return
+    if client is None:
+        service_id = app.config.get("FEED_FASTLY_SERVICE_ID")
+        token = app.config.get("FEED_FASTLY_API_TOKEN")
+        if not (service_id and token):
+            return
+        client = FastlyAPIClient(service_id, token)
+    fastly: FastlyClient = client
+    app.extensions["feed_fastly"] = fastly
+    lock = PurgerLock(app.config.get("FEED_FASTLY_PURGE_LOCK") or
+                      os.path.join(tempfile.gettempdir(), "feed-fastly-purge.lock"))
+
+    def purge_new_announcements(sender: Any, event: NewAnnouncements) -> None:
+        try:
+            if not lock.acquire():
+                logger.debug("Another process purges the announcements up to %s", event.watermark.day)
+                return
+            keys = purge_categories(event.categories, fastly)
+            logger.info("Purged %d category keys for announcements up to %s", len(keys), event.watermark.day)
+        except Exception as ex:
+            logger.error("Purging category keys failed: %s", ex)
+
+    new_announcements.connect(purge_new_announcements, sender=app, weak=False)
@@ -1,6 +1,6 @@
 """URL routes for RSS feeds."""
-from typing import Union
-from datetime import timedelta
+from typing import List, Optional, Tuple, Union
+from datetime import date
 
 from werkzeug import Response
 from flask import request, Blueprint, make_response, redirect, url_for, current_app
@@ -8,25 +8,61 @@ from flask import request, Blueprint, make_response, redirect, url_for, current_
 from arxiv.taxonomy.definitions import ARCHIVES_ACTIVE
 from arxiv.integration.fastly.headers import add_surrogate_key
 
-from feed import controller
-from feed.consts import FeedVersion
-from feed.serializers.serializer import serialize
-from feed.errors import FeedError, FeedVersionError
-from feed.utils import get_arxiv_midnight, utc_now
-from feed.database import check_service
+from feed import controller, history, health, manifest, websub
+from feed.consts import FeedFields, FeedVersion
+from feed.cache import negative_feeds
+from feed.purge import category_keys
+from feed.serializers.feed import Feed
+from feed.serializers.serializer import serialize, serialize_stream
+from feed.serializers.bundle import serialize_bundle
+from feed.errors import FeedError, FeedVersionError, FeedIndexerError, FeedSubscriptionLimitError
+from feed.keyword_index import parse_filter
+from feed.schedule import get_next_announcement
+from feed.utils import utc_now, parse_date_range, parse_limit, parse_all_authors, etag
 
 
 blueprint = Blueprint("feed", __name__, url_prefix="/")
 
 @blueprint.route("/feed/status")
 def status() -> Response:
-    text=f"Status: {check_service()} Version: {current_app.config['VERSION']}"
+    """Status from the cached readiness probe, doesn't query the database."""
+    service = "GOOD" if health.readiness()["status"] == "ok" else "BAD"
+    text=f"Status: {service} Version: {current_app.config['VERSION']}"
     return make_response(text, 200)
 
+@blueprint.route("/feed/health/live")
+def health_live() -> Response:
+    """Liveness, the process is up and serving requests."""
+    return make_response(health.liveness(), 200)
+
+@blueprint.route("/feed/health/ready")
+def health_ready() -> Response:
+    """Readiness from the background database probe, 503 if the database is unavailable."""
+    report = health.readiness()
+    return make_response(report, 200 if report["status"] == "ok" else 503)
+
+@blueprint.route("/feed/health/deep")
+def health_deep() -> Response:
+    """Readiness plus data freshness, 503 if unavailable or the latest data is too old."""
+    report = health.deep_check()
+    return make_response(report, 200 if report["status"] == "ok" else 503)
+
 
 def _feed(query: str, version: Union[str, FeedVersion]) -> Response:
     """Return the feed in appropriate format for the past day.
 
+    Large feeds are split into pages, the optional ``page`` argument is the
+    cursor from a previous page's next/prev link. The optional ``date``
+    argument requests a past announcement day, or range of days, instead;
+    those feeds never change so they are stored and cached indefinitely.
+    The optional ``since`` argument is the watermark of an earlier response,
+    only entries announced after it are returned. Lighter feeds are asked for
+    with ``limit``, the most entries per page, and ``fields``, one of
+    'no-abstract', 'no-authors' or 'minimal' for only ids and titles. Entries
+    list their first FEED_MAX_AUTHORS authors unless ``authors`` is 'all'.
+    The current feed can be filtered to papers with all the words of ``q`` in
+    their title or abstract, and with the last name ``author``.
+
     Parameters
     ----------
     query : str
@@ -39,40 +75,201 @@ def _feed(query: str, version: Union[str, FeedVersion]) -> Response:
         Flask response object populated with the RSS or ATOM (XML) response for
         the request and ETag header added.
     """
+    dates = None
+    #errors and empty feeds are kept until the next day, empty ones only until new data is noticed
+    negative_cache = negative_feeds()
+    cache_key = (request.host_url, request.full_path)
+    cached = negative_cache.get(cache_key)
+    if cached is not None:
+        return feed_response(cached, query)
+    empty = False
     try:
         version = FeedVersion.get(version)
-        documents = controller.get_documents(query)
-        feed = serialize(documents, query=query, version=version)
+        page = request.args.get("page", default=None, type=str)
+        since = request.args.get("since", default=None, type=str)
+        date_arg = request.args.get("date", default=None, type=str)
+        limit_arg = request.args.get("limit", default=None, type=str)
+        limit = parse_limit(limit_arg, current_app.config["FEED_PAGE_SIZE"]) if limit_arg else None
+        fields = FeedFields.get(request.args.get("fields", default="full", type=str))
+        authors_arg = request.args.get("authors", default=None, type=str)
+        all_authors = parse_all_authors(authors_arg) if authors_arg else False
+        q_arg = request.args.get("q", default=None, type=str)
+        author_arg = request.args.get("author", default=None, type=str)
+        keywords = parse_filter(q_arg, author_arg) if q_arg or author_arg else None
+        if keywords and (date_arg or since):
+            raise FeedIndexerError("Parameters 'q' and 'author' can not be used with 'date' or 'since'.")
+        if date_arg:
+            if since:
+                raise FeedIndexerError("Parameters 'date' and 'since' can not be used together.")
+            dates = parse_date_range(date_arg, current_app.config["FEED_MAX_HISTORY_DAYS"])
+        variant = history.FeedVariant(limit, fields, all_authors)
+        feed = history.load_feed(query, *dates, version, page=page, variant=variant) if dates else None
+        if feed is None:
+            if keywords:
+                documents = controller.get_filtered_documents(query, keywords, page=page, limit=limit,
+                                                              fields=fields, all_authors=all_authors)
+                feed = serialize(documents, query=query, version=version)
+                empty = not documents.documents
+            elif current_app.config["FEED_STREAM_BATCH_SIZE"] > 0:
+                stream = controller.stream_documents(query, page=page, dates=dates, since=since,
+                                                     limit=limit, fields=fields, all_authors=all_authors)
+                feed = serialize_stream(stream, version=version)
+                empty = stream.count == 0
+            else:
+                documents = controller.get_documents(query, page=page, dates=dates, since=since,
+                                                     limit=limit, fields=fields, all_authors=all_authors)
+                feed = serialize(documents, query=query, version=version)
+                empty = not documents.documents
+            if dates:
+                history.store_feed(query, *dates, feed, page=page, variant=variant)
     except FeedVersionError as ex:
         feed = serialize(ex, query=query)
     except FeedError as ex:
         feed = serialize(ex, query=query, version=version)
 
+    expires_at = get_next_announcement().timestamp()
+    if feed.status_code == 400:
+        negative_cache.errors.set(cache_key, feed, expires_at)
+    elif empty and not dates and "feed_freshness" in current_app.extensions:
+        #past days are kept by the document cache and history store, with their own caching headers
+        negative_cache.empty.set(cache_key, feed, expires_at)
 
+    return feed_response(feed, query, dates)
+
+def feed_response(feed: Feed, query: str, dates: Optional[Tuple[date, date]] = None) -> Response:
+    """Response for a serialized feed with its caching headers, shared with the ASGI app.
+
+    Besides the general keys the response gets a surrogate key for each
+    category the query may list, so feeds can be purged per category.
+    """
     # Create response object from data
     response: Response = make_response(feed.content, feed.status_code)
     # Set headers
     response.headers["ETag"] = feed.etag
     response.headers["Content-Type"] = feed.content_type
-    expiration_time = (get_arxiv_midnight() + timedelta(hours=24) - utc_now()).total_seconds() #expire on next day
+    if dates and feed.status_code == 200:
+        response.headers['Cache-Control'] = "max-age=31536000, immutable" #past days never change
+    else:
+        expires = get_next_announcement()
+        expiration_time = (expires - utc_now()).total_seconds() #expire on next announcement day
+        response.headers['Cache-Control'] = f"max-age={int(expiration_time)}"
+        response.expires = expires
+        if feed.status_code == 200 and websub.get_hub() is not None:
+            response.headers["Link"] = f'<{websub.hub_link()}>; rel="hub", <{request.base_url}>; rel="self"'
+    response.headers=add_surrogate_key(response.headers,["announce", "feed", *category_keys(query)]) # type: ignore[arg-type]
+    return response
+
+@blueprint.route("/feed/bundle", methods=["GET"])
+def bundle() -> Response:
+    """Return the feeds for many queries as one zip archive.
+
+    Queries are given as repeated ``query`` arguments or comma separated, the
+    ``format`` argument is one of 'rss' (default), 'atom' or 'json'. Invalid queries
+    get an error feed in the archive like they would from their own route.
+    """
+    queries: List[str]=[]
+    for arg in request.args.getlist("query"):
+        queries.extend(query for query in arg.split(",") if query)
+    max_queries=current_app.config["FEED_BUNDLE_MAX_QUERIES"]
+    if not queries or len(queries) > max_queries:
+        return make_response(f"Please specify between 1 and {max_queries} queries.", 400)
+    versions={version.short_name: version for version in FeedVersion.supported()}
+    format=request.args.get("format", default="rss", type=str).lower()
+    if format not in versions:
+        return make_response(f"Format must be one of: {', '.join(sorted(versions))}.", 400)
+    version=versions[format]
+
+    results=controller.get_bundle(queries)
+    content=serialize_bundle(results, version, current_app.config["FEED_BUNDLE_WORKERS"])
+
+    response: Response = make_response(content, 200)
+    response.headers["ETag"] = etag(content)
+    response.headers["Content-Type"] = "application/zip"
+    response.headers["Content-Disposition"] = f"attachment; filename=feeds-{format}.zip"
+    expires = get_next_announcement()
+    expiration_time = (expires - utc_now()).total_seconds() #expire on next announcement day
+    response.headers['Cache-Control'] = f"max-age={int(expiration_time)}"
+    response.expires = expires
+    keys=sorted({key for query in queries for key in category_keys(query)})
+    response.headers=add_surrogate_key(response.headers,["announce", "feed", "feed-bundle", *keys]) # type: ignore[arg-type]
+    return response
+
+@blueprint.route("/feed/manifest", methods=["GET"])
+def feed_manifest() -> Response:
+    """Tag, entry count and last announcement day of every archive and category feed, see feed.manifest.
+
+    The manifest is built in the background, until the first one is done this is a 503.
+    """
+    content = manifest.get_builder().get()
+    if content is None:
+        response = make_response("The feed manifest is being built, try again shortly.", 503)
+        response.headers["Retry-After"] = str(manifest.RETRY_SECONDS)
+        return response
+    response = make_response(content, 200)
+    response.headers["ETag"] = etag(response.get_data())
+    expires = get_next_announcement()
+    expiration_time = (expires - utc_now()).total_seconds() #expire on next announcement day
+    response.headers['Cache-Control'] = f"max-age={int(expiration_time)}"
+    response.expires = expires
+    keys=sorted({key for query in manifest.feed_queries() for key in category_keys(query)})
+    response.headers=add_surrogate_key(response.headers,["announce", "feed", "feed-manifest", *keys]) # type: ignore[arg-type]
+    return response
+
+@blueprint.route("/feed/counts/<string:query>", methods=["GET"])
+def counts(query: str) -> Response:
+    """Number of new, cross, replace and replace-cross listings in the query's current feed."""
+    try:
+        result = controller.get_counts(query)
+    except FeedError as ex:
+        return make_response({"error": ex.error}, 400)
+    response: Response = make_response({
+        "query": result.query,
+        "first_day": result.first_day.isoformat(),
+        "last_day": result.last_day.isoformat(),
+        "counts": result.counts,
+        "total": sum(result.counts.values()),
+    }, 200)
+    expires = get_next_announcement()
+    expiration_time = (expires - utc_now()).total_seconds() #expire on next announcement day
     response.headers['Cache-Control'] = f"max-age={int(expiration_time)}"
-    response.headers=add_surrogate_key(response.headers,["announce", "feed"]) # type: ignore[arg-type]
+    response.expires = expires
+    response.headers=add_surrogate_key(response.headers,["announce", "feed-counts", *category_keys(query)]) # type: ignore[arg-type]
     return response
 
+@blueprint.route("/feed/websub", methods=["POST"])
+def websub_hub() -> Response:
+    """WebSub hub for subscriptions to feeds, see feed.websub.
+
+    Requests are checked here and verified with the subscriber afterwards.
+    """
+    hub = websub.get_hub()
+    if hub is None:
+        return make_response("WebSub is not enabled.", 404)
+    try:
+        hub.request(request.form, request.host_url)
+    except FeedSubscriptionLimitError as ex:
+        return make_response(ex.error, 429)
+    except FeedError as ex:
+        return make_response(ex.error, 400)
+    return make_response("", 202)
+
 @blueprint.route("/")
 def feed_home()-> Response:
     """Returns a empty error page"""
     rss_url=url_for("feed.rss", query="", _external=True)
     atom_url=url_for("feed.atom", query="", _external=True)
+    json_url=url_for("feed.json", query="", _external=True)
     help_url=url_for("help")+"/rss.html"
     rss=f"<a href='{rss_url}'>{rss_url}[archive or category]</a>"
     atom=f"<a href='{atom_url}'>{atom_url}[archive or category]</a>"
+    json=f"<a href='{json_url}'>{json_url}[archive or category]</a>"
     help=f"<a href='{help_url}'>here</a>"
-    help_text=f"Please use {rss} for RSS 2.0 and {atom} for ATOM formats. See {help} for help."
+    help_text=f"Please use {rss} for RSS 2.0, {atom} for ATOM and {json} for JSON Feed formats. See {help} for help."
     return make_response(help_text, 200)
 
 @blueprint.route("/rss")
 @blueprint.route("/atom")
+@blueprint.route("/json")
 def feed_help()-> Response:
     """Returns a empty error page"""
     archives=', '.join(key for key in ARCHIVES_ACTIVE.keys() if key != 'test')
@@ -97,6 +294,13 @@ def atom(query: str) -> Response:
     response.headers=add_surrogate_key(response.headers,["feed-atom"]) # type: ignore[arg-type]
     return response
 
+@blueprint.route("/json/<string:query>", methods=["GET"])
+def json(query: str) -> Response:
+    """Return the JSON Feed 1.1 results for the past day."""
+    response= _feed(query=query, version=FeedVersion.JSON_1_1)
+    response.headers=add_surrogate_key(response.headers,["feed-json"]) # type: ignore[arg-type]
+    return response
+
 @blueprint.route("/favicon.ico")
 @blueprint.route("/apple-touch-icon-120x120-precomposed.png")
 @blueprint.route("/apple-touch-icon-120x120.png")
@@ -0,0 +1,125 @@
+"""arXiv's announcement calendar.
+
+New listings appear at the start of the arXiv day, midnight in
+ARXIV_BUSINESS_TZ, on the weekdays in FEED_ANNOUNCE_WEEKDAYS except for the
+days in FEED_ANNOUNCE_HOLIDAYS. Current feeds only change then, so they are
+cached until the next announcement day rather than the next midnight, and the
+FEED_NUM_DAYS window counts announcement days, so a feed read on a weekend
+shows the last announcement instead of an empty day.
+
+Both settings are comma separated, e.g. ``Mon,Tue,Wed,Thu,Fri`` and
+``2024-12-25,2025-01-01``.
+"""
+import logging
+from typing import FrozenSet, Tuple
+from datetime import date, datetime, timedelta
+from dataclasses import dataclass
+from functools import lru_cache
+
+from flask import current_app
+
+from feed import consts
+from feed.utils import get_arxiv_midnight, get_arxiv_midnight_of, utc_now
+
+logger = logging.getLogger(__name__)
+
+#without the freshness watcher late data is only noticed when what was built from the earlier data expires
+UNWATCHED_SECONDS = 300
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+@dataclass(frozen=True)
+class AnnouncementSchedule:
+    """Days with announcements."""
+
+    weekdays: FrozenSet[int]
+    """Weekdays with announcements, numbered as by :meth:`date.weekday`."""
+
+    holidays: FrozenSet[date] = frozenset()
+    """Days without announcements even though they are on one of the weekdays."""
+
+    def is_announcement_day(self, day: date) -> bool:
+        return day.weekday() in self.weekdays and day not in self.holidays
+
+    def next_day(self, day: date) -> date:
+        """First announcement day after day."""
+        day += timedelta(days=1)
+        while not self.is_announcement_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def last_day(self, day: date) -> date:
+        """Latest announcement day on or before day."""
+        while not self.is_announcement_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def count_days(self, after: date, until: date) -> int:
+        """Number of announcement days after after, up to and including until."""
+        count = 0
+        day = self.next_day(after)
+        while day <= until:
+            count += 1
+            day = self.next_day(day)
+        return count
+
+    def window(self, days: int, today: date) -> Tuple[date, date]:
+        """Inclusive first and last day of the latest days announcement days up to today."""
+        last_day = first_day = self.last_day(today)
+        for _ in range(days - 1):
+            first_day = self.last_day(first_day - timedelta(days=1))
+        return first_day, last_day
+
+    def skip_days(self) -> Tuple[str, ...]:
+        """Names of the weekdays that never have announcements."""
+        return tuple(name for number, name in enumerate(WEEKDAYS) if number not in self.weekdays)
+
+
+@lru_cache(maxsize=8)
+def parse_schedule(weekdays: str, holidays: str) -> AnnouncementSchedule:
+    """Schedule from the comma separated weekday names and ISO dates.
+
+    Invalid entries are logged and left out. Without any valid weekday the
+    default weekdays are used.
+    """
+    numbers = set()
+    for name in filter(None, (part.strip().lower() for part in weekdays.split(","))):
+        matches = [number for number, weekday in enumerate(WEEKDAYS) if weekday.lower().startswith(name)]
+        if len(name) < 2 or len(matches) != 1:
+            logger.error("Invalid configuration - FEED_ANNOUNCE_WEEKDAYS: unknown day '%s'.", name)
+            continue
+        numbers.add(matches[0])
+    if not numbers:
+        logger.error("Invalid configuration - FEED_ANNOUNCE_WEEKDAYS: '%s' has no days. Using '%s'.",
+                     weekdays, consts.FEED_ANNOUNCE_WEEKDAYS)
+        return parse_schedule(consts.FEED_ANNOUNCE_WEEKDAYS, holidays)
+
+    days = set()
+    for value in filter(None, (part.strip() for part in holidays.split(","))):
+        try:
+            days.add(date.fromisoformat(value))
+        except ValueError:
+            logger.error("Invalid configuration - FEED_ANNOUNCE_HOLIDAYS: '%s' is not a date.", value)
+    return AnnouncementSchedule(frozenset(numbers), frozenset(days))
+
+
+def announcement_schedule() -> AnnouncementSchedule:
+    """The announcement schedule of the current app."""
+    return parse_schedule(current_app.config["FEED_ANNOUNCE_WEEKDAYS"], current_app.config["FEED_ANNOUNCE_HOLIDAYS"])
+
+
+def get_next_announcement() -> datetime:
+    """Start of the next announcement day, when the current feeds expire."""
+    return get_arxiv_midnight_of(announcement_schedule().next_day(get_arxiv_midnight().date()))
+
+
+def get_current_expiry() -> float:
+    """Unix time at which data built from the current announcements expires.
+
+    That is the next announcement day, or at most UNWATCHED_SECONDS from now
+    if there is no freshness watcher to clear the data when late announcements land.
+    """
+    expires_at = get_next_announcement().timestamp()
+    if "feed_freshness" not in current_app.extensions:
+        expires_at = min(expires_at, utc_now().timestamp() + UNWATCHED_SECONDS)
+    return expires_at
@@ -0,0 +1,59 @@
+"""Serialization of many feeds into a single zip archive."""
+import io
+import zipfile
+from typing import Mapping, Union
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import copy_current_request_context
+
+from feed.consts import FeedVersion
+from feed.domain import DocumentSet
+from feed.errors import FeedError
+from feed.serializers.feed import Feed
+from feed.serializers.serializer import serialize
+
+
+def bundle_filename(query: str, version: FeedVersion) -> str:
+    """Name of the file for a query's feed within the bundle."""
+    extension = "json" if version.is_json else "xml"
+    return f"{quote(query, safe='+.-')}.{version.short_name}.{extension}"
+
+
+def serialize_bundle(
+    results: Mapping[str, Union[DocumentSet, FeedError]],
+    version: FeedVersion,
+    workers: int = 1,
+) -> bytes:
+    """Serialize the feeds for many queries into one zip archive.
+
+    Parameters
+    ----------
+    results : Mapping[str, Union[DocumentSet, FeedError]]
+        Documents, or the error, for each query.
+    version : FeedVersion
+        Serialization format of every feed in the bundle.
+    workers : int
+        Number of feeds to serialize at the same time.
+
+    Returns
+    -------
+    bytes
+        Zip archive with one file per query, in the order of results.
+    """
+
+    def render(query: str, documents_or_error: Union[DocumentSet, FeedError]) -> Feed:
+        return serialize(documents_or_error, query=query, version=version)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = []
+        for query, documents_or_error in results.items():
+            # each task needs its own copy of the request context for url_for
+            task = copy_current_request_context(render)
+            futures.append((query, pool.submit(task, query, documents_or_error)))
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for query, future in futures:
+                archive.writestr(bundle_filename(query, version), future.result().content)
+    return buffer.getvalue()
@@ -0,0 +1,84 @@
+"""Error feeds rendered from fixed templates instead of a FeedGenerator.
+
+The output is the same as :meth:`Serializer.serialize_error` gives for RSS 2.0
+and Atom 1.0, only the link, message and timestamps are filled in.
+"""
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from flask import url_for
+
+from feed.consts import FeedVersion
+from feed.errors import FeedError, FeedVersionError
+from feed.serializers.feed import Feed
+from feed.utils import get_arxiv_midnight
+
+#characters that are not allowed in XML 1.0 documents
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_TEXT_ENTITIES = {"\r": "&#13;"}
+_ATTRIBUTE_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}
+
+RSS_ERROR = (
+    "<?xml version='1.0' encoding='UTF-8'?>\n"
+    '<rss xmlns:arxiv="http://arxiv.org/schemas/atom" xmlns:dc="http://purl.org/dc/elements/1.1/" '
+    'xmlns:atom="http://www.w3.org/2005/Atom" xmlns:content="http://purl.org/rss/1.0/modules/content/" version="2.0">\n'
+    "  <channel>\n"
+    "    <title>Feed error for query: {link}</title>\n"
+    "    <link>{link}</link>\n"
+    "    <description>{message}</description>\n"
+    '    <atom:link href="{link_attribute}" rel="self" type="application/rss+xml"/>\n'
+    "    <docs>http://www.rssboard.org/rss-specification</docs>\n"
+    "    <language>en-us</language>\n"
+    "    <lastBuildDate>{built}</lastBuildDate>\n"
+    "    <managingEditor>rss-help.arxiv.org</managingEditor>\n"
+    "    <pubDate>{published}</pubDate>\n"
+    "  </channel>\n"
+    "</rss>\n"
+)
+
+ATOM_ERROR = (
+    "<?xml version='1.0' encoding='UTF-8'?>\n"
+    '<feed xmlns:arxiv="http://arxiv.org/schemas/atom" xmlns:dc="http://purl.org/dc/elements/1.1/" '
+    'xmlns="http://www.w3.org/2005/Atom" xml:lang="en-us">\n'
+    "  <id>{link}</id>\n"
+    "  <title>Feed error for query: {link}</title>\n"
+    "  <updated>{built}</updated>\n"
+    '  <link href="{link_attribute}" rel="self" type="application/atom+xml"/>\n'
+    "  <subtitle>{message}</subtitle>\n"
+    "</feed>\n"
+)
+
+
+def _text(value: str) -> str:
+    return escape(_INVALID_XML.sub("", value), _TEXT_ENTITIES)
+
+
+def _attribute(value: str) -> str:
+    return escape(_INVALID_XML.sub("", value), _ATTRIBUTE_ENTITIES)
+
+
+def render_error(error: FeedError, query: str, version: FeedVersion, status_code: int = 400) -> Feed:
+    """Render the error feed for the query.
+
+    Raises
+    ------
+    FeedVersionError
+        If there is no template for the version.
+    """
+    link = url_for(f"feed.{version.short_name}", query="", _external=True) + query
+    now = datetime.now(timezone.utc)
+    if version == FeedVersion.RSS_2_0:
+        content = RSS_ERROR.format(
+            link=_text(link), link_attribute=_attribute(link), message=_text(error.error),
+            built=format_datetime(now.replace(microsecond=0)), published=format_datetime(get_arxiv_midnight()),
+        )
+    elif version == FeedVersion.ATOM_1_0:
+        content = ATOM_ERROR.format(
+            link=_text(link), link_attribute=_attribute(link), message=_text(error.error),
+            built=now.isoformat(),
+        )
+    else:
+        raise FeedVersionError(version=version, supported=FeedVersion.supported())
+    return Feed(content=content.encode("utf-8"), status_code=status_code, version=version)
@@ -1,5 +1,5 @@
 """Classes derived from the Feedgen extension classes."""
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from lxml import etree
 from lxml.etree import Element
@@ -11,6 +11,20 @@ from feed.domain import Author
 class ArxivExtension(BaseExtension):
     """Extension of the Feedgen class to allow us to change its behavior."""
 
+    def __init__(self: BaseExtension):
+        """Initialize the member values to all be empty."""
+        self.__arxiv_links: List[Tuple[str, str]] = []
+        self.__arxiv_watermark: Optional[str] = None
+
+    def __add_links(self, parent: Element, tag: str) -> None:
+        for rel, href in self.__arxiv_links:
+            etree.SubElement(parent, tag, href=href, rel=rel)
+        if self.__arxiv_watermark:
+            watermark = etree.SubElement(
+                parent, "{http://arxiv.org/schemas/atom}watermark"
+            )
+            watermark.text = self.__arxiv_watermark
+
     def extend_atom(self: BaseExtension, atom_feed: Element) -> Element:
         """Allow the extension to modify the initial feed tree for Atom.
 
@@ -24,6 +38,8 @@ class ArxivExtension(BaseExtension):
         atom_feed : Element
             The feed's root element.
         """
+        # feedgen writes atom elements without a namespace under a literal xmlns
+        self.__add_links(atom_feed, "link")
         return atom_feed
 
     def extend_rss(self: BaseExtension, rss_feed: Element) -> Element:
@@ -39,8 +55,38 @@ class ArxivExtension(BaseExtension):
         rss_feed : Element
             The feed's root element.
         """
+        channel = rss_feed.find("channel")
+        self.__add_links(
+            channel if channel is not None else rss_feed,
+            "{http://www.w3.org/2005/Atom}link",
+        )
         return rss_feed
 
+    def link(self, href: str, rel: str) -> None:
+        """Add an extra atom:link to the feed, such as RFC 5005 paging links.
+
+        Feedgen only writes the self link into RSS and uses the last link as
+        the RSS channel link, so other relations are kept here instead.
+
+        Parameters
+        ----------
+        href : str
+            Target of the link.
+        rel : str
+            Link relation, e.g. 'next' or 'previous'.
+        """
+        self.__arxiv_links.append((rel, href))
+
+    def watermark(self, token: str) -> None:
+        """Assign the watermark a client can send back as ``since``.
+
+        Parameters
+        ----------
+        token : str
+            Opaque watermark of the latest announcement in the feed.
+        """
+        self.__arxiv_watermark = token
+
     def extend_ns(self: BaseExtension) -> Dict[str, str]:
         """
         Define the feed's namespaces.
@@ -78,13 +124,16 @@ class ArxivEntryExtension(BaseEntryExtension):
 
     def __init__(self: BaseEntryExtension):
         """Initialize the member values to all be empty."""
-        self.__arxiv_authors: List[Author] = []
+        self.__arxiv_authors: Optional[List[Author]] = None
+        self.__arxiv_author_count: Optional[int] = None
         self.__arxiv_license: Optional[str] = None
         self.__arxiv_doi: Optional[str] = None
         self.__arxiv_journal_ref: Optional[str] = None
         self.__arxiv_announce_type: Optional[str] = None
 
     def __add_authors(self, entry: Element) -> None:
+        if self.__arxiv_authors is None:
+            return
         creator_element = etree.SubElement(
             entry, "{http://purl.org/dc/elements/1.1/}creator"
         )
@@ -96,7 +145,12 @@ class ArxivEntryExtension(BaseEntryExtension):
             if author.affiliations:
                 full_name+= ' (' +', '.join(author.affiliations)  +')'        
             full_text += f'{full_name}, '   
-        creator_element.text=full_text[:-2]
+        if self.__arxiv_author_count:
+            #only the first authors are listed
+            creator_element.set("{http://arxiv.org/schemas/atom}count", str(self.__arxiv_author_count))
+            creator_element.text=full_text+'et al.'
+        else:
+            creator_element.text=full_text[:-2]
 
     def extend_atom(self, entry: Element) -> Element:
         """
@@ -180,15 +234,18 @@ class ArxivEntryExtension(BaseEntryExtension):
         self.__add_authors(entry=entry)
         return entry
 
-    def authors(self, authors: List[Author]) -> None:
+    def authors(self, authors: List[Author], count: Optional[int] = None) -> None:
         """Add an author value to this entry.
 
         Parameters
         ----------
         author : Author
             Paper author.
+        count : Optional[int]
+            Number of authors of the paper if authors only has the first of them.
         """
         self.__arxiv_authors=authors
+        self.__arxiv_author_count=count
 
     def rights(self, text: str) -> None:
         """Assign the comment value to this entry.
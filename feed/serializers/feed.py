@@ -11,7 +11,7 @@ class Feed:
     Parameters
     ----------
     content : bytes
-        Feed xml content.
+        Feed xml or json content.
     version : FeedVersion
         Version of the feed specification.
 
@@ -64,5 +64,7 @@ class Feed:
             return "application/rss+xml"
         elif self.version.is_atom:
             return "application/atom+xml"
+        elif self.version.is_json:
+            return "application/feed+json"
         else:
             return "application/xml"
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""Process pool for serializing large feeds outside of the request threads."""
+import threading
+import multiprocessing
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_pool(processes: int) -> ProcessPoolExecutor:
+    """Return the shared serialization pool, starting it on first use.
+
+    Workers are spawned rather than forked, the request threads and database
+    connections of the app are not safe to copy into a child process.
+    """
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes, a new pool is started if one is needed again."""
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
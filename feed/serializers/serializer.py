@@ -1,53 +1,189 @@
-from typing import Union
-
-from flask import current_app, url_for
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
+from datetime import date, datetime
+from dataclasses import dataclass, field
+from functools import lru_cache
+from urllib.parse import urlencode
+from zoneinfo import ZoneInfo
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, url_for, request, has_request_context
 from feedgen.feed import FeedGenerator
+from lxml import etree
 
+from feed.schedule import announcement_schedule
 from feed.utils import get_arxiv_midnight
-from feed.consts import FeedVersion
-from feed.errors import FeedError, FeedVersionError
+from feed.consts import FeedFields, FeedVersion
+from feed.errors import FeedError, FeedIndexerError, FeedVersionError
 from feed.domain import Document, DocumentSet
 from feed.serializers.feed import Feed
+from feed.serializers.pool import get_pool, shutdown_pool
+from feed.serializers.error_templates import render_error
 from feed.serializers.extensions import (
     ArxivExtension,
     ArxivAtomExtension,
     ArxivEntryExtension,
 )
 
+if TYPE_CHECKING:
+    from feed.fetch_data import DocumentStream
+
+
+JSON_FEED_VERSION = "https://jsonfeed.org/version/1.1"
+
+#stand in values for building url templates, replaced with the real ids
+_ID_MARKER = "9999.99999"
+_VERSION_MARKER = 9999999
+#distinct hosts whose links are kept, the Host header comes from the client
+_MAX_LINK_HOSTS = 64
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SerializerContext:
+    """Everything the serializer reads from the app and the request.
+
+    Built for the current request with :meth:`current`. It can be pickled, so
+    feeds can be serialized from it where there is no Flask app, such as in a
+    worker process.
+    """
+
+    base_server: str
+    link: str
+    """Link to the feed route of the format, without the query."""
+    abs_url: str
+    pdf_url: str
+    timezone: str
+    midnight: datetime
+    """Start of the arXiv day of the request."""
+    args: Dict[str, str] = field(default_factory=dict)
+    """Request arguments other than the page, kept in paging links."""
+    skip_days: Tuple[str, ...] = ("Saturday", "Sunday")
+    """Weekdays without announcements."""
+    hub: str = ""
+    """WebSub hub that sends the feed to subscribers, if there is one."""
+
+    @classmethod
+    def current(cls, version: FeedVersion) -> "SerializerContext":
+        args: Dict[str, str] = {}
+        if has_request_context():
+            args = {k: v for k, v in request.args.items() if k != "page"}
+        link, abs_url, pdf_url = _route_links(version)
+        hub = ""
+        if current_app.config.get("FEED_WEBSUB") and "date" not in args:
+            #past days never change, so there is nothing to subscribe to
+            hub = url_for("feed.websub_hub", _external=True)
+        return cls(
+            base_server=current_app.config["BASE_SERVER"],
+            link=link,
+            abs_url=abs_url,
+            pdf_url=pdf_url,
+            timezone=current_app.config["ARXIV_BUSINESS_TZ"],
+            midnight=get_arxiv_midnight(),
+            args=args,
+            skip_days=announcement_schedule().skip_days(),
+            hub=hub,
+        )
+
+    def abs_link(self, paper_id: str) -> str:
+        return self.abs_url.replace(_ID_MARKER, paper_id)
+
+    def pdf_link(self, paper_id: str, version: int) -> str:
+        return self.pdf_url.replace(str(_VERSION_MARKER), str(version)).replace(_ID_MARKER, paper_id)
+
+    def midnight_of(self, day: Optional[date]) -> datetime:
+        """Start of the given arXiv day, or of the request's day if None."""
+        if day is None:
+            return self.midnight
+        return datetime(day.year, day.month, day.day, tzinfo=ZoneInfo(self.timezone))
+
+
+def _route_links(version: FeedVersion) -> Tuple[str, str, str]:
+    """Feed, abs and pdf url templates for the format.
+
+    url_for is most of the setup cost of a small feed, and the links only
+    change with the app and the host of the request, so they are kept per app.
+    """
+    links: Dict[Tuple[FeedVersion, Optional[str]], Tuple[str, str, str]] = \
+        current_app.extensions.setdefault("feed_serializer_links", {})
+    key = (version, request.url_root if has_request_context() else None)
+    cached = links.get(key)
+    if cached is None:
+        cached = (
+            url_for(f"feed.{version.short_name}", query="", _external=True),
+            url_for("abs_by_id", paper_id=_ID_MARKER),
+            url_for("canonical_pdf", paper_id=_ID_MARKER, version=_VERSION_MARKER),
+        )
+        if len(links) >= _MAX_LINK_HOSTS:
+            links.clear()
+        links[key] = cached
+    return cached
+
+
+@dataclass(frozen=True)
+class ChannelHeader:
+    """Fixed channel fields of a feed, the same for every request of a query."""
+
+    link: str
+    title: str
+    description: str
+
+
+@lru_cache(maxsize=4096)
+def channel_header(link: str, categories: Tuple[str, ...]) -> ChannelHeader:
+    """Header of the feed of the categories, link is the feed route of the format."""
+    names = ", ".join(categories)
+    return ChannelHeader(
+        link=link + "+".join(categories),
+        title=f"{names} updates on arXiv.org",
+        description=f"{names} updates on the arXiv.org e-print archive.",
+    )
+
 
 class Serializer:
-    """Atom 1.0 and RSS 2.0 serializer."""
+    """Atom 1.0, RSS 2.0 and JSON Feed 1.1 serializer."""
 
-    def __init__(self, version: Union[str, FeedVersion]):
+    def __init__(self, version: Union[str, FeedVersion], context: Optional[SerializerContext] = None):
         """Initialize serializer.
 
         Parameters
         ----------
         version : FeedVersion
             Serialization format.
+        context : Optional[SerializerContext]
+            Links and config to use, taken from the current request if None.
 
         Raises
         ------
         FeedVersionError
             If the feed serialization format is not supported.
         """
-        # Config data
-        self.base_server = current_app.config["BASE_SERVER"]
-
         self.version = FeedVersion.get(version)
-        self.link = (
-            url_for("feed.atom", query="", _external=True)
-            if version == FeedVersion.ATOM_1_0
-            else url_for("feed.rss", query="", _external=True)
-        )
-        self.content_type = (
-            "application/atom+xml"
-            if version == FeedVersion.ATOM_1_0
-            else "application/rss+xml"
-        )
+        self.context = context or SerializerContext.current(self.version)
 
-    def _create_feed_generator(self, cat_or_archive:str) -> FeedGenerator:
-        """Creates an empty FeedGenerator and adds arxiv extensions."""
+        # Config data
+        self.base_server = self.context.base_server
+        self.link = self.context.link
+        if self.version.is_atom:
+            self.content_type = "application/atom+xml"
+        elif self.version.is_json:
+            self.content_type = "application/feed+json"
+        else:
+            self.content_type = "application/rss+xml"
+        self.args = self.context.args
+
+    def _page_link(self, cats_link: str, page: Optional[str] = None) -> str:
+        """Link to a page of this feed, the first page if page is None."""
+        args = dict(self.args)
+        if page:
+            args["page"] = page
+        link = self.link + cats_link
+        return f"{link}?{urlencode(args)}" if args else link
+
+    def _create_feed_generator(self, link:str) -> FeedGenerator:
+        """Creates an empty FeedGenerator for the feed link and adds arxiv extensions."""
         fg = FeedGenerator()
 
         # Register extensions
@@ -55,7 +191,6 @@ class Serializer:
         fg.register_extension("arxiv", ArxivExtension, ArxivEntryExtension)
 
         # Populate the feed
-        link=self.link+cat_or_archive
         fg.id(link)
         fg.link(
             href=link, rel="self", type=self.content_type,
@@ -95,7 +230,8 @@ class Serializer:
             content=content, status_code=status_code, version=self.version
         )
 
-    def add_document(self, fg: FeedGenerator, document: Document) -> None:
+    def add_document(self, fg: FeedGenerator, document: Document,
+                     published: Optional[datetime] = None, fields: FeedFields = FeedFields.FULL) -> None:
         """Add document to the feed.
 
         Parameters
@@ -104,16 +240,21 @@ class Serializer:
             Feed generator to which the document should be added.
         document : Document
             Document that should be added to the feed.
+        published : Optional[datetime]
+            Announcement time of the document, defaults to the start of today.
+        fields : FeedFields
+            Fields of the document to add.
         """
         entry = fg.add_entry()
         full_id=f'{document.arxiv_id}v{document.version}'
-        entry.id(url_for("canonical_pdf", paper_id=document.arxiv_id, version=document.version))
+        entry.id(self.context.pdf_link(document.arxiv_id, document.version))
         entry.guid(f"oai:arXiv.org:{full_id}", permalink=False)
         entry.title(document.title)
 
         #not all RSS readers handle the extra fields, put most important info in the description as well
         description=f"arXiv:{full_id} Announce Type: {document.update_type}"
-        description+=f" \nAbstract: {document.abstract}"
+        if fields.abstract:
+            description+=f" \nAbstract: {document.abstract}"
         entry.summary(description)
 
         if document.journal_ref:
@@ -124,7 +265,7 @@ class Serializer:
         entry.link(
             {
                 "type": "text/html",
-                "href": url_for("abs_by_id", paper_id=document.arxiv_id),
+                "href": self.context.abs_link(document.arxiv_id),
             }
         )
 
@@ -140,10 +281,12 @@ class Serializer:
 
 
         # Add authors
-        entry.arxiv.authors(document.authors)
+        if fields.authors:
+            entry.arxiv.authors(document.authors, document.author_count)
 
-        midnight=get_arxiv_midnight()
-        entry.published(midnight)
+        #the announcement time rather than the build time, so a feed is the same until its listings change
+        entry.published(published or self.context.midnight)
+        entry.updated(published or self.context.midnight)
 
     def serialize_documents(self, documents: DocumentSet) -> Feed:
         """Serialize feed from documents.
@@ -163,25 +306,195 @@ class Serializer:
         FeedVersionError
             If the feed serialization format is not supported.
         """
+        if self.version.is_json:
+            return self._serialize_json_documents(documents)
+
         cats_link='+'.join(documents.categories)
-        fg = self._create_feed_generator(cats_link)
-        fg.title(f"{', '.join(documents.categories)} updates on arXiv.org")
-        fg.description(
-            f"{', '.join(documents.categories)} updates on the arXiv.org e-print archive.",
-        )
-        midnight=get_arxiv_midnight()
+        header = channel_header(self.link, tuple(documents.categories))
+        fg = self._create_feed_generator(header.link)
+        fg.title(header.title)
+        fg.description(header.description)
+        midnight=self.context.midnight_of(documents.last_day)
         fg.pubDate(midnight)
+        fg.updated(midnight)
 
         fg.language("en-us")
         fg.managingEditor("rss-help@arxiv.org")
-        fg.skipDays(["Saturday","Sunday"])
+        if self.context.skip_days:
+            fg.skipDays(list(self.context.skip_days))
         fg.generator("")
 
+        # RFC 5005 paging links
+        if documents.next_page or documents.prev_page:
+            fg.arxiv.link(self._page_link(cats_link), rel="first")
+            if documents.prev_page:
+                fg.arxiv.link(self._page_link(cats_link, documents.prev_page), rel="previous")
+            if documents.next_page:
+                fg.arxiv.link(self._page_link(cats_link, documents.next_page), rel="next")
+        if documents.watermark:
+            fg.arxiv.watermark(documents.watermark)
+        if self.context.hub:
+            fg.arxiv.link(self.context.hub, rel="hub")
+
         # Add each search result to the feed
         for document in documents.documents:
-            self.add_document(fg, document)
+            self.add_document(fg, document, published=midnight, fields=documents.fields)
         return self._serialize(fg)
 
+    def _serialize_json_documents(self, documents: DocumentSet) -> Feed:
+        """Build a JSON Feed directly from the documents, without feedgen.
+
+        arXiv specific fields are kept in "_arxiv" extension objects on the
+        feed and on each item, and underscored keys on authors, as allowed by
+        the JSON Feed specification. Empty fields are left out.
+        """
+        cats_link='+'.join(documents.categories)
+        midnight=self.context.midnight_of(documents.last_day)
+
+        #in the same order as the RSS and Atom feeds, where feedgen puts each entry in front of the previous ones
+        items = [self._json_item(document, documents.fields) for document in reversed(documents.documents)]
+        header = channel_header(self.link, tuple(documents.categories))
+        content: Dict[str, Any] = {
+            "version": JSON_FEED_VERSION,
+            "title": header.title,
+            "home_page_url": f"https://{self.base_server}",
+            "feed_url": self._page_link(cats_link),
+            "description": header.description,
+            "language": "en-us",
+            "items": items,
+        }
+        if documents.next_page:
+            content["next_url"] = self._page_link(cats_link, documents.next_page)
+        if self.context.hub:
+            content["hubs"] = [{"type": "WebSub", "url": self.context.hub}]
+        # every entry has the same announcement time, so it is given once for the feed
+        feed_arxiv: Dict[str, Any] = {"published": midnight.isoformat()}
+        if documents.prev_page:
+            feed_arxiv["prev_url"] = self._page_link(cats_link, documents.prev_page)
+        if documents.watermark:
+            feed_arxiv["watermark"] = documents.watermark
+        content["_arxiv"] = feed_arxiv
+        return self._serialize_json(content)
+
+    def _json_item(self, document: Document, fields: FeedFields = FeedFields.FULL) -> Dict[str, Any]:
+        authors: List[Dict[str, Any]] = []
+        for author in document.authors:
+            name = f'{author.full_name} {author.last_name}'
+            if author.initials:
+                name += f" {author.initials}"
+            data: Dict[str, Any] = {"name": name, "_last_name": author.last_name}
+            if author.affiliations:
+                data["_affiliations"] = author.affiliations
+            authors.append(data)
+        arxiv: Dict[str, Any] = {"announce_type": document.update_type}
+        if document.license:
+            arxiv["license"] = document.license
+        if document.doi:
+            arxiv["doi"] = document.doi
+        if document.journal_ref:
+            arxiv["journal_ref"] = document.journal_ref.strip()
+        if document.author_count:
+            arxiv["author_count"] = document.author_count
+        item: Dict[str, Any] = {
+            "id": f"oai:arXiv.org:{document.arxiv_id}v{document.version}",
+            "url": self.context.abs_link(document.arxiv_id),
+            "title": document.title,
+            #items need content, it is empty without the abstract
+            "content_text": document.abstract,
+            "authors": authors,
+            "tags": document.categories,
+            "_arxiv": arxiv,
+        }
+        if not fields.authors:
+            del item["authors"]
+        if not fields.details:
+            del item["tags"]
+        return item
+
+    def serialize_stream(self, documents: "DocumentStream", max_bytes: int = 0) -> Feed:
+        """Serialize a feed whose documents are produced one at a time.
+
+        Each entry is rendered as soon as its document arrives and only its
+        bytes are kept, so the documents and the feed tree are never all in
+        memory. The output is the same as :meth:`serialize_documents` gives.
+
+        Parameters
+        ----------
+        documents : DocumentStream
+            Documents of the page.
+        max_bytes : int
+            Once the entries reach this size the page ends, its next page link
+            continues after the last entry. 0 for no limit.
+        """
+        page = documents.document_set()
+        render = self._json_entry_renderer(page) if self.version.is_json else self._xml_entry_renderer(page)
+
+        entries: List[bytes] = []
+        size = 0
+        for document in documents:
+            entry = render(document)
+            entries.append(entry)
+            size += len(entry)
+            if max_bytes and size >= max_bytes:
+                documents.truncate()
+                break
+
+        content = self.serialize_documents(documents.document_set()).content
+        #feedgen adds each entry in front of the previous ones, and JSON feeds follow the same order
+        entries.reverse()
+        if self.version.is_json:
+            head, tail = content.split(b'"items":[]', 1)
+            content = b"".join([head, b'"items":[', b",".join(entries), b"]", tail])
+        else:
+            end = content.rindex(b"  </channel>" if self.version == FeedVersion.RSS_2_0 else b"</feed>")
+            content = b"".join([content[:end], *entries, content[end:]])
+        return Feed(content=content, version=self.version)
+
+    def _json_entry_renderer(self, page: DocumentSet) -> Callable[[Document], bytes]:
+        def render(document: Document) -> bytes:
+            item = self._json_item(document, page.fields)
+            return json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        return render
+
+    def _xml_entry_renderer(self, page: DocumentSet) -> Callable[[Document], bytes]:
+        """Function rendering a document to its entry exactly as it appears in the full feed.
+
+        The entry is serialized inside an empty copy of the feed's root, so it
+        gets the same namespace prefixes and indentation.
+        """
+        rss = self.version == FeedVersion.RSS_2_0
+        root = etree.fromstring(
+            self.serialize_documents(page).content, etree.XMLParser(remove_blank_text=True)
+        )
+        parent = root.find("channel") if rss else root
+        assert parent is not None
+        for child in list(parent):
+            parent.remove(child)
+        tag, indent = (b"item", b"    ") if rss else (b"entry", b"  ")
+        close = b"</" + tag + b">\n"
+        fg = self._create_feed_generator(self.link)
+        published = self.context.midnight_of(page.last_day)
+
+        def render(document: Document) -> bytes:
+            self.add_document(fg, document, published=published, fields=page.fields)
+            entry = fg.entry()[0]
+            fg.remove_entry(entry)
+            element = entry.rss_entry() if rss else entry.atom_entry()
+            parent.append(element)
+            xml: bytes = etree.tostring(root, pretty_print=True, encoding="UTF-8")
+            parent.remove(element)
+            return indent + xml[xml.index(b"<" + tag + b">"):xml.rindex(close) + len(close)]
+
+        return render
+
+    def _serialize_json(self, content: Dict[str, Any], status_code: int = 200) -> Feed:
+        # compact separators, the stdlib encoder runs in C
+        data = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+        return Feed(
+            content=data.encode("utf-8"), status_code=status_code, version=self.version
+        )
+
     def serialize_error(
         self, error: FeedError, query:str, status_code: int = 400
     ) -> Feed:
@@ -199,13 +512,22 @@ class Serializer:
         Feed
             Feed object containing rss feed.
         """
-        fg = self._create_feed_generator(query)
+        if self.version.is_json:
+            content = {
+                "version": JSON_FEED_VERSION,
+                "title": f"Feed error for query: {self.link}{query}",
+                "feed_url": self.link+query,
+                "description": error.error,
+                "items": [],
+            }
+            return self._serialize_json(content, status_code=status_code)
+
+        fg = self._create_feed_generator(self.link+query)
 
         fg.title(f"Feed error for query: {self.link}{query}")
         fg.description(error.error)
         # Timestamps
-        midnight=get_arxiv_midnight()
-        fg.pubDate(midnight)
+        fg.pubDate(self.context.midnight)
 
         fg.language("en-us")
         fg.managingEditor("rss-help.arxiv.org")
@@ -233,10 +555,38 @@ def serialize(
     -------
     Feed
         Populated feed object.
+
+    Notes
+    -----
+    If FEED_SERIALIZE_PROCESSES is set, document sets with at least
+    FEED_SERIALIZE_INLINE_BELOW documents are serialized in a worker process
+    so that large feeds don't hold the GIL while other requests are served.
+
+    Version and index errors in RSS and Atom are rendered from templates,
+    they are the most common errors and often come from bots.
     """
+    if isinstance(documents_or_error, (FeedVersionError, FeedIndexerError)):
+        try:
+            error_version, error = FeedVersion.get(version), documents_or_error
+        except FeedVersionError as ex:
+            error_version, error = FeedVersion.RSS_2_0, ex
+        if error_version in (FeedVersion.RSS_2_0, FeedVersion.ATOM_1_0):
+            return render_error(error, query, error_version)
+
     try:
         serializer = Serializer(version=version)
         if isinstance(documents_or_error, DocumentSet):
+            processes = int(current_app.config.get("FEED_SERIALIZE_PROCESSES", 0))
+            inline_below = int(current_app.config.get("FEED_SERIALIZE_INLINE_BELOW", 0))
+            if processes > 0 and len(documents_or_error.documents) >= inline_below:
+                try:
+                    content = get_pool(processes).submit(
+                        render_documents, documents_or_error, serializer.version, serializer.context
+                    ).result()
+                    return Feed(content=content, version=serializer.version)
+                except BrokenProcessPool as ex:
+                    logger.error("Serialization process pool failed, serializing inline: %s", ex)
+                    shutdown_pool()
             return serializer.serialize_documents(documents_or_error)
         elif isinstance(documents_or_error, FeedError):
             return serializer.serialize_error(documents_or_error, query)
@@ -247,3 +597,28 @@ def serialize(
     except FeedVersionError as ex:
         serializer = Serializer(version=FeedVersion.RSS_2_0)
         return serializer.serialize_error(ex, query)
+
+
+def serialize_stream(documents: "DocumentStream", version: Union[str, FeedVersion] = FeedVersion.RSS_2_0) -> Feed:
+    """Serialize documents streamed from the database, see :meth:`Serializer.serialize_stream`.
+
+    Pages are cut short once their entries reach FEED_STREAM_MAX_BYTES.
+
+    Raises
+    ------
+    FeedVersionError
+        If the feed serialization format is not supported.
+    """
+    max_bytes = int(current_app.config.get("FEED_STREAM_MAX_BYTES", 0))
+    return Serializer(version=version).serialize_stream(documents, max_bytes)
+
+
+def render_documents(documents: DocumentSet, version: FeedVersion, context: SerializerContext) -> bytes:
+    """Serialize documents without a Flask app, run in the serialization worker processes.
+
+    Raises
+    ------
+    FeedVersionError
+        If the feed serialization format is not supported.
+    """
+    return Serializer(version, context).serialize_documents(documents).content
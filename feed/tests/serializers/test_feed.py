@@ -27,6 +27,8 @@ def test_feed_creation(content: bytes):
             assert feed.content_type == "application/rss+xml"
         if version.is_atom:
             assert feed.content_type == "application/atom+xml"
+        if version.is_json:
+            assert feed.content_type == "application/feed+json"
 
 
 def test_invalid_version_feed_cration(content: bytes):
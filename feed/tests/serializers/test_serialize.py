@@ -1,16 +1,27 @@
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 from zoneinfo import ZoneInfo
+from unittest.mock import patch
+import re
+import json
+import pickle
 import pytest
+from flask import url_for
 from lxml import etree
 
 from feed.domain import DocumentSet
 from feed.consts import FeedVersion
 from feed.serializers.feed import Feed
-from feed.serializers.serializer import serialize
-from feed.errors import FeedError, FeedVersionError
+from feed.serializers.serializer import serialize, render_documents, SerializerContext, Serializer, channel_header
+from feed.fetch_data import search, search_stream
+from feed.serializers.error_templates import render_error
+from feed.serializers.pool import shutdown_pool
+from feed.errors import FeedError, FeedIndexerError, FeedVersionError
 
 
+#formats checked by parsing the xml, JSON Feed has its own tests
+XML_VERSIONS = [v for v in FeedVersion.supported() if not v.is_json]
+
 @pytest.fixture
 def documents(sample_doc) -> DocumentSet:
     return DocumentSet(categories=["astro-ph"], documents=[sample_doc])
@@ -80,14 +91,14 @@ def check_content(tree, version: FeedVersion):
     assert len(creators)>0
 
 def test_serialize_documents(app, documents):
-    for version in FeedVersion.supported():
+    for version in XML_VERSIONS:
         feed = serialize(documents, "astro-ph", version=version)
         check_feed(feed, version=version)
 
 
 def test_serialize_error(app):
     error = FeedError("Some error text.")
-    for version in FeedVersion.supported():
+    for version in XML_VERSIONS:
         feed = serialize(error, "astro-ph", version=version)
         check_feed(feed, version=version, status_code=400, error=error)
 
@@ -107,7 +118,7 @@ def test_serialize_invalid_version(app, documents):
         )
 
 def test_doi_jref(app, jref_documents, documents):
-    for version in FeedVersion.supported():
+    for version in XML_VERSIONS:
         #rjref and DOI in feed where applicable
         feed1 = serialize(jref_documents, "astro-ph", version=version)
         check_feed(feed1, version=version)
@@ -119,13 +130,184 @@ def test_doi_jref(app, jref_documents, documents):
         assert b"<arxiv:journal_reference>" not in feed2.content
         
 def test_announce_type(app, documents):
-    for version in FeedVersion.supported():
+    for version in XML_VERSIONS:
         feed = serialize(documents, "astro-ph", version=version)
         check_feed(feed, version=version)
         assert b"<arxiv:announce_type>new</arxiv:announce_type>" in feed.content
 
 def test_description_extras(app, documents):
-    for version in FeedVersion.supported():
+    for version in XML_VERSIONS:
+        feed = serialize(documents, "astro-ph", version=version)
+        check_feed(feed, version=version)
+        assert b"arXiv:1234.5678v3 Announce Type: new \nAbstract:" in feed.content
+def test_truncated_authors(app, sample_doc, sample_author2):
+    sample_doc.authors.append(sample_author2)
+    sample_doc.author_count = 3000
+    documents = DocumentSet(categories=["astro-ph"], documents=[sample_doc])
+    for version in XML_VERSIONS:
+        feed = serialize(documents, "astro-ph", version=version)
+        check_feed(feed, version=version)
+        assert b'<dc:creator arxiv:count="3000">Very Real Sr. (Cornell University), L Emeno, et al.</dc:creator>' \
+            in feed.content
+    item, = json.loads(serialize(documents, "astro-ph", version=FeedVersion.JSON_1_1).content)["items"]
+    assert len(item["authors"]) == 2 and item["_arxiv"]["author_count"] == 3000
+
+def test_paging_links(app, sample_doc):
+    documents = DocumentSet(categories=["astro-ph"], documents=[sample_doc], next_page="nxt", prev_page="prv")
+    for version in XML_VERSIONS:
+        feed = serialize(documents, "astro-ph", version=version)
+        check_feed(feed, version=version)
+        assert b'astro-ph?page=nxt" rel="next"' in feed.content
+        assert b'astro-ph?page=prv" rel="previous"' in feed.content
+        assert b'rel="first"' in feed.content
+
+    #no paging links for a feed that fits in one page
+    for version in XML_VERSIONS:
+        feed = serialize(DocumentSet(categories=["astro-ph"], documents=[sample_doc]), "astro-ph", version=version)
+        assert b'rel="next"' not in feed.content
+        assert b'rel="first"' not in feed.content
+
+def test_watermark(app, sample_doc):
+    documents = DocumentSet(categories=["astro-ph"], documents=[sample_doc], watermark="mark")
+    for version in XML_VERSIONS:
         feed = serialize(documents, "astro-ph", version=version)
         check_feed(feed, version=version)
-        assert b"arXiv:1234.5678v3 Announce Type: new \nAbstract:" in feed.content
\ No newline at end of file
+        assert b"<arxiv:watermark>mark</arxiv:watermark>" in feed.content
+
+def test_serialize_json(app, jref_documents):
+    feed = serialize(jref_documents, "astro-ph", version=FeedVersion.JSON_1_1)
+    assert feed.status_code == 200
+    assert feed.content_type == "application/feed+json"
+    content = json.loads(feed.content)
+    assert content["version"] == "https://jsonfeed.org/version/1.1"
+    assert "astro-ph updates on arXiv.org" == content["title"]
+    assert "next_url" not in content
+    item, = content["items"]
+    assert item["id"] == "oai:arXiv.org:1234.5678v3"
+    assert "://arxiv.org/abs" in item["url"] and "1234.5678" in item["url"]
+    assert item["title"] == "Mysteries of the Universe"
+    assert item["tags"] == ["astro-ph", "math.NT"]
+    assert item["authors"] == [{"name": "Very Real Sr.", "_last_name": "Real", "_affiliations": ["Cornell University"]}]
+    assert item["_arxiv"] == {
+        "announce_type": "new",
+        "doi": "10.0000/00-AAA0000",
+        "journal_ref": "Very Impressive Journal",
+        "license": "http://creativecommons.org/licenses/by/4.0/",
+    }
+    assert content["_arxiv"]["published"].endswith(("-04:00", "-05:00"))
+
+def test_serialize_json_paging(app, sample_doc):
+    documents = DocumentSet(categories=["astro-ph"], documents=[sample_doc], next_page="nxt", prev_page="prv", watermark="mark")
+    content = json.loads(serialize(documents, "astro-ph", version=FeedVersion.JSON_1_1).content)
+    assert content["next_url"].endswith("astro-ph?page=nxt")
+    assert content["_arxiv"]["prev_url"].endswith("astro-ph?page=prv")
+    assert content["_arxiv"]["watermark"] == "mark"
+
+def test_serialize_json_error(app):
+    error = FeedError("Some error text.")
+    feed = serialize(error, "astro-ph", version=FeedVersion.JSON_1_1)
+    assert feed.status_code == 400
+    content = json.loads(feed.content)
+    assert "Feed error for query" in content["title"]
+    assert content["description"] == "Some error text."
+    assert content["items"] == []
+
+def test_serialize_in_process_pool(app, sample_doc):
+    #build time differs, and feedgen keeps skipDays in a set so their order depends on the process
+    build_time = re.compile(rb"<(updated|lastBuildDate|skipDays)>.*?</\1>", re.DOTALL)
+    documents = DocumentSet(categories=["astro-ph"], documents=[sample_doc]*3, next_page="nxt")
+    inline = {version: serialize(documents, "astro-ph", version=version) for version in FeedVersion.supported()}
+
+    app.config["FEED_SERIALIZE_PROCESSES"] = 1
+    app.config["FEED_SERIALIZE_INLINE_BELOW"] = 2
+    try:
+        with patch("feed.serializers.serializer.Serializer.serialize_documents") as in_thread:
+            for version in FeedVersion.supported():
+                feed = serialize(documents, "astro-ph", version=version)
+                assert feed.status_code == 200
+                assert feed.version == version
+                assert build_time.sub(b"", feed.content) == build_time.sub(b"", inline[version].content)
+            in_thread.assert_not_called()
+            #small feeds stay in the request thread
+            serialize(DocumentSet(categories=["astro-ph"], documents=[sample_doc]), "astro-ph")
+            in_thread.assert_called_once()
+    finally:
+        shutdown_pool()
+
+def test_serializer_context_without_app(app, documents):
+    context = pickle.loads(pickle.dumps(SerializerContext.current(FeedVersion.ATOM_1_0)))
+    assert context.abs_link("2401.00001") == url_for("abs_by_id", paper_id="2401.00001")
+    assert context.pdf_link("2401.00001", 2) == url_for("canonical_pdf", paper_id="2401.00001", version=2)
+    content = render_documents(documents, FeedVersion.ATOM_1_0, context)
+    assert context.abs_link("1234.5678").encode() in content
+
+def test_error_templates_match_feedgen(app):
+    build_time = re.compile(rb"<(updated|lastBuildDate)>.*?</\1>")
+    error = FeedIndexerError("Bad archive \"a&b\" <in> query \u00e9.")
+    for query in ["astro-ph", "a&b<c>\"d\"", "cs.\u00e9'x'\t"]:
+        for version in XML_VERSIONS:
+            expected = Serializer(version).serialize_error(error, query)
+            feed = render_error(error, query, version)
+            assert feed.status_code == expected.status_code == 400
+            assert feed.version == version
+            assert build_time.sub(b"", feed.content) == build_time.sub(b"", expected.content)
+            etree.fromstring(feed.content)
+    #feedgen can't write control characters at all, the templates drop them
+    for version in XML_VERSIONS:
+        feed = render_error(error, "astro\x01-ph", version)
+        assert b"astro-ph" in feed.content
+        etree.fromstring(feed.content)
+
+def test_serialize_uses_error_templates(app):
+    with patch("feed.serializers.serializer.Serializer.serialize_error") as generator:
+        feed = serialize(FeedIndexerError("Bad query."), "nope", version=FeedVersion.ATOM_1_0)
+        assert feed.version == FeedVersion.ATOM_1_0
+        assert b"<subtitle>Bad query.</subtitle>" in feed.content
+        feed = serialize(FeedIndexerError("Bad query."), "nope", version="rss 9")
+        assert feed.version == FeedVersion.RSS_2_0
+        assert b"Unsupported feed version" in feed.content
+        generator.assert_not_called()
+
+def test_links_cached_per_host(app):
+    with app.test_request_context("/rss/cs", base_url="http://one.example.org"):
+        first = SerializerContext.current(FeedVersion.RSS_2_0)
+        with patch("feed.serializers.serializer.url_for") as url_for_mock:
+            assert SerializerContext.current(FeedVersion.RSS_2_0).link == first.link
+            url_for_mock.assert_not_called()
+    with app.test_request_context("/rss/cs", base_url="http://two.example.org"):
+        other = SerializerContext.current(FeedVersion.RSS_2_0)
+        assert other.link != first.link
+        assert "two.example.org" in other.link
+
+def test_channel_header(app):
+    header = channel_header("http://example.org/rss/", ("cs.AI", "math.NT"))
+    assert header.link == "http://example.org/rss/cs.AI+math.NT"
+    assert header.title == "cs.AI, math.NT updates on arXiv.org"
+    assert channel_header("http://example.org/rss/", ("cs.AI", "math.NT")) is header
+
+STREAM_DATES = (date(2023,10,25), date(2023,10,27))
+BUILD_TIMES = re.compile(rb"<(updated|lastBuildDate)>.*?</\1>")
+
+def test_serialize_stream_matches_documents(app):
+    for version in FeedVersion.supported():
+        serializer = Serializer(version)
+        expected = serializer.serialize_documents(search("cs+math", 3, dates=STREAM_DATES, page_size=3))
+        stream = search_stream("cs+math", 3, dates=STREAM_DATES, page_size=3, batch_size=2)
+        feed = serializer.serialize_stream(stream)
+        assert stream.count == 3
+        assert BUILD_TIMES.sub(b"", feed.content) == BUILD_TIMES.sub(b"", expected.content)
+
+def test_serialize_stream_budget(app):
+    full = search("cs+math", 3, dates=STREAM_DATES)
+    serializer = Serializer(FeedVersion.JSON_1_1)
+    stream = search_stream("cs+math", 3, dates=STREAM_DATES)
+    content = json.loads(serializer.serialize_stream(stream, max_bytes=1).content)
+    #the entry that reaches the budget is kept, the rest is on the next page
+    assert stream.count == 1
+    assert len(content["items"]) == 1
+    page = content["next_url"].split("page=")[1]
+    rest = search_stream("cs+math", 3, dates=STREAM_DATES, page=page)
+    ids = [item["id"] for item in content["items"]]
+    #each page is in the order of the RSS feed, the reverse of the documents
+    ids += [item["id"] for item in reversed(json.loads(serializer.serialize_stream(rest).content)["items"])]
+    assert ids == [f"oai:arXiv.org:{doc.arxiv_id}v{doc.version}" for doc in full.documents]
@@ -12,6 +12,7 @@ def test_feed_version_supported():
     assert FeedVersion.supported() == {
         FeedVersion.RSS_2_0,
         FeedVersion.ATOM_1_0,
+        FeedVersion.JSON_1_1,
     }
 
 
@@ -35,6 +36,12 @@ def test_feed_version_get_supported():
     # Atom only number
     assert FeedVersion.get("1.0", atom=True) == FeedVersion.ATOM_1_0
 
+    # JSON full version
+    assert (
+        FeedVersion.get(randomize_case(FeedVersion.JSON_1_1.lower()))
+        == FeedVersion.JSON_1_1
+    )
+
 
 def test_feed_version_get_unsupported():
     # RSS 0.91 full version
@@ -125,3 +132,10 @@ def test_is_property():
     # Atom
     assert FeedVersion.ATOM_1_0.is_atom
     assert not FeedVersion.ATOM_1_0.is_rss
+
+    # JSON
+    assert FeedVersion.JSON_1_1.is_json
+    assert not FeedVersion.JSON_1_1.is_rss
+    assert not FeedVersion.JSON_1_1.is_atom
+    assert not FeedVersion.RSS_2_0.is_json
+    assert [v.short_name for v in (FeedVersion.RSS_2_0, FeedVersion.ATOM_1_0, FeedVersion.JSON_1_1)] == ["rss", "atom", "json"]
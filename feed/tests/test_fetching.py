@@ -1,10 +1,23 @@
+import os
+import shutil
+import sqlite3
 import pytest
 from datetime import  date
+from dataclasses import replace
+from unittest.mock import patch
 
 from feed.errors import FeedIndexerError
-from feed.fetch_data import validate_request,create_document
-from feed.database import get_announce_papers
+from feed.fetch_data import (validate_request,create_document,search,search_stream,canonical_query,delta_window,
+    search_bundle)
+from feed.database import (get_announce_papers, get_announce_papers_parallel, count_announce_papers, listing_order_of, get_update_watermark, count_updates_on,
+    AnnounceListings, CategoryListing, load_category_listings, merge_category_listings, _all_possible_categories, check_service,
+    dispose_replica_engines)
+from feed.domain import PageCursor, Watermark
+from feed.listings import ListingCache
+from feed.utils import encode_watermark
 
+from arxiv.authors import parse_author_affil
+from arxiv.db.models import Metadata
 from arxiv.taxonomy.definitions import CATEGORIES, ARCHIVES
 
 math=ARCHIVES["math"]
@@ -72,6 +85,13 @@ def test_bad_cat_requests():
         validate_request("physics.AI")
     assert "Bad subject class 'AI'." in str(excinfo.value)
 
+def test_canonical_query():
+    assert canonical_query("math+cs.CV") == "cs.CV+math"
+    assert canonical_query("CS.cv+MATH") == "cs.CV+math"
+    assert canonical_query("math+math") == "math"
+    with pytest.raises(FeedIndexerError):
+        canonical_query("psuedo-science")
+
 def test_create_document(sample_arxiv_metadata, sample_doc,sample_author, sample_author2):
     #simple
     assert sample_doc==create_document(("new",sample_arxiv_metadata))
@@ -80,6 +100,37 @@ def test_create_document(sample_arxiv_metadata, sample_doc,sample_author, sample
     sample_arxiv_metadata.authors="Very Real Sr. (Cornell University), L Emeno"
     assert sample_doc==create_document(("new",sample_arxiv_metadata))
 
+def test_create_document_max_authors(sample_arxiv_metadata):
+    sample_arxiv_metadata.authors="A One, B Two, C Three (CERN)"
+    document=create_document(("new",sample_arxiv_metadata), max_authors=2)
+    assert [author.last_name for author in document.authors] == ["One", "Two"]
+    #affiliations given after the last listed author still apply
+    assert document.authors[0].affiliations == ["CERN"]
+    assert document.author_count == 3
+    assert create_document(("new",sample_arxiv_metadata), max_authors=3).author_count is None
+
+def test_create_document_many_authors(sample_arxiv_metadata):
+    sample_arxiv_metadata.authors=", ".join(f"A{n} Person{n} ({n%2+1})" for n in range(1000)) + " ((1) CERN, (2) MIT)"
+    with patch("feed.fetch_data.parse_author_affil", wraps=parse_author_affil) as parse:
+        document=create_document(("new",sample_arxiv_metadata), max_authors=3)
+    #only the kept authors and the numbered affiliations are parsed
+    parsed_line=parse.call_args[0][0]
+    assert "Person3 " not in parsed_line and parsed_line.endswith("((1) CERN, (2) MIT)")
+    assert [author.last_name for author in document.authors] == ["Person0", "Person1", "Person2"]
+    assert [author.affiliations for author in document.authors] == [["CERN"], ["MIT"], ["CERN"]]
+    assert document.author_count == 1000
+
+    for authors in ["A One (1), B Two (2), C Three (1 and 2) ((1) CERN, (2) MIT)",
+                    "A One, B Two (MIT), C Three and D Four (CERN)",
+                    "ATLAS Collaboration: A One, B Two, C Three (CERN), D Four, et al"]:
+        sample_arxiv_metadata.authors=authors
+        full=parse_author_affil(authors)
+        for max_authors in range(1, len(full)+1):
+            document=create_document(("new",sample_arxiv_metadata), max_authors=max_authors)
+            assert [[author.last_name, author.full_name, author.initials, *author.affiliations]
+                    for author in document.authors] == full[:max_authors]
+            assert document.author_count == (len(full) if len(full) > max_authors else None)
+
 def test_basic_db_query(app):
     last_date=date(2023,10,26)
     first_date=date(2023,10,26)
@@ -291,3 +342,261 @@ def test_db_announce_type_order(app):
             assert meta.paper_id < last_id
             last_id=meta.paper_id
 
+
+
+def test_db_keyset_paging(app):
+    last_date=date(2023,10,26)
+    first_date=date(2023,10,26)
+    archives=[cs, math]
+    with app.app_context():
+        everything=get_announce_papers(first_date, last_date, archives,[])
+        assert len(everything) >2
+
+        #walk forward two rows at a time
+        paged=[]
+        cursor=None
+        while True:
+            page=get_announce_papers(first_date, last_date, archives,[], cursor=cursor, limit=2)
+            if not page:
+                break
+            paged.extend(page)
+            action, meta=page[-1]
+            cursor=PageCursor(listing_order_of(action), meta.paper_id)
+        assert [meta.paper_id for _, meta in paged] == [meta.paper_id for _, meta in everything]
+
+        #walking backwards from the last row returns the rows just before it in feed order
+        action, meta=everything[-1]
+        back=get_announce_papers(first_date, last_date, archives,[],
+                                 cursor=PageCursor(listing_order_of(action), meta.paper_id, forward=False), limit=2)
+        assert [meta.paper_id for _, meta in back] == [meta.paper_id for _, meta in everything[-3:-1]]
+
+
+def test_search_stream_matches_search(app):
+    dates=(date(2023,10,25), date(2023,10,27))
+    def check_page(page):
+        expected=search("cs+math", 3, page=page, page_size=2, dates=dates)
+        stream=search_stream("cs+math", 3, page=page, page_size=2, dates=dates, batch_size=1)
+        assert list(stream) == expected.documents
+        assert stream.document_set() == replace(expected, documents=[])
+        return expected
+
+    with app.app_context():
+        #forward to the last page, then back to the first
+        page=check_page(None)
+        pages=1
+        while page.next_page:
+            page=check_page(page.next_page)
+            pages+=1
+        assert pages > 1
+        while page.prev_page:
+            page=check_page(page.prev_page)
+
+
+def test_search_past_dates(app):
+    with app.app_context():
+        documents=search("cs.CV", 1, dates=(date(2023,10,26), date(2023,10,27)))
+    assert documents.first_day == date(2023,10,26)
+    assert documents.last_day == date(2023,10,27)
+    ids=[doc.arxiv_id for doc in documents.documents]
+    assert len(ids) >=2
+
+
+def test_db_update_watermark(app):
+    with app.app_context():
+        assert get_update_watermark(date(2023,10,26)) == (date(2023,10,26), 8)
+        assert get_update_watermark(date(2030,1,1)) == (date(2023,10,27), 2)
+        assert get_update_watermark(date(2000,1,1)) is None
+        assert count_updates_on(date(2023,10,25)) == 2
+        assert count_updates_on(date(2000,1,1)) == 0
+
+def test_delta_window():
+    window=(date(2023,10,20), date(2023,10,27))
+    latest=Watermark(date(2023,10,27), 2)
+    #nothing new
+    assert delta_window(window, latest, latest) is None
+    assert delta_window(window, latest, None) is None
+    #more rows for the same day
+    assert delta_window(window, Watermark(date(2023,10,27), 1), latest) == (date(2023,10,27), date(2023,10,27))
+    #a later day
+    assert delta_window(window, Watermark(date(2023,10,26), 8), latest, 8) == (date(2023,10,27), date(2023,10,27))
+    #earlier day changed after the client saw it
+    assert delta_window(window, Watermark(date(2023,10,26), 5), latest, 8) == (date(2023,10,26), date(2023,10,27))
+    #never earlier than the normal window
+    assert delta_window(window, Watermark(date(2023,1,1), 3), latest, 8) == window
+
+@patch("feed.fetch_data.get_date_window")
+def test_search_since(get_date_window, app):
+    get_date_window.return_value=(date(2023,10,25), date(2023,10,27))
+    with app.app_context():
+        everything=search("cs", 3)
+        assert everything.watermark == encode_watermark(Watermark(date(2023,10,27), 2))
+
+        unchanged=search("cs", 3, since=everything.watermark)
+        assert unchanged.documents == []
+        assert unchanged.watermark == everything.watermark
+
+        newer=search("cs", 3, since=encode_watermark(Watermark(date(2023,10,26), 8)))
+        assert [doc.arxiv_id for doc in newer.documents] == ["1234.5647"]
+
+
+def test_announce_listings_match_query(app):
+    requests=[
+        ([],[cs_cv]),
+        ([cs],[]),
+        ([math],[]),
+        ([cs, math],[]),
+        ([math],[cs_cv]),
+        ([ARCHIVES["astro-ph"]],[]),
+        ([],[CATEGORIES["math.NT"], CATEGORIES["cs.IT"]]),
+    ]
+    all_categories=set()
+    for archives, categories in requests:
+        all_categories.update(_all_possible_categories(archives, categories))
+    #single days, the database picks any one action for a paper updated on several days in the window
+    with app.app_context():
+        for day in [date(2023,10,25), date(2023,10,26), date(2023,10,27)]:
+            listings=AnnounceListings(day, day, all_categories)
+            for archives, categories in requests:
+                expected=get_announce_papers(day, day, archives, categories)
+                found=listings.get_papers(archives, categories)
+                assert [(action, meta.paper_id) for action, meta in found] == [(action, meta.paper_id) for action, meta in expected]
+
+def test_listing_cache_matches_query(app):
+    requests=[
+        ([],[cs_cv]),
+        ([cs],[]),
+        ([math],[]),
+        ([cs, math],[]),
+        ([math],[cs_cv]),
+        ([ARCHIVES["astro-ph"]],[]),
+        ([],[CATEGORIES["math.NT"], CATEGORIES["cs.IT"]]),
+    ]
+    def ids(rows):
+        return [(action, meta.paper_id) for action, meta in rows]
+
+    with app.app_context():
+        cache=ListingCache(1000)
+        for day in [date(2023,10,25), date(2023,10,26), date(2023,10,27)]:
+            for archives, categories in requests:
+                expected=get_announce_papers(day, day, archives, categories)
+                assert ids(cache.get_announce_papers(day, day, archives, categories)) == ids(expected)
+                #pages either way from every row
+                for action, meta in expected:
+                    for forward in (True, False):
+                        cursor=PageCursor(listing_order_of(action), meta.paper_id, forward)
+                        page=get_announce_papers(day, day, archives, categories, cursor=cursor, limit=2)
+                        assert ids(cache.get_announce_papers(day, day, archives, categories, cursor=cursor, limit=2)) == ids(page)
+
+        #every category is only loaded once
+        with patch("feed.listings.load_category_listings") as load:
+            for archives, categories in requests:
+                cache.get_announce_papers(date(2023,10,26), date(2023,10,26), archives, categories)
+            load.assert_not_called()
+
+def test_listing_cache_cleared_while_loading(app):
+    with app.app_context():
+        cache=ListingCache(1000)
+        def load_then_clear(*args):
+            listings=load_category_listings(*args)
+            #new announcements noticed while the listings were read
+            cache.clear()
+            return listings
+        day=date(2023,10,26)
+        with patch("feed.listings.load_category_listings", side_effect=load_then_clear):
+            assert cache.get_announce_papers(day, day, [], [cs_cv]) == get_announce_papers(day, day, [], [cs_cv])
+        assert len(cache.listings) == 0
+        cache.get_announce_papers(day, day, [], [cs_cv])
+        assert len(cache.listings) == 1
+
+def test_merge_stops_at_limit():
+    read=[]
+    def entries():
+        for n in range(10, 0, -1):
+            read.append(n)
+            yield (f"2310.{n:05d}", n, "new", 1)
+    metadata={n: Metadata(document_id=n, paper_id=f"2310.{n:05d}") for n in range(1, 11)}
+    listing=CategoryListing(entries(), metadata)
+
+    rows=merge_category_listings([listing], PageCursor(4, "2310.00008", True), limit=2)
+    assert [meta.paper_id for _, meta in rows] == ["2310.00007", "2310.00006"]
+    #the rest of the listing is never read
+    assert 1 not in read
+
+def test_parallel_archives_match_query(app):
+    requests=[
+        ([cs, math],[]),
+        ([math],[cs_cv]),
+        ([ARCHIVES["astro-ph"], ARCHIVES["physics"]],[]),
+        ([],[CATEGORIES["math.NT"], CATEGORIES["cs.IT"]]),
+    ]
+    def ids(rows):
+        return [(action, meta.paper_id) for action, meta in rows]
+
+    with app.app_context():
+        for day in [date(2023,10,25), date(2023,10,26), date(2023,10,27)]:
+            for archives, categories in requests:
+                expected=get_announce_papers(day, day, archives, categories)
+                assert ids(get_announce_papers_parallel(day, day, archives, categories, workers=2)) == ids(expected)
+                for action, meta in expected:
+                    for forward in (True, False):
+                        cursor=PageCursor(listing_order_of(action), meta.paper_id, forward)
+                        page=get_announce_papers(day, day, archives, categories, cursor=cursor, limit=2)
+                        parallel=get_announce_papers_parallel(day, day, archives, categories, cursor=cursor, limit=2,
+                                                              workers=2)
+                        assert ids(parallel) == ids(page)
+
+def test_count_announce_papers(app):
+    requests=[([cs, math],[]), ([math],[cs_cv]), ([],[CATEGORIES["math.NT"], CATEGORIES["cs.IT"]]),
+              ([ARCHIVES["astro-ph"]],[])]
+    with app.app_context():
+        for day in [date(2023,10,25), date(2023,10,26), date(2023,10,27)]:
+            for archives, categories in requests:
+                counts=count_announce_papers(day, day, archives, categories)
+                rows=get_announce_papers(day, day, archives, categories)
+                assert counts == {listing_type: sum(1 for action, _ in rows if action == listing_type)
+                                  for listing_type in ["new", "cross", "replace", "replace-cross"]}
+
+@patch("feed.fetch_data.get_date_window")
+def test_search_bundle(get_date_window, app):
+    get_date_window.return_value=(date(2023,10,26), date(2023,10,26))
+    with app.app_context():
+        results=search_bundle(["math", "cs.CV", "psuedo-science", "math+cs.CV"], 1)
+        assert list(results.keys()) == ["math", "cs.CV", "psuedo-science", "math+cs.CV"]
+        assert isinstance(results["psuedo-science"], FeedIndexerError)
+        for query in ["math", "cs.CV", "math+cs.CV"]:
+            single=search(query, 1)
+            assert results[query].categories == single.categories
+            assert results[query].documents == single.documents
+
+
+@pytest.fixture
+def replica(app, tmp_path):
+    #a replica that has not caught up with the last day yet
+    path = tmp_path / "replica.db"
+    shutil.copy(os.path.join(os.path.dirname(__file__), "data", "test_data.db"), path)
+    with sqlite3.connect(path) as connection:
+        connection.execute("DELETE FROM arXiv_updates WHERE date = '2023-10-27'")
+    app.config["FEED_DB_REPLICA_URI"] = f"sqlite:///{path}"
+    yield app
+    dispose_replica_engines()
+
+def test_reads_from_replica(replica):
+    with replica.app_context():
+        assert get_update_watermark(date(2030,1,1)) == (date(2023,10,26), 8)
+        assert get_announce_papers(date(2023,10,27), date(2023,10,27), [], [cs_cv]) == []
+        assert check_service() == "GOOD"
+
+def test_replica_falls_back_to_primary(replica, tmp_path):
+    replica.config["FEED_DB_REPLICA_URI"] = f"sqlite:///{tmp_path}/missing/replica.db"
+    with replica.app_context():
+        assert get_update_watermark(date(2030,1,1)) == (date(2023,10,27), 2)
+        papers = get_announce_papers(date(2023,10,27), date(2023,10,27), [], [cs_cv])
+        assert [meta.paper_id for _, meta in papers] == ["1234.5647"]
+        assert check_service() == "GOOD"
+
+def test_no_results_debug_rate_limited(app):
+    with app.app_context(), patch("feed.database.logger") as logger, patch("feed.database._debug_last_logged", float("-inf")):
+        for _ in range(3):
+            assert get_announce_papers(date(2000,1,1), date(2000,1,1), [], [cs_cv]) == []
+        logger.warning.assert_called_once()
+        assert "most recent entry" in logger.warning.call_args[0][0]
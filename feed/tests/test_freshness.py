@@ -0,0 +1,85 @@
+import os
+import shutil
+import sqlite3
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+
+from feed.controller import get_documents
+from feed.database import dispose_replica_engines
+from feed.domain import Watermark
+from feed.fetch_data import search
+from feed.freshness import FreshnessWatcher, NewAnnouncements, new_announcements
+
+
+@pytest.fixture
+def database(app, tmp_path):
+    #reads go to the replica, a copy of the test data that the test can add to
+    path = tmp_path / "replica.db"
+    shutil.copy(os.path.join(os.path.dirname(__file__), "data", "test_data.db"), path)
+    app.config["FEED_DB_REPLICA_URI"] = f"sqlite:///{path}"
+    yield path
+    dispose_replica_engines()
+
+
+def add_update(path, day, category):
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "INSERT INTO arXiv_updates VALUES (99999, 1, ?, 'new', ?, ?)", (day, category.split(".")[0], category)
+        )
+
+
+def test_watcher_signals_new_data(app, database):
+    received = []
+    def receiver(sender, event):
+        received.append(event)
+
+    watcher = FreshnessWatcher(app, interval=60)
+    with new_announcements.connected_to(receiver, sender=app):
+        #first poll only records what is there
+        assert watcher.poll() is None
+        assert watcher.watermark == Watermark(date(2023,10,27), 2)
+        assert watcher.poll() is None
+
+        add_update(database, "2023-10-28", "hep-th")
+        event = watcher.poll()
+        assert event.previous == Watermark(date(2023,10,27), 2)
+        assert event.watermark == Watermark(date(2023,10,28), 1)
+        assert event.categories == {"hep-th"}
+
+        #more rows on the same day, the whole day is reported again
+        add_update(database, "2023-10-28", "astro-ph.GA")
+        event = watcher.poll()
+        assert event.watermark == Watermark(date(2023,10,28), 2)
+        assert event.categories == {"hep-th", "astro-ph.GA"}
+
+    assert len(received) == 2
+    assert received[-1] == event
+
+
+def test_watcher_started_by_requests(app):
+    watcher = app.extensions["feed_freshness"]
+    app.test_client().get("/feed/health/live")
+    assert watcher._thread is not None and watcher._thread.is_alive()
+    watcher.stop()
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_results_read_before_announcements_not_kept(get_date_window, app):
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,27))
+    event = NewAnnouncements(Watermark(date(2023,10,28), 1), Watermark(date(2023,10,27), 2), frozenset({"math.NT"}))
+
+    def search_then_announce(*args, **kwargs):
+        documents = search(*args, **kwargs)
+        new_announcements.send(app, event=event)
+        return documents
+
+    with app.test_request_context():
+        cache = app.extensions["feed_document_cache"]
+        with patch("feed.fetch_data.search", side_effect=search_then_announce):
+            assert get_documents("math").documents
+        #read before the announcements, so it isn't kept
+        assert len(cache) == 0
+        get_documents("math")
+        assert len(cache) == 1
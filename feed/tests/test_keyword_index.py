@@ -0,0 +1,84 @@
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+
+from feed import keyword_index
+from feed.database import AnnounceListings
+from feed.domain import Watermark
+from feed.errors import FeedIndexerError
+from feed.freshness import NewAnnouncements, new_announcements
+from feed.keyword_index import KeywordFilter, normalize_name, parse_filter, tokenize
+
+
+def test_tokenize():
+    assert tokenize("Schrödinger's (2+1)-D Équation") == ["schrodinger", "s", "2", "1", "d", "equation"]
+    assert normalize_name("van der Berg") == normalize_name("Van-der-Berg") == "vanderberg"
+
+
+def test_parse_filter():
+    assert parse_filter("Networks wireless", None) == parse_filter("wireless networks NETWORKS", "") == \
+        KeywordFilter(("networks", "wireless"))
+    assert parse_filter(None, "Larsson") == KeywordFilter((), "larsson")
+    for q, author in [("!!!", None), (None, "--")]:
+        with pytest.raises(FeedIndexerError):
+            parse_filter(q, author)
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_filtered_feeds(get_date_window, app):
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,27))
+    client = app.test_client()
+    items = client.get("/json/cs+math").json["items"]
+
+    def ids(args: str) -> list:
+        response = client.get(f"/json/cs+math?{args}")
+        assert response.status_code == 200
+        return [item["id"] for item in response.json["items"]]
+
+    #the same papers in the same order as the full feed
+    with patch("feed.keyword_index.AnnounceListings", wraps=AnnounceListings) as listings:
+        assert ids("q=wireless+NETWORKS") == [item["id"] for item in items if "Wireless" in item["title"]]
+        assert ids("q=mysteries") == [item["id"] for item in items if "Mysteries" in item["title"]]
+        assert ids("author=real") == ids("q=universe&author=Real") == ids("q=mysteries")
+        assert ids("q=wireless&author=Real") == ids("q=nothing") == []
+        listings.assert_called_once()
+    assert ids("author=Larsson&fields=minimal") == ids("q=wireless")
+    #only the query's categories
+    assert client.get("/json/hep-th?q=wireless").json["items"] == []
+
+    #filtered feeds are paged like the others
+    filtered = ids("q=the")
+    assert len(filtered) > 2
+    paged = []
+    page = client.get("/json/cs+math?q=the&limit=2").json
+    while True:
+        paged += [item["id"] for item in reversed(page["items"])]
+        if "next_url" not in page:
+            break
+        assert "q=the" in page["next_url"]
+        page = client.get(page["next_url"]).json
+    assert paged == filtered[::-1]
+
+    for args in ["q=!!!", "q=wireless&date=2023-10-26", "author=Real&since=abc", "q=wireless&page=abc"]:
+        assert client.get(f"/rss/cs+math?{args}").status_code == 400
+
+    #the index is built again for new announcements
+    event = NewAnnouncements(Watermark(date(2023,10,28), 3), Watermark(date(2023,10,27), 2), frozenset({"cs.AI"}))
+    new_announcements.send(app, event=event)
+    with patch("feed.keyword_index.AnnounceListings", wraps=AnnounceListings) as listings:
+        assert ids("q=wireless")
+        listings.assert_called_once()
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_filters_cached(get_date_window, app):
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,27))
+    client = app.test_client()
+    with patch("feed.keyword_index.KeywordIndex.get_papers", autospec=True,
+               side_effect=keyword_index.KeywordIndex.get_papers) as get_papers:
+        for args in ["q=wireless", "q=WIRELESS", "q=wireless"]:
+            assert client.get(f"/rss/math+cs?{args}").status_code == 200
+        get_papers.assert_called_once()
+        client.get("/rss/math+cs?q=networks")
+        assert get_papers.call_count == 2
@@ -0,0 +1,74 @@
+from datetime import date
+from unittest.mock import patch
+
+from feed import manifest
+from feed.database import get_announce_papers
+from feed.domain import Watermark
+from feed.fetch_data import validate_request
+from feed.freshness import NewAnnouncements, new_announcements
+
+
+def test_feed_queries():
+    queries = manifest.feed_queries()
+    assert "math" in queries and "math.NT" in queries and "cs.CV" in queries
+    assert "test" not in queries and not any(query.startswith("test.") for query in queries)
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_manifest(get_date_window, app):
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,27))
+    app.config["FEED_MANIFEST_ROOT"] = "http://localhost"
+    #cached until new announcements are noticed
+    app.extensions["feed_freshness"] = None
+    client = app.test_client()
+    builder = app.extensions["feed_manifest"]
+    with patch("feed.manifest.build_manifest", wraps=manifest.build_manifest) as build, \
+            patch("feed.fetch_data.search") as search, patch("feed.serializers.serializer.serialize") as serialize:
+        #built in the background, not in the request
+        response = client.get("/feed/manifest")
+        assert response.status_code == 503 and response.headers["Retry-After"]
+        assert builder.wait(120)
+        response = client.get("/feed/manifest")
+        #the same for any host
+        assert client.get("/feed/manifest", base_url="http://other.example").json == response.json
+        build.assert_called_once()
+        #from the listings, the feeds aren't searched or serialized
+        search.assert_not_called()
+        serialize.assert_not_called()
+    assert response.headers["Content-Type"] == "application/json"
+    assert "feed-cat-math.NT" in response.headers["Surrogate-Key"].split()
+    assert "max-age" in response.headers["Cache-Control"]
+    #the listings are shared with the routes
+    assert len(app.extensions["feed_listing_cache"].listings) > 0
+
+    feeds = response.json["feeds"]
+    for query in ["math", "math.NT", "cs.CV", "cs.NI", "hep-th"]:
+        item = feeds[query]
+        with app.app_context():
+            archives, categories = validate_request(query)
+            listed = [day for day in [date(2023,10,25), date(2023,10,26), date(2023,10,27)]
+                      if get_announce_papers(day, day, archives, categories)]
+        assert item["last_announcement_day"] == (max(listed).isoformat() if listed else None)
+        for route in ["rss", "atom"]:
+            assert item[route]["url"] == f"http://localhost/{route}/{query}"
+        feed = client.get(f"/json/{query}").json
+        assert item["entries"] == len(feed["items"])
+        assert response.json["watermark"] == feed["_arxiv"]["watermark"]
+    assert feeds["math"]["entries"] > 0 and feeds["hep-th"]["entries"] == 0
+    assert len({item["last_announcement_day"] for item in feeds.values()}) > 2
+    #feeds with the same entries have the same tag
+    assert feeds["hep-th"]["tag"] == feeds["cs.AI"]["tag"]
+    assert len({feeds[query]["tag"] for query in ["math", "math.NT", "cs", "cs.CV"]}) == 4
+
+    #built again for new announcements, the tags of the feeds that changed change
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,26))
+    with patch("feed.manifest.build_manifest", wraps=manifest.build_manifest) as build:
+        event = NewAnnouncements(Watermark(date(2023,10,28), 3), Watermark(date(2023,10,27), 2), frozenset({"cs.AI"}))
+        new_announcements.send(app, event=event)
+        assert builder.wait(120)
+        build.assert_called_once()
+        rebuilt = client.get("/feed/manifest").json
+    assert rebuilt["generated"] != response.json["generated"]
+    assert rebuilt["watermark"] != response.json["watermark"]
+    assert rebuilt["feeds"]["cs"]["tag"] != feeds["cs"]["tag"]
+    assert rebuilt["feeds"]["math.NT"]["tag"] == feeds["math.NT"]["tag"]
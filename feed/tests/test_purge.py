@@ -0,0 +1,77 @@
+import json
+from datetime import date
+from unittest.mock import patch
+
+from feed.domain import Watermark
+from feed.freshness import NewAnnouncements, new_announcements
+from feed.purge import (category_keys, purge_categories, init_app, FastlyAPIClient,
+    RecordingFastlyClient, PurgerLock, FASTLY_MAX_KEYS)
+
+
+def test_category_keys():
+    assert category_keys("cs.LO") == ("feed-cat-cs.LO",)
+    #archives expand to their categories and aliases
+    math = category_keys("math")
+    assert "feed-cat-math.NT" in math
+    assert "feed-cat-math.IT" in math and "feed-cat-cs.IT" in math
+    assert category_keys("math.IT") == ("feed-cat-cs.IT", "feed-cat-math.IT")
+    assert category_keys("notanarchive") == ()
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_feed_surrogate_keys(get_date_window, app):
+    get_date_window.return_value = (date(2023,10,27), date(2023,10,27))
+    client = app.test_client()
+    for route in ["/rss/math.NT+cs.CV", "/atom/math.NT+cs.CV", "/json/math.NT+cs.CV"]:
+        keys = client.get(route).headers["Surrogate-Key"].split()
+        assert {"announce", "feed", "feed-cat-math.NT", "feed-cat-cs.CV"} <= set(keys)
+        assert "feed-cat-cs.AI" not in keys
+
+    keys = client.get("/feed/bundle?query=math.NT,cs.CV").headers["Surrogate-Key"].split()
+    assert {"feed-bundle", "feed-cat-math.NT", "feed-cat-cs.CV"} <= set(keys)
+
+
+def test_purge_on_new_announcements(app, tmp_path):
+    app.config["FEED_FASTLY_PURGE_LOCK"] = str(tmp_path / "purge.lock")
+    fastly = RecordingFastlyClient()
+    init_app(app, fastly)
+    event = NewAnnouncements(Watermark(date(2023,10,28), 3), Watermark(date(2023,10,27), 2),
+                             frozenset({"math.NT", "hep-th"}))
+    new_announcements.send(app, event=event)
+    assert fastly.purged == [["feed-cat-hep-th", "feed-cat-math.NT"]]
+
+    #other apps' events are not for this app
+    new_announcements.send(object(), event=event)
+    assert len(fastly.purged) == 1
+
+
+def test_one_purger(app, tmp_path):
+    lock = str(tmp_path / "purge.lock")
+    #another process holds the lock
+    held = PurgerLock(lock)
+    assert held.acquire()
+    app.config["FEED_FASTLY_PURGE_LOCK"] = lock
+    fastly = RecordingFastlyClient()
+    init_app(app, fastly)
+    event = NewAnnouncements(Watermark(date(2023,10,28), 3), Watermark(date(2023,10,27), 2), frozenset({"math.NT"}))
+    new_announcements.send(app, event=event)
+    assert fastly.purged == []
+
+    app.config["FEED_FASTLY_PURGE_LOCK"] = str(tmp_path / "other.lock")
+    app.config["FEED_FASTLY_PURGE"] = False
+    init_app(app, fastly)
+    new_announcements.send(app, event=event)
+    assert fastly.purged == []
+
+
+@patch("feed.purge.urllib.request.urlopen")
+def test_fastly_api_client(urlopen):
+    client = FastlyAPIClient("service", "token")
+    keys = purge_categories([f"cat.{i}" for i in range(FASTLY_MAX_KEYS + 1)], client)
+    assert len(keys) == FASTLY_MAX_KEYS + 1
+    assert urlopen.call_count == 2
+    request = urlopen.call_args_list[0][0][0]
+    assert request.full_url == "https://api.fastly.com/service/service/purge"
+    assert request.get_header("Fastly-key") == "token"
+    assert request.get_header("Fastly-soft-purge") == "1"
+    assert json.loads(request.data)["surrogate_keys"] == keys[:FASTLY_MAX_KEYS]
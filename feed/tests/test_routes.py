@@ -1,10 +1,20 @@
+import io
+import zipfile
 import pytest
+from lxml import etree
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
 from unittest.mock import patch
 from werkzeug import Response
 
 from feed.serializers.feed import Feed
-from feed.domain import DocumentSet
-from feed.consts import FeedVersion
+from feed.domain import DocumentSet, Watermark
+from feed.freshness import NewAnnouncements, new_announcements
+from feed.consts import FeedFields, FeedVersion
+from feed.errors import FeedIndexerError
+from feed import fetch_data
+from feed.fetch_data import search
+from feed.database import latest_update_date
 
 
 
@@ -29,6 +39,11 @@ def feed_atom() -> Feed:
     return Feed(content=b"content", version=FeedVersion.ATOM_1_0)
 
 
+@pytest.fixture
+def feed_json() -> Feed:
+    return Feed(content=b"{}", version=FeedVersion.JSON_1_1)
+
+
 @patch("feed.routes.controller.get_documents")
 @patch("feed.routes.serialize")
 def test_routes_ok(
@@ -37,7 +52,8 @@ def test_routes_ok(
     client,
     documents: DocumentSet,
     feed_rss: Feed,
-    feed_atom: Feed
+    feed_atom: Feed,
+    feed_json: Feed
 ):
     get_documents.return_value = documents
 
@@ -45,10 +61,12 @@ def test_routes_ok(
         ("/rss/cs.LO", feed_rss),
         ("/rss/cs.LO?version=2.0", feed_rss),
         ("/atom/cs.LO", feed_atom),
+        ("/json/cs.LO", feed_json),
     ]:
         serialize.return_value = feed
         response: Response = client.get(route)
-        get_documents.assert_called_with("cs.LO")
+        get_documents.assert_called_with("cs.LO", page=None, dates=None, since=None,
+                                         limit=None, fields=FeedFields.FULL, all_authors=False)
         assert response.status_code == feed.status_code
         assert response.data == feed.content
         assert response.headers["ETag"] == feed.etag
@@ -77,10 +95,119 @@ def test_routes_version_override(
         serialize.return_value = feed_rss
 
         client.get(route, headers={"VERSION": version})
-        get_documents.assert_called_with("cs.LO")
+        get_documents.assert_called_with("cs.LO", page=None, dates=None, since=None,
+                                         limit=None, fields=FeedFields.FULL, all_authors=False)
         serialize.assert_called_with(documents, query="cs.LO", version=override)
 
 
+@patch("feed.routes.controller.get_documents")
+@patch("feed.routes.serialize")
+def test_routes_page(serialize, get_documents, client, documents: DocumentSet, feed_rss: Feed):
+    get_documents.return_value = documents
+    serialize.return_value = feed_rss
+    for route in ["/rss/cs.LO?page=abc", "/atom/cs.LO?page=abc"]:
+        client.get(route)
+        get_documents.assert_called_with("cs.LO", page="abc", dates=None, since=None,
+                                         limit=None, fields=FeedFields.FULL, all_authors=False)
+
+
+@patch("feed.routes.controller.get_documents")
+@patch("feed.routes.serialize")
+def test_routes_history(serialize, get_documents, app, client, documents: DocumentSet, feed_rss: Feed, tmp_path):
+    app.config["FEED_HISTORY_DIR"] = str(tmp_path)
+    get_documents.return_value = documents
+    serialize.return_value = feed_rss
+
+    response: Response = client.get("/rss/cs.LO?date=2023-10-26")
+    get_documents.assert_called_with("cs.LO", page=None, dates=(date(2023,10,26), date(2023,10,26)), since=None,
+                                     limit=None, fields=FeedFields.FULL, all_authors=False)
+    assert response.data == feed_rss.content
+    assert "immutable" in response.headers["Cache-Control"]
+
+    #second request, in a different order and case, is served from the store
+    get_documents.reset_mock()
+    response = client.get("/rss/CS.lo?date=2023-10-26")
+    get_documents.assert_not_called()
+    assert response.data == feed_rss.content
+    assert response.headers["ETag"] == feed_rss.etag
+    assert "immutable" in response.headers["Cache-Control"]
+
+
+@patch("feed.routes.controller.get_documents")
+@patch("feed.routes.serialize")
+def test_routes_since(serialize, get_documents, client, documents: DocumentSet, feed_rss: Feed):
+    get_documents.return_value = documents
+    serialize.return_value = feed_rss
+    client.get("/rss/cs.LO?since=abc")
+    get_documents.assert_called_with("cs.LO", page=None, dates=None, since="abc",
+                                     limit=None, fields=FeedFields.FULL, all_authors=False)
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_routes_stream(get_date_window, app, client):
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,27))
+    listed = client.get("/json/cs+math").json
+    app.config["FEED_STREAM_BATCH_SIZE"] = 2
+    with patch("feed.routes.controller.get_documents") as get_documents:
+        streamed = client.get("/json/cs+math").json
+        get_documents.assert_not_called()
+    assert streamed == listed
+    assert len(streamed["items"]) > 1
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_json_order(get_date_window, app, client):
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,27))
+    rss = etree.fromstring(client.get("/rss/cs+math").data)
+    rss_ids = [guid.text for guid in rss.iter("guid")]
+    assert len(rss_ids) > 1
+    assert [item["id"] for item in client.get("/json/cs+math").json["items"]] == rss_ids
+    app.config["FEED_STREAM_BATCH_SIZE"] = 2
+    assert [item["id"] for item in client.get("/json/cs+math").json["items"]] == rss_ids
+
+
+def test_routes_bad_history(client):
+    for route in [
+            "/rss/cs.LO?date=yesterday",
+            "/rss/cs.LO?date=2023-10-27..2023-10-26",
+            "/rss/cs.LO?date=2023-10-01..2023-10-26",
+            "/rss/cs.LO?date=2999-01-01",
+            "/rss/cs.LO?date=2023-10-26&since=abc",
+            ]:
+        resp = client.get(route)
+        assert resp.status_code == 400
+        assert "immutable" not in resp.headers["Cache-Control"]
+
+
+@patch("feed.routes.controller.get_bundle")
+def test_routes_bundle(get_bundle, client, sample_doc):
+    get_bundle.return_value = {
+        "math": DocumentSet(categories=["math"], documents=[sample_doc]),
+        "cs.AI+cs.LG": DocumentSet(categories=["cs.AI", "cs.LG"], documents=[]),
+        "bogus": FeedIndexerError("Bad archive 'bogus'."),
+    }
+    response: Response = client.get("/feed/bundle?query=math&query=cs.AI%2Bcs.LG,bogus&format=atom")
+    get_bundle.assert_called_with(["math", "cs.AI+cs.LG", "bogus"])
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/zip"
+    assert response.headers["ETag"]
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.namelist() == ["math.atom.xml", "cs.AI+cs.LG.atom.xml", "bogus.atom.xml"]
+        assert b"Mysteries of the Universe" in archive.read("math.atom.xml")
+        assert b"Feed error for query" in archive.read("bogus.atom.xml")
+
+
+def test_routes_bad_bundle(client):
+    for route in [
+            "/feed/bundle",
+            "/feed/bundle?query=",
+            "/feed/bundle?query=math&format=html",
+            "/feed/bundle?query=" + ",".join(["math"]*1000),
+            ]:
+        resp = client.get(route)
+        assert resp.status_code == 400
+
+
 def test_routes_unsupported_rss(client):
     for route in [
             "/rss/cs.LO?version=1.0",
@@ -106,8 +233,187 @@ def test_base(client):
         "/atom/",
         "/rss",
         "/atom",
+        "/json",
         "",
         "/",
     ]:
         resp = client.get(route)
         resp.status_code == 200
+
+
+def test_health_live(client):
+    resp = client.get("/feed/health/live")
+    assert resp.status_code == 200
+    assert resp.json == {"status": "ok"}
+
+@patch("feed.health.check_service")
+def test_health_ready_is_cached(check_service, client):
+    check_service.return_value = "GOOD"
+    for _ in range(5):
+        resp = client.get("/feed/health/ready")
+        assert resp.status_code == 200
+        assert resp.json["status"] == "ok"
+    status = client.get("/feed/status")
+    assert b"Status: GOOD" in status.data
+    check_service.assert_called_once()
+
+@patch("feed.health.check_service")
+def test_health_ready_unavailable(check_service, client):
+    check_service.side_effect = Exception("no database")
+    resp = client.get("/feed/health/ready")
+    assert resp.status_code == 503
+    assert resp.json["error"] == "no database"
+    assert b"Status: BAD" in client.get("/feed/status").data
+
+@patch("feed.health.latest_update_date", wraps=latest_update_date)
+def test_health_deep(latest, app, client):
+    #latest test data is from 2023
+    resp = client.get("/feed/health/deep")
+    assert resp.status_code == 503
+    assert resp.json["status"] == "stale"
+    assert resp.json["latest_update"] == "2023-10-27"
+
+    app.config["FEED_HEALTH_MAX_LAG_DAYS"] = 100000
+    resp = client.get("/feed/health/deep")
+    assert resp.status_code == 200
+    assert resp.json["status"] == "ok"
+    assert resp.json["lag_days"] > 0
+
+    #a weekend and a holiday after the latest day aren't lag
+    app.config["FEED_HEALTH_MAX_LAG_DAYS"] = 2
+    app.config["FEED_ANNOUNCE_HOLIDAYS"] = "2023-10-30"
+    wednesday = datetime(2023, 11, 1, tzinfo=ZoneInfo(app.config["ARXIV_BUSINESS_TZ"]))
+    with patch("feed.health.get_arxiv_midnight", return_value=wednesday):
+        resp = client.get("/feed/health/deep")
+    assert resp.status_code == 200
+    assert resp.json["lag_days"] == 2
+    #looked up by the readiness probe rather than by each check
+    latest.assert_called_once()
+
+
+@patch("feed.routes.controller.get_documents")
+def test_error_feeds_cached(get_documents, client):
+    get_documents.side_effect = FeedIndexerError("Bad archive 'psuedo-science'.")
+    first = client.get("/rss/psuedo-science")
+    second = client.get("/rss/psuedo-science")
+    assert first.status_code == second.status_code == 400
+    assert first.data == second.data
+    assert "feed-rss" in second.headers["Surrogate-Key"]
+    get_documents.assert_called_once()
+    #other formats and arguments are cached separately
+    client.get("/atom/psuedo-science")
+    client.get("/rss/psuedo-science?page=x")
+    assert get_documents.call_count == 3
+
+
+@patch("feed.routes.controller.get_documents")
+def test_empty_feeds_cached_until_new_data(get_documents, app, client, documents):
+    get_documents.return_value = documents
+    client.get("/rss/cs.LO")
+    client.get("/rss/cs.LO")
+    get_documents.assert_called_once()
+
+    event = NewAnnouncements(Watermark(date(2023,10,28), 3), Watermark(date(2023,10,27), 2), frozenset({"cs.LO"}))
+    new_announcements.send(app, event=event)
+    client.get("/rss/cs.LO")
+    assert get_documents.call_count == 2
+
+    #empty past days keep their caching headers
+    for _ in range(2):
+        response = client.get("/rss/cs.LO?date=2023-10-26")
+        assert response.headers["Cache-Control"] == "max-age=31536000, immutable"
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_documents_shared_by_formats(get_date_window, app, client):
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,27))
+    with patch("feed.controller.fetch_data.search", wraps=search) as searched:
+        rss = client.get("/rss/cs+math")
+        atom = client.get("/atom/math+CS")
+        searched.assert_called_once()
+        assert b"cs, math updates on arXiv.org" in rss.data
+        assert b"math, cs updates on arXiv.org" in atom.data
+        assert b"1234.5647" in rss.data and b"1234.5647" in atom.data
+
+        #other days and new data are searched again
+        client.get("/rss/cs+math?date=2023-10-26")
+        event = NewAnnouncements(Watermark(date(2023,10,28), 3), Watermark(date(2023,10,27), 2), frozenset({"cs.AI"}))
+        new_announcements.send(app, event=event)
+        client.get("/json/cs+math")
+        assert searched.call_count == 3
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_counts(get_date_window, app, client):
+    get_date_window.return_value = (date(2023,10,26), date(2023,10,26))
+    response = client.get("/feed/counts/math+cs")
+    assert response.status_code == 200
+    result = response.json
+    assert result["query"] == "cs+math"
+    assert result["first_day"] == result["last_day"] == "2023-10-26"
+    items = client.get("/json/math+cs").json["items"]
+    for listing_type in ["new", "cross", "replace", "replace-cross"]:
+        assert result["counts"][listing_type] == sum(1 for item in items if item["_arxiv"]["announce_type"] == listing_type)
+    assert result["total"] == len(items) > 0
+    assert "feed-cat-math.NT" in response.headers["Surrogate-Key"].split()
+
+    assert client.get("/feed/counts/psuedo-science").status_code == 400
+
+    #kept per day for every order of the query
+    app.extensions["feed_count_cache"].clear()
+    with patch("feed.fetch_data.count_announce_papers", wraps=fetch_data.count_announce_papers) as count:
+        for query in ["cs+math", "math+cs", "MATH+cs"]:
+            assert client.get(f"/feed/counts/{query}").json == result
+        count.assert_called_once()
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_lightweight_feeds(get_date_window, app, client):
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,27))
+    full = client.get("/rss/cs+math")
+    assert b"<dc:creator>" in full.data and b"Abstract:" in full.data
+    with patch("feed.fetch_data.parse_author_affil") as parse_author_affil:
+        minimal = client.get("/rss/cs+math?fields=minimal")
+        no_authors = client.get("/rss/cs+math?fields=no-authors")
+        parse_author_affil.assert_not_called()
+    no_abstract = client.get("/rss/cs+math?fields=no-abstract")
+    assert minimal.status_code == no_authors.status_code == no_abstract.status_code == 200
+    assert b"<dc:creator>" not in minimal.data and b"Abstract:" not in minimal.data
+    assert b"<category>" not in minimal.data and b"1234.5647" in minimal.data
+    assert b"<dc:creator>" not in no_authors.data and b"Abstract:" in no_authors.data
+    assert b"<dc:creator>" in no_abstract.data and b"Abstract:" not in no_abstract.data
+    assert len({full.headers["ETag"], minimal.headers["ETag"], no_authors.headers["ETag"],
+                no_abstract.headers["ETag"]}) == 4
+    assert len(minimal.data) < len(full.data)
+
+    items = client.get("/json/cs+math?fields=minimal").json["items"]
+    assert items and all("authors" not in item and "tags" not in item for item in items)
+
+    #the limit is kept in the paging links along with the fields
+    page = client.get("/json/cs+math?limit=1&fields=minimal").json
+    #items come in the order of the RSS feed, last of the feed first
+    assert len(page["items"]) == 1 and page["items"][0] == items[-1]
+    assert "limit=1" in page["next_url"] and "fields=minimal" in page["next_url"]
+
+    app.config["FEED_STREAM_BATCH_SIZE"] = 2
+    assert client.get("/json/cs+math?fields=minimal").json["items"] == items
+    assert client.get("/rss/cs+math?fields=minimal").data == minimal.data
+
+    for args in ["limit=0", "limit=2001", "limit=ten", "fields=everything"]:
+        assert client.get(f"/rss/cs+math?{args}").status_code == 400
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_truncated_authors(get_date_window, app, client):
+    get_date_window.return_value = (date(2023,10,25), date(2023,10,27))
+    app.config["FEED_MAX_AUTHORS"] = 1
+    items = client.get("/json/cs+math").json["items"]
+    assert all(len(item["authors"]) == 1 for item in items)
+    truncated = [item for item in items if "author_count" in item["_arxiv"]]
+    assert truncated and all(item["_arxiv"]["author_count"] > 1 for item in truncated)
+    assert b"et al.</dc:creator>" in client.get("/rss/cs+math").data
+
+    everyone = client.get("/json/cs+math?authors=all").json["items"]
+    assert all("author_count" not in item["_arxiv"] for item in everyone)
+    assert max(len(item["authors"]) for item in everyone) > 1
+    assert client.get("/rss/cs+math?authors=some").status_code == 400
@@ -0,0 +1,61 @@
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+from lxml import etree
+
+from feed.fetch_data import get_date_window
+from feed.schedule import AnnouncementSchedule, parse_schedule, get_next_announcement
+
+#2023-10-27 is a Friday
+THURSDAY, FRIDAY, SATURDAY, SUNDAY, MONDAY = (date(2023,10,26) + timedelta(days=n) for n in range(5))
+
+
+def test_schedule():
+    schedule = parse_schedule("Mon,Tue,Wed,Thu,Fri", "2023-10-30")
+    assert schedule == AnnouncementSchedule(frozenset(range(5)), frozenset({MONDAY}))
+    assert schedule.skip_days() == ("Saturday", "Sunday")
+    assert schedule.next_day(THURSDAY) == FRIDAY
+    #over the weekend and the holiday
+    assert schedule.next_day(FRIDAY) == schedule.next_day(SATURDAY) == date(2023,10,31)
+    assert schedule.last_day(SUNDAY) == schedule.last_day(MONDAY) == FRIDAY
+    assert schedule.window(1, SATURDAY) == (FRIDAY, FRIDAY)
+    assert schedule.window(2, MONDAY) == (THURSDAY, FRIDAY)
+    assert schedule.window(2, date(2023,10,31)) == (FRIDAY, date(2023,10,31))
+    assert schedule.count_days(FRIDAY, MONDAY) == schedule.count_days(THURSDAY, THURSDAY) == 0
+    assert schedule.count_days(THURSDAY, date(2023,11,1)) == 3
+
+
+def test_parse_schedule_errors():
+    assert parse_schedule("monday, FRIDAY, sat", "") == AnnouncementSchedule(frozenset({0, 4, 5}))
+    #unknown and ambiguous days, bad dates are left out
+    assert parse_schedule("Mon,Funday,T", "2023-13-01,2023-10-30") == AnnouncementSchedule(
+        frozenset({0}), frozenset({MONDAY}))
+    assert parse_schedule("", "") == parse_schedule("Mon,Tue,Wed,Thu,Fri", "")
+
+
+def test_weekend_feeds(app):
+    app.config["FEED_ANNOUNCE_HOLIDAYS"] = "2023-10-30"
+    friday = datetime(2023,10,27, tzinfo=ZoneInfo(app.config["ARXIV_BUSINESS_TZ"]))
+    for midnight in [friday, friday + timedelta(days=1), friday + timedelta(days=3)]:
+        with app.app_context(), patch("feed.schedule.get_arxiv_midnight", return_value=midnight), \
+                patch("feed.fetch_data.get_arxiv_midnight", return_value=midnight):
+            assert get_next_announcement() == friday + timedelta(days=4)
+            assert get_date_window(1) == (FRIDAY, FRIDAY)
+
+    with patch("feed.schedule.get_arxiv_midnight", return_value=friday + timedelta(days=1)), \
+            patch("feed.routes.utc_now", return_value=friday + timedelta(days=1)):
+        response = app.test_client().get("/rss/psuedo-science")
+    assert response.headers["Cache-Control"] == f"max-age={3 * 24 * 3600}"
+    assert response.expires == friday + timedelta(days=4)
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_skip_days(get_date_window, app, client):
+    get_date_window.return_value = (FRIDAY, FRIDAY)
+    def skip_days(route):
+        return {day.text for day in etree.fromstring(client.get(route).data).iterfind("channel/skipDays/day")}
+
+    assert skip_days("/rss/math") == {"Saturday", "Sunday"}
+    app.config["FEED_ANNOUNCE_WEEKDAYS"] = "Sun,Mon,Tue,Wed,Thu"
+    assert skip_days("/rss/cs") == {"Friday", "Saturday"}
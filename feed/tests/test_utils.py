@@ -3,7 +3,13 @@ from zoneinfo import ZoneInfo
 from datetime import timezone, datetime
 from unittest.mock import patch
 
-from feed.utils import utc_now, randomize_case, etag, get_arxiv_midnight
+import pytest
+
+from datetime import date
+from feed.utils import (utc_now, randomize_case, etag, get_arxiv_midnight, encode_page_cursor, decode_page_cursor,
+    parse_date_range, encode_watermark, decode_watermark)
+from feed.domain import PageCursor, Watermark
+from feed.errors import FeedIndexerError
 
 # utc_now
 def test_utc_now_timezone():
@@ -46,4 +52,45 @@ def test_get_arxiv_midnight(mock_datetime, app):
     with app.app_context():
         result = get_arxiv_midnight()
 
-    assert result == datetime(2023, 11, 9, 0, 0, 0, tzinfo=ZoneInfo("America/New_York"))
\ No newline at end of file
+    assert result == datetime(2023, 11, 9, 0, 0, 0, tzinfo=ZoneInfo("America/New_York"))
+
+
+# page cursors
+
+def test_page_cursor_round_trip():
+    for cursor in [
+        PageCursor(4, "2310.12345"),
+        PageCursor(1, "math/0101001", forward=False),
+    ]:
+        token = encode_page_cursor(cursor)
+        assert "=" not in token
+        assert decode_page_cursor(token) == cursor
+
+
+def test_page_cursor_invalid():
+    for token in ["", "bogus", "!!!!", encode_page_cursor(PageCursor(4, "x"))[:-3]]:
+        with pytest.raises(FeedIndexerError):
+            decode_page_cursor(token)
+
+
+
+# historical dates
+
+def test_parse_date_range(app):
+    with app.app_context():
+        assert parse_date_range("2023-10-26", 7) == (date(2023,10,26), date(2023,10,26))
+        assert parse_date_range("2023-10-24..2023-10-26", 7) == (date(2023,10,24), date(2023,10,26))
+        for bad in ["", "10/26/2023", "2023-10-26..", "2023-10-26..2023-10-24", "2023-10-01..2023-10-26", "2999-01-01"]:
+            with pytest.raises(FeedIndexerError):
+                parse_date_range(bad, 7)
+
+
+
+# watermarks
+
+def test_watermark_round_trip():
+    watermark = Watermark(date(2023,10,26), 8)
+    assert decode_watermark(encode_watermark(watermark)) == watermark
+    for token in ["", "bogus", encode_page_cursor(PageCursor(4, "2310.12345"))]:
+        with pytest.raises(FeedIndexerError):
+            decode_watermark(token)
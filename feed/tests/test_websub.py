@@ -0,0 +1,219 @@
+import hashlib
+import hmac
+import json
+import threading
+from dataclasses import replace
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from feed import websub
+from feed.domain import Watermark
+from feed.errors import FeedError, FeedSubscriptionLimitError
+from feed.factory import create_web_app
+from feed.freshness import NewAnnouncements, new_announcements
+
+
+class Subscriber(ThreadingHTTPServer):
+    """Subscriber stub that confirms every verification and records what it is sent."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), SubscriberHandler)
+        self.verified: list = []
+        self.received: list = []
+        self.got_content = threading.Event()
+
+    @property
+    def callback(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/callback"
+
+
+class SubscriberHandler(BaseHTTPRequestHandler):
+    server: Subscriber
+
+    def do_GET(self) -> None:
+        if self.path.startswith("/redirect"):
+            self.send_response(302)
+            self.send_header("Location", self.path.replace("/redirect", "/callback", 1))
+            self.end_headers()
+            return
+        params = {key: value[0] for key, value in parse_qs(urlsplit(self.path).query).items()}
+        self.server.verified.append(params)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(params["hub.challenge"].encode())
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append((dict(self.headers), body))
+        self.send_response(204)
+        self.end_headers()
+        self.server.got_content.set()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def subscriber():
+    server = Subscriber()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def hub(app):
+    app.config["FEED_WEBSUB"] = True
+    #the subscriber stub is on the loopback address
+    app.config["FEED_WEBSUB_PRIVATE_CALLBACKS"] = True
+    websub.init_app(app)
+    hub = app.extensions["feed_websub"]
+    yield hub
+    hub.stop()
+
+
+def test_parse_topic():
+    assert websub.parse_topic("https://rss.arxiv.org/rss/math.NT+cs.CV")[0] == \
+        websub.parse_topic("http://localhost/rss/cs.CV+math.NT/")[0]
+    key, categories = websub.parse_topic("http://localhost/atom/math.IT")
+    assert key[1] == "math.IT" and categories == {"math.IT", "cs.IT"}
+    for topic in ["http://localhost/feed/bundle", "http://localhost/rss/psuedo-science"]:
+        with pytest.raises(FeedError):
+            websub.parse_topic(topic)
+
+
+def test_check_callback():
+    for callback in ["http://127.0.0.1:8080/cb", "http://localhost/cb", "http://[::1]/cb", "http://10.1.2.3/cb",
+                     "http://169.254.169.254/latest/meta-data", "http://[::ffff:192.168.0.1]/cb", "http://0.0.0.0/"]:
+        with pytest.raises(FeedError):
+            websub.check_callback(callback)
+        websub.check_callback(callback, allow_private=True)
+    with patch("socket.getaddrinfo", return_value=[(None, None, None, "", ("93.184.215.14", 443))]):
+        websub.check_callback("https://subscriber.example.org/cb")
+    with patch("socket.getaddrinfo", return_value=[(None, None, None, "", ("93.184.215.14", 443)),
+                                                   (None, None, None, "", ("10.0.0.1", 443))]):
+        with pytest.raises(FeedError):
+            websub.check_callback("https://subscriber.example.org/cb")
+
+
+def test_client_callbacks(subscriber):
+    params = {"hub.mode": "subscribe", "hub.topic": "http://localhost/rss/math", "hub.challenge": "abc"}
+    #private addresses and redirects are never requested
+    assert websub.HTTPWebSubClient().verify(subscriber.callback, params) is None
+    with pytest.raises(FeedError):
+        websub.HTTPWebSubClient().deliver(subscriber.callback, b"", {})
+    redirect = subscriber.callback.replace("/callback", "/redirect")
+    assert websub.HTTPWebSubClient(allow_private=True).verify(redirect, params) is None
+    assert subscriber.verified == [] and subscriber.received == []
+    assert websub.HTTPWebSubClient(allow_private=True).verify(subscriber.callback, params) == "abc"
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_hub_links(get_date_window, app, hub):
+    get_date_window.return_value = (date(2023,10,27), date(2023,10,27))
+    client = app.test_client()
+    for route in ["/rss/math", "/atom/math"]:
+        response = client.get(route)
+        assert 'rel="hub"' in response.text and "http://localhost/feed/websub" in response.text
+        assert response.headers["Link"] == f'<http://localhost/feed/websub>; rel="hub", <http://localhost{route}>; rel="self"'
+    assert client.get("/json/math").json["hubs"] == [{"type": "WebSub", "url": "http://localhost/feed/websub"}]
+    #past days and errors never change
+    assert 'rel="hub"' not in client.get("/rss/math?date=2023-10-26").text
+    assert "Link" not in client.get("/rss/psuedo-science").headers
+
+
+def test_hub_requests(app, hub, subscriber):
+    client = app.test_client()
+    assert client.post("/feed/websub", data={"hub.mode": "subscribe", "hub.topic": "http://localhost/rss/math",
+                                             "hub.callback": "ftp://example.org"}).status_code == 400
+    assert client.post("/feed/websub", data={"hub.mode": "subscribe", "hub.topic": "http://localhost/rss/nope",
+                                             "hub.callback": subscriber.callback}).status_code == 400
+    assert client.post("/feed/websub", data={"hub.mode": "subscribe", "hub.topic": "http://localhost/rss/math",
+                                             "hub.callback": subscriber.callback}).status_code == 202
+    #feeds of other hosts aren't topics of the hub
+    assert client.post("/feed/websub", data={"hub.mode": "subscribe", "hub.topic": "http://other.example/rss/math",
+                                             "hub.callback": subscriber.callback}).status_code == 400
+    #but those of the public url root are
+    app.config["FEED_MANIFEST_ROOT"] = "https://rss.example.org/"
+    assert client.post("/feed/websub", data={"hub.mode": "subscribe", "hub.topic": "https://rss.example.org/rss/math",
+                                             "hub.callback": subscriber.callback}).status_code == 202
+    assert client.post("/feed/websub", base_url="http://other.example", data={
+        "hub.mode": "subscribe", "hub.topic": "http://other.example/rss/math", "hub.callback": subscriber.callback
+    }).status_code == 202
+
+    app.config["FEED_WEBSUB"] = False
+    assert create_web_app().test_client().post("/feed/websub").status_code == 404
+
+
+def test_hub_limits(app, hub, subscriber):
+    hub.max_topic_subscribers = 1
+    hub.max_subscriptions = 2
+
+    def subscribe(topic: str, callback: str) -> bool:
+        data = {"hub.mode": "subscribe", "hub.topic": f"http://localhost/rss/{topic}", "hub.callback": callback}
+        try:
+            return hub.request(data, "http://localhost/").result(10)
+        except FeedSubscriptionLimitError:
+            return False
+
+    assert subscribe("math", subscriber.callback)
+    assert not subscribe("math", subscriber.callback + "?2")
+    #renewals are still accepted
+    assert subscribe("math", subscriber.callback)
+    assert subscribe("cs", subscriber.callback)
+    assert not subscribe("hep-th", subscriber.callback)
+    assert app.test_client().post("/feed/websub", data={
+        "hub.mode": "subscribe", "hub.topic": "http://localhost/rss/hep-th", "hub.callback": subscriber.callback
+    }).status_code == 429
+    #expired subscriptions make room
+    cs = next(subscribers for key, subscribers in hub.topics.items() if key[1] == "cs")
+    cs[subscriber.callback] = replace(cs[subscriber.callback], expires_at=0)
+    assert subscribe("hep-th", subscriber.callback)
+    assert sorted(key[1] for key in hub.topics) == ["hep-th", "math"]
+
+
+@patch("feed.fetch_data.get_date_window")
+def test_notify_subscribers(get_date_window, app, hub, subscriber):
+    get_date_window.return_value = (date(2023,10,27), date(2023,10,27))
+    topic = "http://localhost/json/math.NT+cs.CV"
+    assert hub.request({"hub.mode": "subscribe", "hub.topic": topic, "hub.callback": subscriber.callback,
+                        "hub.secret": "shh", "hub.lease_seconds": "10000000000"}, "http://localhost/").result(10)
+    assert subscriber.verified[0]["hub.topic"] == topic
+    assert subscriber.verified[0]["hub.lease_seconds"] == str(app.config["FEED_WEBSUB_LEASE_SECONDS"])
+    #the same canonical topic in another order
+    other = "http://localhost/json/cs.CV+math.NT"
+    assert hub.request({"hub.mode": "subscribe", "hub.topic": other,
+                        "hub.callback": subscriber.callback + "?other=1"}, "http://localhost/").result(10)
+
+    #nothing for categories the topic doesn't list
+    assert hub.publish({"hep-th"}) == []
+
+    for delivery in hub.publish({"math.NT", "hep-th"}):
+        delivery.result(10)
+    assert len(subscriber.received) == 2
+    by_self = {headers["Link"].split("<")[2].split(">")[0]: (headers, body) for headers, body in subscriber.received}
+    headers, body = by_self[topic]
+    expected = hmac.new(b"shh", body, hashlib.sha256).hexdigest()
+    assert headers["X-Hub-Signature"] == f"sha256={expected}"
+    assert headers["Content-Type"].startswith("application/feed+json")
+    assert json.loads(body)["items"] and json.loads(body) == json.loads(by_self[other][1])
+    assert "X-Hub-Signature" not in by_self[other][0]
+
+    #new announcements noticed by the freshness watcher notify the subscribers
+    subscriber.received.clear()
+    subscriber.got_content.clear()
+    event = NewAnnouncements(Watermark(date(2023,10,27), 2), Watermark(date(2023,10,26), 8), frozenset({"cs.CV"}))
+    new_announcements.send(app, event=event)
+    assert subscriber.got_content.wait(10)
+
+    assert hub.request({"hub.mode": "unsubscribe", "hub.topic": topic, "hub.callback": subscriber.callback},
+                       "http://localhost/").result(10)
+    assert hub.request({"hub.mode": "unsubscribe", "hub.topic": other,
+                        "hub.callback": subscriber.callback + "?other=1"}, "http://localhost/").result(10)
+    assert hub.topics == {} and hub.publish({"math.NT"}) == []
@@ -1,12 +1,15 @@
 import re
+import base64
 import random
 import hashlib
-from typing import Union
-from datetime import datetime, timezone
+from typing import Tuple, Union
+from datetime import date, datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from flask import current_app
 
 from feed.consts import DELIMITER
+from feed.domain import PageCursor, Watermark
+from feed.errors import FeedIndexerError
 
 
 # Get a random seed
@@ -24,6 +27,122 @@ def get_arxiv_midnight() -> datetime:
     midnight=now.replace(hour=0, minute=0, second=0, microsecond=0)
     return midnight
 
+def get_arxiv_midnight_of(day: date) -> datetime:
+    "returns a timestamp for the start of the given arxiv day"
+    arxiv_tz=ZoneInfo(current_app.config["ARXIV_BUSINESS_TZ"])
+    return datetime(day.year, day.month, day.day, tzinfo=arxiv_tz)
+
+def parse_date_range(value: str, max_days: int) -> Tuple[date, date]:
+    """Parse a requested announcement day or range of days.
+
+    Parameters
+    ----------
+    value : str
+        Either a single day 'YYYY-MM-DD' or an inclusive range
+        'YYYY-MM-DD..YYYY-MM-DD'.
+    max_days : int
+        Longest range that may be requested.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the value is malformed, too long, or not entirely in the past.
+
+    Returns
+    -------
+    Tuple[date, date]
+        First and last day of the range, inclusive.
+    """
+    try:
+        first, separator, last = value.strip().partition("..")
+        first_day = date.fromisoformat(first)
+        last_day = date.fromisoformat(last) if separator else first_day
+    except ValueError:
+        raise FeedIndexerError(
+            f"Invalid date '{value}'. Dates are of the form 'YYYY-MM-DD' or "
+            f"'YYYY-MM-DD..YYYY-MM-DD' for a range of days."
+        )
+    if last_day < first_day:
+        raise FeedIndexerError(f"Invalid date range '{value}', the end is before the start.")
+    if (last_day - first_day) >= timedelta(days=max_days):
+        raise FeedIndexerError(f"Invalid date range '{value}', at most {max_days} days may be requested.")
+    if last_day >= get_arxiv_midnight().date():
+        raise FeedIndexerError(f"Invalid date '{value}', only past announcement days may be requested.")
+    return first_day, last_day
+
+def parse_limit(value: str, max_limit: int) -> int:
+    """Parse a requested number of entries per page.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the value is not a number between 1 and max_limit.
+    """
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= max_limit:
+        raise FeedIndexerError(f"Invalid limit '{value}', the limit is a number from 1 to {max_limit}.")
+    return limit
+
+def parse_all_authors(value: str) -> bool:
+    """Parse the requested author list, 'all' for every author instead of the first FEED_MAX_AUTHORS.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the value is anything else.
+    """
+    if value.strip().lower() != "all":
+        raise FeedIndexerError(f"Invalid authors '{value}', use 'authors=all' to list every author.")
+    return True
+
+def encode_page_cursor(cursor: PageCursor) -> str:
+    """Encode a page cursor as an opaque url safe token."""
+    direction = "n" if cursor.forward else "p"
+    raw = f"{direction}:{cursor.listing_order}:{cursor.paper_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_page_cursor(token: str) -> PageCursor:
+    """Decode a token produced by :func:`encode_page_cursor`.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the token is not a valid page cursor.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        direction, order, paper_id = raw.split(":", 2)
+        if direction not in ("n", "p") or not paper_id:
+            raise ValueError(raw)
+        return PageCursor(int(order), paper_id, direction == "n")
+    except ValueError:
+        raise FeedIndexerError(f"Invalid page '{token}'.")
+
+def encode_watermark(watermark: Watermark) -> str:
+    """Encode a watermark as an opaque url safe token."""
+    raw = f"{watermark.day.isoformat()}:{watermark.updates}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_watermark(token: str) -> Watermark:
+    """Decode a token produced by :func:`encode_watermark`.
+
+    Raises
+    ------
+    FeedIndexerError
+        If the token is not a valid watermark.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        day, updates = raw.split(":")
+        return Watermark(date.fromisoformat(day), int(updates))
+    except ValueError:
+        raise FeedIndexerError(f"Invalid watermark '{token}'.")
+
 # Used only in tests
 
 UNICODE_LETTERS_RE = re.compile(r"[^\W\d_]", re.UNICODE)
@@ -0,0 +1,393 @@
+"""WebSub hub, so subscribers get feeds pushed when they change instead of polling them.
+
+With FEED_WEBSUB on, current feeds advertise the hub at ``/feed/websub`` with
+a ``rel="hub"`` link next to their self link. Subscribers post
+``hub.mode``, ``hub.topic`` (a feed url) and ``hub.callback`` to it as in the
+`WebSub recommendation <https://www.w3.org/TR/websub/>`_, and the hub
+verifies the intent with the callback in the background.
+
+Topics are kept per format and canonical query, so ``/rss/math+cs.AI`` and
+``/rss/cs.AI+math`` are the same topic. When :mod:`feed.freshness` notices new
+announcements, every subscribed query that lists one of the updated categories
+is searched once, serialized once per format and host, and posted to all of
+its subscribers at the same time on FEED_WEBSUB_WORKERS threads.
+
+The hub is a local stand in for a dedicated hub service: subscriptions are
+kept in memory, so they are lost on restart and every process of the app only
+notifies the subscribers it verified. Each process keeps at most
+FEED_WEBSUB_MAX_TOPIC_SUBSCRIBERS subscribers of a topic and
+FEED_WEBSUB_MAX_SUBSCRIPTIONS in all, further subscriptions are refused.
+
+Topics must be feeds served from FEED_MANIFEST_ROOT or from the host the
+subscription request came to, so the hub never builds feeds for other hosts.
+Callbacks are only contacted on public addresses, their host is resolved and
+checked before every request, and redirects are not followed, so a subscriber
+can't make the hub send requests into the network it runs in.
+"""
+import hashlib
+import hmac
+import ipaddress
+import logging
+import secrets
+import socket
+import threading
+import time
+import urllib.request
+from email.message import Message
+from typing import IO, Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Protocol, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import unquote, urlencode, urlsplit
+
+from flask import Flask, current_app, url_for
+
+from feed import consts
+from feed.consts import DELIMITER, FeedVersion
+from feed.controller import _get_feed_num_days, _get_max_authors
+from feed.database import _all_possible_categories
+from feed.errors import FeedError, FeedSubscriptionLimitError
+from feed.fetch_data import search, validate_request
+from feed.freshness import NewAnnouncements, new_announcements
+from feed.serializers.feed import Feed
+from feed.serializers.serializer import serialize
+
+logger = logging.getLogger(__name__)
+
+#longest secret the recommendation allows
+MAX_SECRET_BYTES = 200
+_VERSIONS = {version.short_name: version for version in FeedVersion.supported()}
+
+TopicKey = Tuple[FeedVersion, str]
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """A verified subscriber of a topic."""
+
+    callback: str
+    topic: str
+    """Feed url as the subscriber gave it, sent back as the self link."""
+    secret: Optional[str]
+    expires_at: float
+
+
+class WebSubClient(Protocol):
+    def verify(self, callback: str, params: Dict[str, str]) -> Optional[str]:
+        ...
+
+    def deliver(self, callback: str, content: bytes, headers: Dict[str, str]) -> None:
+        ...
+
+
+def check_callback(callback: str, allow_private: bool = False) -> None:
+    """Check that a callback is an http or https url on public addresses only.
+
+    Every address the host resolves to must be public, not private, loopback,
+    link-local, reserved or multicast. allow_private skips the addresses, for
+    development with local subscribers.
+
+    Raises
+    ------
+    FeedError
+        If the callback isn't such a url or its host can't be resolved.
+    """
+    parts = urlsplit(callback)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise FeedError("hub.callback must be an http or https url.")
+    if allow_private:
+        return
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port, proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError):
+        raise FeedError(f"hub.callback host '{parts.hostname}' can't be resolved.")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise FeedError("hub.callback must be on a public address.")
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    """Redirects are errors, so a callback can't send the hub to an address that wasn't checked."""
+
+    def redirect_request(self, req: urllib.request.Request, fp: IO[bytes], code: int, msg: str,
+                         headers: Message, newurl: str) -> Optional[urllib.request.Request]:
+        return None
+
+
+class HTTPWebSubClient:
+    """Talks to subscriber callbacks over HTTP, see :func:`check_callback`."""
+
+    def __init__(self, timeout: float = 10, allow_private: bool = False):
+        self.timeout = timeout
+        self.allow_private = allow_private
+        self._opener = urllib.request.build_opener(_NoRedirects())
+
+    def verify(self, callback: str, params: Dict[str, str]) -> Optional[str]:
+        """Body of the callback's response to the verification, None if it is not a success."""
+        separator = "&" if urlsplit(callback).query else "?"
+        try:
+            check_callback(callback, self.allow_private)
+            with self._opener.open(callback + separator + urlencode(params), timeout=self.timeout) as response:
+                body: bytes = response.read(4096)
+                return body.decode("utf-8", "replace")
+        except Exception as ex:
+            logger.info("WebSub verification of %s failed: %s", callback, ex)
+            return None
+
+    def deliver(self, callback: str, content: bytes, headers: Dict[str, str]) -> None:
+        check_callback(callback, self.allow_private)
+        request = urllib.request.Request(callback, data=content, headers=headers, method="POST")
+        with self._opener.open(request, timeout=self.timeout):
+            pass
+
+
+def parse_topic(topic: str) -> Tuple[TopicKey, FrozenSet[str]]:
+    """Format and canonical query of a feed url, and the categories it may list.
+
+    Raises
+    ------
+    FeedError
+        If the url is not a feed of a valid query.
+    """
+    parts = unquote(urlsplit(topic).path).rstrip("/").rsplit("/", 2)
+    if len(parts) != 3 or parts[1] not in _VERSIONS:
+        raise FeedError(f"Invalid topic '{topic}', topics are feed urls such as /rss/math.")
+    archives, categories = validate_request(parts[2])
+    query = DELIMITER.join(sorted({archive.id for archive in archives} | {category.id for category in categories}))
+    return (_VERSIONS[parts[1]], query), frozenset(_all_possible_categories(archives, categories))
+
+
+def _url_root(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+
+class Hub:
+    """Subscriptions of an app and their verification and notification.
+
+    Parameters
+    ----------
+    app : Flask
+        App whose feeds are sent.
+    client : WebSubClient
+        Connects to the subscribers.
+    workers : int
+        Verifications and deliveries run at the same time.
+    lease_seconds : int
+        Longest and default lease of a subscription.
+    max_topic_subscribers : int
+        Most subscribers of one topic.
+    max_subscriptions : int
+        Most subscriptions of all topics together.
+    allow_private : bool
+        Accept callbacks on private addresses, see :func:`check_callback`.
+    """
+
+    def __init__(self, app: Flask, client: WebSubClient, workers: int, lease_seconds: int,
+                 max_topic_subscribers: int = consts.FEED_WEBSUB_MAX_TOPIC_SUBSCRIBERS,
+                 max_subscriptions: int = consts.FEED_WEBSUB_MAX_SUBSCRIPTIONS, allow_private: bool = False):
+        self.app = app
+        self.client = client
+        self.lease_seconds = lease_seconds
+        self.max_topic_subscribers = max_topic_subscribers
+        self.max_subscriptions = max_subscriptions
+        self.allow_private = allow_private
+        self.topics: Dict[TopicKey, Dict[str, Subscription]] = {}
+        self.categories: Dict[TopicKey, FrozenSet[str]] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="feed-websub")
+
+    def request(self, form: Mapping[str, str], host_url: Optional[str] = None) -> "Future[bool]":
+        """Check a subscription request and verify it with the subscriber in the background.
+
+        The future is True once the subscription is added or removed. Topics
+        must be feeds of FEED_MANIFEST_ROOT or of host_url, the url root the
+        request came to, as the feeds pushed to the subscribers are built for
+        the host of the topic.
+
+        Raises
+        ------
+        FeedSubscriptionLimitError
+            If a new subscriber would be over the hub's limits.
+        FeedError
+            If the request is invalid.
+        """
+        mode = form.get("hub.mode", "")
+        topic = form.get("hub.topic", "")
+        callback = form.get("hub.callback", "")
+        if mode not in ("subscribe", "unsubscribe"):
+            raise FeedError("hub.mode must be 'subscribe' or 'unsubscribe'.")
+        key, categories = parse_topic(topic)
+        roots = [str(self.app.config["FEED_MANIFEST_ROOT"])] + ([host_url] if host_url else [])
+        if _url_root(topic) not in {_url_root(root) for root in roots}:
+            raise FeedError(f"Invalid topic '{topic}', topics are feeds of this hub such as {roots[-1].rstrip('/')}/rss/math.")
+        check_callback(callback, self.allow_private)
+        secret = form.get("hub.secret") or None
+        if secret is not None and len(secret.encode("utf-8")) >= MAX_SECRET_BYTES:
+            raise FeedError(f"hub.secret must be less than {MAX_SECRET_BYTES} bytes.")
+        try:
+            lease = min(int(form.get("hub.lease_seconds") or self.lease_seconds), self.lease_seconds)
+            if lease <= 0:
+                raise ValueError(lease)
+        except ValueError:
+            raise FeedError("hub.lease_seconds must be a number of seconds.")
+        subscription = Subscription(callback, topic, secret, time.time() + lease)
+        if mode == "subscribe":
+            with self._lock:
+                self._check_limits(key, callback)
+        return self._pool.submit(self._verify, mode, key, categories, subscription, lease)
+
+    def _verify(self, mode: str, key: TopicKey, categories: FrozenSet[str],
+                subscription: Subscription, lease: int) -> bool:
+        challenge = secrets.token_urlsafe(24)
+        params = {"hub.mode": mode, "hub.topic": subscription.topic, "hub.challenge": challenge}
+        if mode == "subscribe":
+            params["hub.lease_seconds"] = str(lease)
+        if self.client.verify(subscription.callback, params) != challenge:
+            logger.info("WebSub %s of %s to %s was not verified", mode, subscription.callback, subscription.topic)
+            return False
+        with self._lock:
+            if mode == "subscribe":
+                #other subscriptions may have been verified since the request was checked
+                try:
+                    self._check_limits(key, subscription.callback)
+                except FeedSubscriptionLimitError:
+                    logger.info("WebSub subscription of %s to %s is over the limits",
+                                subscription.callback, subscription.topic)
+                    return False
+            subscribers = self.topics.setdefault(key, {})
+            if mode == "subscribe":
+                subscribers[subscription.callback] = subscription
+                self.categories[key] = categories
+            else:
+                subscribers.pop(subscription.callback, None)
+            if not subscribers:
+                del self.topics[key]
+                self.categories.pop(key, None)
+        return True
+
+    def _check_limits(self, key: TopicKey, callback: str) -> None:
+        """Raise FeedSubscriptionLimitError if callback would be a subscriber too many, needs the lock.
+
+        Renewals are always allowed, expired subscriptions are only dropped when a limit is reached.
+        """
+        if self._over_limits(key, callback):
+            self._drop_expired()
+            if self._over_limits(key, callback):
+                raise FeedSubscriptionLimitError("The hub has too many subscriptions, try again later.")
+
+    def _over_limits(self, key: TopicKey, callback: str) -> bool:
+        subscribers = self.topics.get(key, {})
+        if callback in subscribers:
+            return False
+        return (len(subscribers) >= self.max_topic_subscribers
+                or sum(len(topic) for topic in self.topics.values()) >= self.max_subscriptions)
+
+    def _drop_expired(self) -> None:
+        now = time.time()
+        for key in list(self.topics):
+            subscribers = self.topics[key]
+            for callback in [callback for callback, sub in subscribers.items() if sub.expires_at <= now]:
+                del subscribers[callback]
+            if not subscribers:
+                del self.topics[key]
+                self.categories.pop(key, None)
+
+    def subscribers(self, key: TopicKey) -> List[Subscription]:
+        """Current subscribers of the topic, expired ones are dropped."""
+        now = time.time()
+        with self._lock:
+            subscribers = self.topics.get(key, {})
+            for callback in [callback for callback, sub in subscribers.items() if sub.expires_at <= now]:
+                del subscribers[callback]
+            return list(subscribers.values())
+
+    def publish(self, categories: Iterable[str]) -> List["Future[None]"]:
+        """Send the feeds of topics that list any of the categories to their subscribers.
+
+        Each query is searched once for all its formats. The feeds are built
+        in the calling thread and delivered on the pool, the futures are done
+        when the deliveries are.
+        """
+        updated = frozenset(categories)
+        with self._lock:
+            keys = [key for key, listed in self.categories.items() if listed & updated]
+        queries: Dict[str, List[TopicKey]] = {}
+        for key in keys:
+            queries.setdefault(key[1], []).append(key)
+
+        deliveries: List["Future[None]"] = []
+        with self.app.app_context():
+            days = _get_feed_num_days()
+            max_authors = _get_max_authors(False)
+            for query, topic_keys in queries.items():
+                try:
+                    documents = search(query, days, max_authors=max_authors)
+                except Exception as ex:
+                    logger.error("WebSub search of %s failed: %s", query, ex)
+                    continue
+                feeds: Dict[Tuple[FeedVersion, str], Tuple[Feed, str]] = {}
+                for key in topic_keys:
+                    for subscription in self.subscribers(key):
+                        parts = urlsplit(subscription.topic)
+                        root = f"{parts.scheme}://{parts.netloc}"
+                        if (key[0], root) not in feeds:
+                            with self.app.test_request_context(parts.path, base_url=root):
+                                feeds[(key[0], root)] = (serialize(documents, query, key[0]), hub_link())
+                        feed, hub = feeds[(key[0], root)]
+                        headers = {
+                            "Content-Type": feed.content_type,
+                            "Link": f'<{hub}>; rel="hub", <{subscription.topic}>; rel="self"',
+                        }
+                        if subscription.secret:
+                            digest = hmac.new(subscription.secret.encode("utf-8"), feed.content, hashlib.sha256)
+                            headers["X-Hub-Signature"] = f"sha256={digest.hexdigest()}"
+                        deliveries.append(self._pool.submit(self._deliver, subscription, feed.content, headers))
+        return deliveries
+
+    def _deliver(self, subscription: Subscription, content: bytes, headers: Dict[str, str]) -> None:
+        try:
+            self.client.deliver(subscription.callback, content, headers)
+        except Exception as ex:
+            logger.warning("WebSub delivery of %s to %s failed: %s", subscription.topic, subscription.callback, ex)
+
+    def stop(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def hub_link() -> str:
+    """Url of the hub of the current app, needs a request context for the host."""
+    return url_for("feed.websub_hub", _external=True)
+
+
+def get_hub() -> Optional[Hub]:
+    """The hub of the current app, None if WebSub is off."""
+    hub: Optional[Hub] = current_app.extensions.get("feed_websub")
+    return hub
+
+
+def init_app(app: Flask, client: Optional[WebSubClient] = None) -> None:
+    """Run a hub for the app if FEED_WEBSUB is on, notifying subscribers of new announcements.
+
+    Needs the freshness watcher to notice the announcements. Connect it after
+    the local caches so they are cleared before the feeds are built.
+    """
+    if not app.config.get("FEED_WEBSUB"):
+        return
+    allow_private = bool(app.config["FEED_WEBSUB_PRIVATE_CALLBACKS"])
+    hub = Hub(app, client or HTTPWebSubClient(allow_private=allow_private), int(app.config["FEED_WEBSUB_WORKERS"]),
+              int(app.config["FEED_WEBSUB_LEASE_SECONDS"]), int(app.config["FEED_WEBSUB_MAX_TOPIC_SUBSCRIBERS"]),
+              int(app.config["FEED_WEBSUB_MAX_SUBSCRIPTIONS"]), allow_private)
+    app.extensions["feed_websub"] = hub
+
+    def notify_subscribers(sender: Any, event: NewAnnouncements) -> None:
+        try:
+            deliveries = hub.publish(event.categories)
+            logger.info("Sending %d WebSub notifications for announcements up to %s",
+                        len(deliveries), event.watermark.day)
+        except Exception as ex:
+            logger.error("WebSub notifications failed: %s", ex)
+
+    new_announcements.connect(notify_subscribers, sender=app, weak=False)